@@ -32,11 +32,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole request
+    'school_management.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Serves hashed, pre-compressed static files with far-future cache headers
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'school_management.branches.BranchMiddleware',
+    'school_management.audit.AuditUserMiddleware',
+    # ?_profile=1 for staff users, plus PROFILE_SAMPLE_RATE of all requests
+    'school_management.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -47,8 +55,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; in development the
+            # autoreloader clears them when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -69,6 +84,38 @@ DATABASES = {
     }
 }
 
+# Campus branches. Each branch keeps its students and payments in its own
+# SQLite file; the branch code is also its database alias. The first branch
+# uses the default database, which also holds users and sessions.
+# Requests are routed by host name (``hosts``) or by the user's branch
+# membership (set in the admin). Create a new branch's tables with:
+#   python manage.py migrate --database=<code>
+BRANCHES = {
+    'default': {'name': 'لیسه عالی خصوصی الازهر', 'hosts': []},
+    # 'karte4': {'name': 'شعبه کارته چهار', 'hosts': ['karte4.example.af']},
+}
+BRANCH_DB_DIR = BASE_DIR / 'branches'
+
+for _code, _conf in BRANCHES.items():
+    if _code not in DATABASES:
+        BRANCH_DB_DIR.mkdir(exist_ok=True)
+        DATABASES[_code] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': _conf.get('db', BRANCH_DB_DIR / f'{_code}.db'),
+        }
+
+DATABASE_ROUTERS = ['school_management.branches.BranchRouter']
+
+# Write-ahead logging lets page requests read while a payment is being saved
+SQLITE_WAL = True
+# Run the independent aggregates of the dashboard and reports concurrently.
+# Off: with indexed queries each block takes a few milliseconds, less than
+# the thread pool and fresh connections cost. Turn it on only if
+#   python manage.py benchmark_fanout
+# shows a gain on the server
+QUERY_FANOUT = False
+QUERY_FANOUT_WORKERS = 4
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -98,6 +145,17 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed copies plus .gz variants and a manifest;
+# run it before deploying with DEBUG = False
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -114,3 +172,63 @@ AFGHAN_MONTHS = [
     'حمل', 'ثور', 'جوزا', 'سرطان', 'اسد', 'سنبله',
     'میزان', 'عقرب', 'قوس', 'جدی', 'دلو', 'حوت'
 ]
+
+# run_workers fails jobs still "running" this many seconds after they started,
+# since their worker was killed or crashed
+JOB_TIMEOUT_SECONDS = 60 * 60
+
+# Seconds between background flushes of buffered audit log rows outside requests
+AUDIT_FLUSH_INTERVAL = 5
+
+# Prometheus metrics at /metrics. Server and run_workers processes write
+# their totals to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds so the
+# endpoint can add up all workers; files not updated for three intervals
+# (exited processes) are ignored and deleted.
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_FLUSH_INTERVAL = 10
+# Addresses allowed to scrape without logging in as staff
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Fraction of requests profiled automatically (0.01 = one in a hundred);
+# profiles are saved under MEDIA_ROOT/profiles/, newest PROFILE_KEEP kept
+PROFILE_SAMPLE_RATE = 0
+PROFILE_KEEP = 200
+
+# manage.py backup_db: online backups in small steps, so writers are not held up
+BACKUP_DIR = BASE_DIR / 'backups'
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.05
+# CPU priority increment for the backup process (Unix)
+BACKUP_NICE = 10
+# Newest hourly backups kept, plus one per day and one per week
+BACKUP_KEEP_HOURLY = 24
+BACKUP_KEEP_DAILY = 14
+BACKUP_KEEP_WEEKLY = 8
+
+# Seconds the trend analytics of the current year stay cached (closed years: a day)
+TREND_CACHE_SECONDS = 300
+
+# Seconds the end-of-year collection forecast on the reports page stays cached
+FORECAST_CACHE_SECONDS = 300
+
+# Fee reminders for students who haven't paid for the current month, sent by
+# run_workers or manage.py send_reminders. REMINDER_GATEWAY is the import path
+# of the SMS gateway class and REMINDER_GATEWAY_OPTIONS its arguments; the
+# built-in FileGateway and ConsoleGateway only record the messages.
+REMINDER_GATEWAY = 'school_management.reminders.FileGateway'
+REMINDER_GATEWAY_OPTIONS = {}
+# Messages in flight at once, and messages started per second (0: no limit)
+REMINDER_CONCURRENCY = 10
+REMINDER_RATE = 20
+# Retries per message, with the delay doubling from REMINDER_RETRY_DELAY seconds
+REMINDER_RETRIES = 3
+REMINDER_RETRY_DELAY = 1.0
+# Seconds before a single send is abandoned as failed
+REMINDER_TIMEOUT = 10
+
+# Seconds a rendered parent portal page stays cached. Changes to the student
+# or their payments drop it sooner, but only in the cache of the process that
+# made them: with the default per-process cache, other processes may show the
+# old page for up to this long
+PORTAL_CACHE_SECONDS = 300
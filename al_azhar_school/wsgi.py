@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'al_azhar_school.settings')
 
 application = get_wsgi_application()
+
+# Server processes (runserver included) share their metrics with /metrics
+from school_management import metrics  # noqa: E402
+
+metrics.publish()
@@ -1,23 +1,190 @@
-from django.contrib import admin
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import router, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Round
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
 from django.utils.html import format_html
-from django.db.models import Sum, Count
-from .models import Student, FeePayment
+from . import audit, live, metrics, portal
+from .archive import student_payment_totals
+from .branches import current_branch
+from .choices import bump_data_version
+from .forms import FeeAdjustmentForm, PromotionForm, StudentClassChangeForm
+from .models import (
+    SchoolClass, Student, FeePayment, FeeInvoice, AuditLog, BranchMembership, BackgroundJob,
+    ArchivedFeePayment, ArchivedYear, Promotion, Reminder,
+)
+from .ledger import allocate_students
+from .promotion import apply_promotion, plan_promotion, revert_promotion
+from .utils import get_afghan_month_name
+
+# Filter choices and changelist counts are cached briefly; new values show up
+# after at most this long
+FILTER_CACHE_SECONDS = 300
+COUNT_CACHE_SECONDS = 60
+
+
+class CachedCountPaginator(Paginator):
+    """Remembers changelist counts for a minute.
+
+    SQLite keeps no row estimates, so a ``COUNT(*)`` over a large table is a
+    full scan; with paging through results the same count is asked for on
+    every page.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        sql, params = query.sql_with_params()
+        digest = hashlib.md5(f"{self.object_list.db}:{sql}:{params!r}".encode()).hexdigest()
+        key = f"admin-count:{digest}"
+        count = cache.get(key)
+        metrics.cache_lookup('admin_count', count is not None)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_SECONDS)
+        return count
+
+
+def action_form(model_admin, request, queryset, form_class, title, **extra_context):
+    """Bound form once the intermediate page is submitted, else the page to show."""
+    form = form_class(request.POST if 'apply' in request.POST else None)
+    if form.is_bound and form.is_valid():
+        return form, None
+    context = {
+        **model_admin.admin_site.each_context(request),
+        'title': title,
+        'form': form,
+        'queryset': queryset,
+        'action': request.POST.get('action'),
+        'opts': model_admin.model._meta,
+        'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        **extra_context,
+    }
+    return None, TemplateResponse(request, 'admin/school_management/bulk_action.html', context)
+
+
+def _cached_choices(key, load):
+    choices = cache.get(key)
+    metrics.cache_lookup('admin_filters', choices is not None)
+    if choices is None:
+        choices = load()
+        cache.set(key, choices, FILTER_CACHE_SECONDS)
+    return choices
+
+
+class PeriodFilter(admin.SimpleListFilter):
+    """Jalali month filter; the list of months is cached per branch."""
+    title = 'ماه/سال'
+    parameter_name = 'month_year'
+
+    def lookups(self, request, model_admin):
+        model = model_admin.model
+        periods = _cached_choices(
+            f"admin-periods:{current_branch()}:{model._meta.model_name}",
+            lambda: list(
+                model.objects.order_by('-month_year').values_list('month_year', flat=True).distinct()
+            ),
+        )
+        choices = []
+        for period in periods:
+            year, _, month = period.partition('-')
+            label = f"{get_afghan_month_name(int(month))} {year}" if month.isdigit() else period
+            choices.append((period, label))
+        return choices
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(month_year=self.value())
+        return queryset
+
+
+class ClassFilter(admin.SimpleListFilter):
+    """Class filter ordered by grade; the list of classes is cached per branch."""
+    title = 'صنف'
+    parameter_name = 'school_class'
+    field_path = 'school_class'
+
+    def lookups(self, request, model_admin):
+        return _cached_choices(
+            f"admin-classes:{current_branch()}",
+            lambda: list(SchoolClass.objects.order_by('grade').values_list('pk', 'name')),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(**{self.field_path: self.value()})
+        return queryset
+
+
+class PaymentClassFilter(ClassFilter):
+    parameter_name = 'student__school_class'
+    field_path = 'student__school_class'
+
+
+@admin.register(SchoolClass)
+class SchoolClassAdmin(admin.ModelAdmin):
+    list_display = ['grade', 'name', 'students_count']
+    list_display_links = ['name']
+    search_fields = ['name']
+    actions = ['promote_classes']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_students_count=Count('students'))
+
+    def students_count(self, obj):
+        return obj._students_count
+    students_count.short_description = 'تعداد شاگردان'
+    students_count.admin_order_field = '_students_count'
+
+    @admin.action(description='ترفیع سالانه شاگردان صنف‌های انتخاب شده', permissions=['change'])
+    def promote_classes(self, request, queryset):
+        class_ids = list(queryset.values_list('pk', flat=True))
+        try:
+            plan = plan_promotion(class_ids)
+        except ValueError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return None
+        form, page = action_form(self, request, queryset, PromotionForm, 'ترفیع سالانه', plan=plan)
+        if page:
+            return page
+        try:
+            promotion = apply_promotion(form.cleaned_data['year'], class_ids, user=request.user)
+        except ValueError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return None
+        self.message_user(
+            request,
+            f'{promotion.promoted_count} شاگرد ترفیع یافت و {promotion.graduated_count} شاگرد فارغ شد.',
+            messages.SUCCESS,
+        )
 
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = [
-        'student_id', 'name', 'father_name', 'class_name', 
+        'student_id', 'name', 'father_name', 'school_class',
         'monthly_fee', 'phone', 'is_active', 'total_payments_display',
         'payments_count_display', 'registration_date'
     ]
-    list_filter = ['class_name', 'is_active', 'registration_date']
+    list_filter = [ClassFilter, 'is_active', 'registration_date']
     search_fields = ['student_id', 'name', 'father_name', 'phone']
     list_editable = ['is_active']
     readonly_fields = ['student_id', 'created_at', 'updated_at']
+    list_select_related = ['school_class']
+    show_full_result_count = False
+    paginator = CachedCountPaginator
+    actions = ['deactivate_students', 'change_class', 'adjust_fee']
     fieldsets = (
         ('اطلاعات اساسی', {
-            'fields': ('student_id', 'name', 'father_name', 'class_name')
+            'fields': ('student_id', 'name', 'father_name', 'school_class')
         }),
         ('اطلاعات تماس و مالی', {
             'fields': ('phone', 'monthly_fee')
@@ -31,21 +198,80 @@ class StudentAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Totals for every row in the one changelist query, across both payment tables
+        total, count = student_payment_totals()
+        return super().get_queryset(request).annotate(_total_payments=total, _payments_count=count)
+
     def total_payments_display(self, obj):
-        total = obj.get_total_payments()
         return format_html(
             '<span style="color: green; font-weight: bold;">{} افغانی</span>',
-            total
+            obj._total_payments
         )
     total_payments_display.short_description = 'مجموع پرداخت‌ها'
-    
+    total_payments_display.admin_order_field = '_total_payments'
+
     def payments_count_display(self, obj):
-        count = obj.get_payments_count()
         return format_html(
             '<span style="color: blue;">{} پرداخت</span>',
-            count
+            obj._payments_count
         )
     payments_count_display.short_description = 'تعداد پرداخت‌ها'
+    payments_count_display.admin_order_field = '_payments_count'
+
+    def _bulk_update(self, request, queryset, message, **values):
+        """Apply ``values`` with one UPDATE; ``values`` holds ``(update, audit)`` pairs."""
+        # Without the totals annotation; the UPDATE only needs the primary keys
+        queryset = Student.objects.filter(pk__in=queryset.values('pk'))
+        with transaction.atomic(using=router.db_for_write(Student)):
+            # QuerySet.update sends no signals, so audit from the rows as loaded
+            rows = list(queryset)
+            updated = queryset.update(**{name: change for name, (change, _) in values.items()})
+            audit.record_updated(rows, **{name: after for name, (_, after) in values.items()})
+            portal.invalidate(row.pk for row in rows)
+        live.mark_stale(current_branch())
+        bump_data_version()
+        self.message_user(request, message.format(count=updated), messages.SUCCESS)
+
+    @admin.action(description='غیرفعال کردن شاگردان انتخاب شده', permissions=['change'])
+    def deactivate_students(self, request, queryset):
+        self._bulk_update(
+            request, queryset.filter(is_active=True), '{count} شاگرد غیرفعال شد.',
+            is_active=(False, False),
+        )
+
+    @admin.action(description='تغییر صنف شاگردان انتخاب شده', permissions=['change'])
+    def change_class(self, request, queryset):
+        form, page = action_form(self, request, queryset, StudentClassChangeForm, 'تغییر صنف')
+        if page:
+            return page
+        school_class = form.cleaned_data['school_class']
+        self._bulk_update(
+            request, queryset, f'{{count}} شاگرد به صنف {school_class.name} منتقل شد.',
+            school_class=(school_class, school_class.pk),
+        )
+
+    @admin.action(description='تغییر فیس ماهانه شاگردان انتخاب شده', permissions=['change'])
+    def adjust_fee(self, request, queryset):
+        form, page = action_form(self, request, queryset, FeeAdjustmentForm, 'تغییر فیس ماهانه')
+        if page:
+            return page
+        mode, value = form.cleaned_data['mode'], form.cleaned_data['value']
+        cent = Decimal('0.01')
+        if mode == FeeAdjustmentForm.MODE_SET:
+            change = (value, value)
+        elif mode == FeeAdjustmentForm.MODE_AMOUNT:
+            if queryset.filter(monthly_fee__lte=-value).exists():
+                self.message_user(request, 'فیس بعضی شاگردان صفر یا منفی می‌شود؛ تغییری ذخیره نشد.', messages.ERROR)
+                return None
+            change = (F('monthly_fee') + value, lambda s: s.monthly_fee + value)
+        else:
+            factor = (Decimal('100') + value) / Decimal('100')
+            change = (
+                Round(F('monthly_fee') * Value(factor), 2),
+                lambda s: (s.monthly_fee * factor).quantize(cent, rounding=ROUND_HALF_UP),
+            )
+        self._bulk_update(request, queryset, 'فیس ماهانه {count} شاگرد تغییر کرد.', monthly_fee=change)
 
 
 @admin.register(FeePayment)
@@ -55,14 +281,14 @@ class FeePaymentAdmin(admin.ModelAdmin):
         'payment_date', 'created_at'
     ]
     list_filter = [
-        'payment_method', 'payment_date', 'month_year',
-        'student__class_name'
+        'payment_method', 'payment_date', PeriodFilter, PaymentClassFilter
     ]
     search_fields = [
-        'student__name', 'student__student_id', 'notes'
+        'student__name', 'student__student_id', 'notes', 'client_key'
     ]
-    date_hierarchy = 'payment_date'
-    readonly_fields = ['created_at']
+    show_full_result_count = False
+    paginator = CachedCountPaginator
+    readonly_fields = ['created_at', 'client_key']
     autocomplete_fields = ['student']
     
     fieldsets = (
@@ -73,7 +299,7 @@ class FeePaymentAdmin(admin.ModelAdmin):
             'fields': ('payment_date', 'notes')
         }),
         ('اطلاعات سیستم', {
-            'fields': ('created_at',),
+            'fields': ('created_at', 'client_key'),
             'classes': ('collapse',)
         }),
     )
@@ -81,6 +307,137 @@ class FeePaymentAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('student')
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip FeePayment.delete(), so rebuild allocations here
+        student_ids = set(queryset.values_list('student_id', flat=True))
+        super().delete_queryset(request, queryset)
+        allocate_students(student_ids)
+        portal.invalidate(student_ids)
+
+
+@admin.register(FeeInvoice)
+class FeeInvoiceAdmin(admin.ModelAdmin):
+    list_display = ['student', 'month_year', 'amount_due', 'amount_paid', 'balance', 'status']
+    list_filter = ['status', 'month_year']
+    search_fields = ['student__name', 'student__student_id']
+    list_select_related = ['student']
+    readonly_fields = ['amount_paid', 'balance', 'status', 'created_at', 'updated_at']
+    autocomplete_fields = ['student']
+
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'action', 'model_name', 'object_id', 'student_ref', 'username']
+    list_filter = ['action', 'model_name']
+    search_fields = ['username']
+    readonly_fields = [
+        'model_name', 'object_id', 'student_ref', 'action', 'changes',
+        'user', 'username', 'created_at'
+    ]
+
+    # The audit trail is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BranchMembership)
+class BranchMembershipAdmin(admin.ModelAdmin):
+    list_display = ['user', 'branch']
+    list_filter = ['branch']
+    search_fields = ['user__username']
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'branch', 'status', 'progress', 'created_at', 'finished_at']
+    list_filter = ['kind', 'branch', 'status']
+    readonly_fields = [
+        'kind', 'branch', 'params', 'status', 'progress', 'result_file', 'error',
+        'created_at', 'started_at', 'finished_at'
+    ]
+
+
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ['student', 'month_year', 'phone', 'status', 'attempts', 'sent_at']
+    list_filter = ['status', 'month_year']
+    search_fields = ['student__name', 'student__student_id', 'phone']
+    list_select_related = ['student']
+    readonly_fields = [
+        'student', 'month_year', 'phone', 'message', 'status', 'attempts', 'error',
+        'created_at', 'sent_at'
+    ]
+
+
+@admin.register(ArchivedFeePayment)
+class ArchivedFeePaymentAdmin(admin.ModelAdmin):
+    list_display = ['student', 'amount', 'month_year', 'payment_date', 'payment_method', 'archived_at']
+    list_filter = ['payment_method']
+    search_fields = ['student__name', 'student__student_id', 'month_year']
+    date_hierarchy = 'payment_date'
+    show_full_result_count = False
+    paginator = CachedCountPaginator
+
+    # Archived years are changed with the archive_payments command only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedYear)
+class ArchivedYearAdmin(admin.ModelAdmin):
+    list_display = ['year', 'payments_count', 'is_complete', 'archived_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['year', 'promoted_count', 'graduated_count', 'username', 'created_at', 'reverted_at']
+    readonly_fields = [
+        'year', 'promoted_count', 'graduated_count', 'user', 'username', 'created_at', 'reverted_at'
+    ]
+    actions = ['revert_promotions']
+
+    # Promotions are made with the class action or the promote_students command
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='برگرداندن ترفیع‌های انتخاب شده', permissions=['change'])
+    def revert_promotions(self, request, queryset):
+        # Newest first, so an older promotion is only reverted after the later ones
+        for promotion in queryset.order_by('-created_at'):
+            try:
+                restored, skipped = revert_promotion(promotion)
+            except ValueError as exc:
+                self.message_user(request, f'{promotion}: {exc}', messages.ERROR)
+                continue
+            message = f'{promotion}: {restored} شاگرد برگردانده شد.'
+            if skipped:
+                message += f' {skipped} شاگرد که بعداً تغییر کرده بودند دست نخورد.'
+            self.message_user(request, message, messages.SUCCESS)
+
 
 # Custom admin site configuration
 admin.site.site_header = "سیستم مدیریت فیس - لیسه عالی خصوصی الازهر"
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class SchoolManagementConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'school_management'
+    verbose_name = 'مدیریت مکتب'
+
+    def ready(self):
+        from . import audit, choices, concurrency, live, metrics, portal
+        audit.connect()
+        choices.connect()
+        concurrency.connect()
+        live.connect()
+        metrics.connect()
+        portal.connect()
@@ -0,0 +1,144 @@
+"""Hot/cold split of fee payments by Jalali year.
+
+``manage.py archive_payments`` moves the payments of closed years from
+``FeePayment`` into ``ArchivedFeePayment`` (keeping their ids) and records the
+year in ``ArchivedYear``. Year-scoped pages read whichever table holds that
+year; all-time views (student history, exports without a year filter) union
+both tables only once something has been archived.
+
+Rows move in batches, each batch in its own transaction, so a payment is
+always in exactly one table. The year is marked incomplete before the first
+batch; until the last one has moved, year-scoped pages read the
+``PaymentRecord`` view over both tables. An interrupted move is finished by
+running it again.
+"""
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedFeePayment, ArchivedYear, FeePayment, PaymentRecord
+from .utils import year_months
+
+PAYMENT_FIELDS = [
+    'id', 'student_id', 'payment_date', 'amount', 'month_year',
+    'payment_method', 'notes', 'client_key', 'created_at',
+]
+# Stay below SQLite's limit on query parameters
+MAX_BATCH_SIZE = 900
+
+
+def has_archive():
+    return ArchivedYear.objects.exists()
+
+
+def archived_years():
+    return set(ArchivedYear.objects.values_list('year', flat=True))
+
+
+def is_archived(year):
+    return year is not None and ArchivedYear.objects.filter(year=year).exists()
+
+
+def payment_model_for_year(year):
+    """Table holding the payments of ``year``; the view over both while they are moving."""
+    if year is None:
+        return FeePayment
+    complete = ArchivedYear.objects.filter(year=year).values_list('is_complete', flat=True).first()
+    if complete is None:
+        return FeePayment
+    return ArchivedFeePayment if complete else PaymentRecord
+
+
+def payment_models(year=None):
+    """Tables to read for ``year``, or for all time when ``year`` is None."""
+    if year is not None:
+        model = payment_model_for_year(year)
+        return [FeePayment, ArchivedFeePayment] if model is PaymentRecord else [model]
+    return [FeePayment, ArchivedFeePayment] if has_archive() else [FeePayment]
+
+
+def student_payment_history(student):
+    """All payments of ``student`` as dicts, newest first, across both tables."""
+    # Compound statements can't carry the models' default ordering
+    live = student.payments.order_by().values(*PAYMENT_FIELDS)
+    if not has_archive():
+        return live.order_by('-payment_date', '-id')
+    archived = student.archived_payments.order_by().values(*PAYMENT_FIELDS)
+    return live.union(archived, all=True).order_by('-payment_date', '-id')
+
+
+def student_payment_totals():
+    """``(total, count)`` expressions over both tables, for annotating ``Student`` querysets."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    total, count = Value(Decimal('0.00'), output_field=money), Value(0, output_field=IntegerField())
+    for model in payment_models():
+        rows = model.objects.filter(student=OuterRef('pk')).order_by().values('student')
+        total += Coalesce(
+            Subquery(rows.annotate(total=Sum('amount')).values('total'), output_field=money),
+            Value(Decimal('0.00')), output_field=money,
+        )
+        count += Coalesce(
+            Subquery(rows.annotate(count=Count('pk')).values('count'), output_field=IntegerField()),
+            Value(0), output_field=IntegerField(),
+        )
+    return total, count
+
+
+def _delete_ids(model, ids):
+    # Raw delete: a bulk move must not fire per-row signals (audit, ledger)
+    db = router.db_for_write(model)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connections[db].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE id IN ({placeholders})', ids)
+
+
+def _move(source, target, year, batch_size, progress=None):
+    db = router.db_for_write(source)
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    moved = 0
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                source.objects.filter(month_year__range=year_months(year))
+                .order_by('pk').values(*PAYMENT_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            objs = [target(**row) for row in rows]
+            target.objects.bulk_create(objs)
+            if target is FeePayment:
+                # bulk_create stamps auto_now_add fields; keep the original times
+                for obj, row in zip(objs, rows):
+                    obj.created_at = row['created_at']
+                target.objects.bulk_update(objs, ['created_at'])
+            _delete_ids(source, [row['id'] for row in rows])
+        moved += len(rows)
+        if progress:
+            progress(moved)
+    return moved
+
+
+def incomplete_years():
+    """Years whose move to or from the archive was started but not finished."""
+    return list(ArchivedYear.objects.filter(is_complete=False).values_list('year', flat=True))
+
+
+def archive_year(year, batch_size=500, progress=None):
+    """Move ``year``'s payments to the archive in batches; returns the count moved."""
+    # Marked first: new payments for the year are refused and reads use both tables
+    ArchivedYear.objects.update_or_create(year=year, defaults={'is_complete': False})
+    moved = _move(FeePayment, ArchivedFeePayment, year, batch_size, progress)
+    total = ArchivedFeePayment.objects.filter(month_year__range=year_months(year)).count()
+    ArchivedYear.objects.update_or_create(year=year, defaults={'payments_count': total, 'is_complete': True})
+    return moved
+
+
+def restore_year(year, batch_size=500, progress=None):
+    """Move ``year``'s payments back to the live table."""
+    # Reads use both tables while rows move back; unmarked once all are live
+    ArchivedYear.objects.filter(year=year).update(is_complete=False)
+    moved = _move(ArchivedFeePayment, FeePayment, year, batch_size, progress)
+    ArchivedYear.objects.filter(year=year).delete()
+    return moved
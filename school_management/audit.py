@@ -0,0 +1,232 @@
+"""Append-only audit trail for students and payments.
+
+Signal handlers diff each saved ``Student``/``FeePayment`` against its stored
+row and queue an ``AuditLog`` row once the transaction commits. Nothing is
+done when rows are loaded: the stored values of an update are read with one
+primary-key query in ``pre_save``, and kept on the instance after each save
+so a follow-up save of the same object needs no query. Rows are kept in an in-memory buffer and written with one
+``bulk_create`` when the request finishes, or by a background timer in
+long-running processes (workers, management commands), so a cashier's save
+never waits on a second insert.
+
+``changes`` format: ``{"field": [old, new]}`` for updates and
+``{"field": value}`` for creates and deletes. Foreign keys are stored as ids.
+
+Bulk ORM operations (``bulk_create``, ``QuerySet.update``) bypass signals and
+are not audited unless the caller passes the rows to :func:`record_created` or
+:func:`record_updated`.
+"""
+import atexit
+import contextvars
+import datetime
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import models, router, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+# Timestamps that change on every save and carry no information
+IGNORED_FIELDS = {'created_at', 'updated_at'}
+
+_current_user = contextvars.ContextVar('audit_user', default=None)
+_in_request = contextvars.ContextVar('audit_in_request', default=False)
+_buffer = []
+_lock = threading.Lock()
+_timer = None
+
+
+class AuditUserMiddleware:
+    """Remember the logged-in user for audit entries made during the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        token = _current_user.set(user if user is not None and user.is_authenticated else None)
+        request_token = _in_request.set(True)
+        try:
+            return self.get_response(request)
+        finally:
+            _in_request.reset(request_token)
+            _current_user.reset(token)
+
+
+@contextmanager
+def acting_as(user):
+    """Attribute entries in the block to ``user`` (e.g. after API authentication)."""
+    token = _current_user.set(user)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def _serialize(field, value):
+    if value is None:
+        return None
+    if isinstance(field, models.DecimalField):
+        # Normalise so 1200 and 1200.00 do not show up as a change
+        return f"{Decimal(value):.{field.decimal_places}f}"
+    if isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+        return field.to_python(value).isoformat()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _tracked_fields(instance):
+    return [f for f in instance._meta.concrete_fields if not f.primary_key and f.name not in IGNORED_FIELDS]
+
+
+def _snapshot(instance):
+    return {f.name: _serialize(f, getattr(instance, f.attname)) for f in _tracked_fields(instance)}
+
+
+def _student_ref(instance):
+    return instance.pk if instance._meta.model_name == 'student' else instance.student_id
+
+
+def _queue(instance, action, changes):
+    """Buffer an entry on commit; ``changes`` may be a callable evaluated at flush."""
+    user = _current_user.get()
+    db = instance._state.db or router.db_for_write(type(instance))
+    entry = {
+        # Flushing happens after the request, so remember the branch database
+        '_db': db,
+        'model_name': instance._meta.model_name,
+        'object_id': instance.pk,
+        'student_ref': _student_ref(instance),
+        'action': action,
+        'changes': changes,
+        'user_id': user.pk if user else None,
+        'username': user.get_username() if user else '',
+        'created_at': timezone.now(),
+    }
+
+    def append():
+        with _lock:
+            _buffer.append(entry)
+        # Requests flush when they finish; elsewhere a timer does it
+        if not _in_request.get():
+            _ensure_timer()
+
+    # Only record changes that were actually committed, in the branch's database
+    transaction.on_commit(append, using=db)
+
+
+def _ensure_timer():
+    global _timer
+    if _timer is None or not _timer.is_alive():
+        _timer = threading.Timer(getattr(settings, 'AUDIT_FLUSH_INTERVAL', 5), _timed_flush)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _timed_flush():
+    from django.db import connections
+
+    try:
+        flush()
+    finally:
+        connections.close_all()
+
+
+def flush():
+    """Write buffered audit rows with one batched insert."""
+    from .models import AuditLog
+
+    with _lock:
+        entries = _buffer[:]
+        del _buffer[:]
+    by_db = {}
+    for entry in entries:
+        if callable(entry['changes']):
+            entry['changes'] = entry['changes']()
+        by_db.setdefault(entry.pop('_db') or 'default', []).append(AuditLog(**entry))
+    for db, rows in by_db.items():
+        AuditLog.objects.using(db).bulk_create(rows, batch_size=500)
+    return len(entries)
+
+
+def record_created(instances):
+    """Audit rows inserted with ``bulk_create``, which sends no signals."""
+    for instance in instances:
+        _queue(instance, 'create', _snapshot(instance))
+
+
+def record_updated(instances, **values):
+    """Audit a ``QuerySet.update`` of ``instances``, loaded before the update.
+
+    ``values`` maps field names to the new value, or to a callable computing
+    it from the instance (for updates with ``F()`` expressions).
+    """
+    for instance in instances:
+        changes = {}
+        for name, value in values.items():
+            field = instance._meta.get_field(name)
+            old = _serialize(field, getattr(instance, field.attname))
+            new = _serialize(field, value(instance) if callable(value) else value)
+            if old != new:
+                changes[name] = [old, new]
+        if changes:
+            _queue(instance, 'update', changes)
+
+
+def _stored_snapshot(instance, using):
+    """Snapshot of ``instance``'s row as stored; None if it isn't saved yet."""
+    fields = _tracked_fields(instance)
+    row = (
+        type(instance)._base_manager.using(using).filter(pk=instance.pk)
+        .values_list(*[f.attname for f in fields]).first()
+    )
+    if row is None:
+        return None
+    return {f.name: _serialize(f, value) for f, value in zip(fields, row)}
+
+
+def _on_pre_save(sender, instance, raw, using, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        instance._audit_original = None
+    elif getattr(instance, '_audit_original', None) is None:
+        instance._audit_original = _stored_snapshot(instance, using)
+
+
+def _on_save(sender, instance, created, **kwargs):
+    current = _snapshot(instance)
+    original = getattr(instance, '_audit_original', None)
+    # The next save of this object diffs against what was just written
+    instance._audit_original = current
+    if created or original is None:
+        # Built at flush so values filled in by a follow-up save are included
+        _queue(instance, 'create', lambda: _snapshot(instance))
+        return
+    changes = {
+        name: [original.get(name), value]
+        for name, value in current.items()
+        if original.get(name) != value
+    }
+    # Student ids are generated right after the first insert; not a user edit
+    if changes.get('student_id', [True])[0] is None:
+        del changes['student_id']
+    if changes:
+        _queue(instance, 'update', changes)
+
+
+def _on_delete(sender, instance, **kwargs):
+    _queue(instance, 'delete', _snapshot(instance))
+
+
+def connect():
+    from .models import Student, FeePayment
+
+    for model in (Student, FeePayment):
+        pre_save.connect(_on_pre_save, sender=model, dispatch_uid=f'audit_pre_save_{model.__name__}')
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'audit_save_{model.__name__}')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'audit_delete_{model.__name__}')
+    request_finished.connect(lambda **kwargs: flush(), dispatch_uid='audit_flush', weak=False)
+    atexit.register(flush)
@@ -0,0 +1,203 @@
+"""Online backups of the SQLite databases.
+
+:func:`backup_database` copies a live database with SQLite's online backup
+API, ``BACKUP_STEP_PAGES`` pages at a time with a short sleep between steps,
+so cashiers saving payments are never held up for long. The copy is checked
+with ``PRAGMA integrity_check`` and gzip-compressed into ``BACKUP_DIR`` as
+``<branch>-<YYYYmmdd-HHMMSS>.sqlite3.gz``. :func:`prune_backups` keeps the
+newest hourly backups plus one per day and one per week;
+:func:`restore_database` verifies a backup and copies it back into the live
+database.
+
+SQLite restarts a stepped backup whenever another connection writes to the
+source. If that keeps happening, the copy is finished in a single step; in
+WAL mode that step only needs a read snapshot and doesn't block writers.
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections
+
+BACKUP_NAME = re.compile(r'^(?P<alias>[\w-]+?)-(?P<stamp>\d{8}-\d{6})\.sqlite3(\.gz)?$')
+STAMP_FORMAT = '%Y%m%d-%H%M%S'
+# Consecutive restarts of a stepped backup before copying in one step
+MAX_RESTARTS = 3
+
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_dir():
+    return str(getattr(settings, 'BACKUP_DIR', None) or os.path.join(settings.BASE_DIR, 'backups'))
+
+
+def database_path(alias):
+    conn = connections[alias]
+    if conn.vendor != 'sqlite' or conn.is_in_memory_db():
+        raise ValueError(f"{alias} is not an on-disk SQLite database")
+    return str(conn.settings_dict['NAME'])
+
+
+def check_integrity(path):
+    """Raise ``ValueError`` unless ``PRAGMA integrity_check`` passes for ``path``."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as exc:
+        # "file is not a database" and the like
+        result = [str(exc)]
+    finally:
+        conn.close()
+    if result != ['ok']:
+        raise ValueError(f"Integrity check failed for {path}: {'; '.join(result[:5])}")
+
+
+def _copy(source, target_path, pages, sleep, progress=None):
+    """Copy the open ``source`` connection into a new database at ``target_path``."""
+    state = {'remaining': None, 'restarts': 0}
+
+    def step(status, remaining, total):
+        # More pages left than after the previous step means SQLite started over
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= MAX_RESTARTS:
+                raise _Restarted
+        state['remaining'] = remaining
+        if progress:
+            progress(total - remaining, total)
+
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=step, sleep=sleep)
+        except _Restarted:
+            source.backup(target, pages=-1)
+        # The copy inherits WAL mode; a standalone file shouldn't need -wal/-shm files
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+    return state['restarts']
+
+
+def backup_database(alias='default', directory=None, compress=True, pages=None, sleep=None, progress=None):
+    """Back up database ``alias``; returns the path of the new backup file.
+
+    ``progress`` is called with ``(pages_done, pages_total)`` after each step.
+    """
+    source_path = database_path(alias)
+    directory = directory or backup_dir()
+    os.makedirs(directory, exist_ok=True)
+    pages = pages or getattr(settings, 'BACKUP_STEP_PAGES', 256)
+    sleep = getattr(settings, 'BACKUP_STEP_SLEEP', 0.05) if sleep is None else sleep
+
+    name = f"{alias}-{datetime.now():{STAMP_FORMAT}}.sqlite3"
+    fd, partial = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+    os.close(fd)
+    try:
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        try:
+            _copy(source, partial, pages, sleep, progress)
+        finally:
+            source.close()
+        check_integrity(partial)
+        final = os.path.join(directory, name + ('.gz' if compress else ''))
+        if compress:
+            with open(partial, 'rb') as src, gzip.open(f"{partial}.gz", 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(partial)
+            partial = f"{partial}.gz"
+        # Only complete, verified backups ever get a backup file name
+        os.replace(partial, final)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return final
+
+
+def list_backups(alias, directory=None):
+    """``(taken_at, path)`` of ``alias``'s backups, newest first."""
+    directory = directory or backup_dir()
+    found = []
+    if not os.path.isdir(directory):
+        return found
+    for filename in os.listdir(directory):
+        match = BACKUP_NAME.match(filename)
+        if match and match['alias'] == alias:
+            found.append((datetime.strptime(match['stamp'], STAMP_FORMAT), os.path.join(directory, filename)))
+    return sorted(found, reverse=True)
+
+
+def prune_backups(alias, directory=None, keep_hourly=None, keep_daily=None, keep_weekly=None):
+    """Delete backups outside the retention policy; returns the deleted paths.
+
+    Kept: the newest ``keep_hourly`` backups, the newest backup of each of the
+    last ``keep_daily`` days and of each of the last ``keep_weekly`` weeks.
+    """
+    keep_hourly = getattr(settings, 'BACKUP_KEEP_HOURLY', 24) if keep_hourly is None else keep_hourly
+    keep_daily = getattr(settings, 'BACKUP_KEEP_DAILY', 14) if keep_daily is None else keep_daily
+    keep_weekly = getattr(settings, 'BACKUP_KEEP_WEEKLY', 8) if keep_weekly is None else keep_weekly
+
+    backups = list_backups(alias, directory)
+    if not backups:
+        return []
+    newest = backups[0][0]
+    keep = {path for _, path in backups[:keep_hourly]}
+    days, weeks = set(), set()
+    for taken_at, path in backups:
+        day = taken_at.date()
+        if day not in days and newest.date() - day < timedelta(days=keep_daily):
+            days.add(day)
+            keep.add(path)
+        week = day - timedelta(days=day.weekday())
+        if week not in weeks and newest.date() - week < timedelta(weeks=keep_weekly):
+            weeks.add(week)
+            keep.add(path)
+    deleted = [path for _, path in backups if path not in keep]
+    for path in deleted:
+        os.remove(path)
+    return deleted
+
+
+def restore_database(backup_path, alias='default'):
+    """Verify ``backup_path`` and copy it over database ``alias``.
+
+    Returns the path of the safety backup taken of the current database first.
+    """
+    target_path = database_path(alias)
+    directory = os.path.dirname(os.path.abspath(target_path))
+    fd, unpacked = tempfile.mkstemp(prefix='.restore-', suffix='.sqlite3', dir=directory)
+    os.close(fd)
+    try:
+        if backup_path.endswith('.gz'):
+            try:
+                with gzip.open(backup_path, 'rb') as src, open(unpacked, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            except (EOFError, gzip.BadGzipFile, zlib.error) as exc:
+                raise ValueError(f"Can't decompress {backup_path}: {exc}")
+        else:
+            shutil.copyfile(backup_path, unpacked)
+        check_integrity(unpacked)
+
+        safety = backup_database(alias)
+        connections[alias].close()
+        source = sqlite3.connect(unpacked)
+        target = sqlite3.connect(target_path, timeout=30)
+        try:
+            # One step, so other connections never see a half-restored database
+            source.backup(target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(unpacked)
+    check_integrity(target_path)
+    return safety
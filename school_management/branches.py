@@ -0,0 +1,125 @@
+"""Campus branches, each with its own SQLite database.
+
+Branches are configured in ``settings.BRANCHES``; every branch code is also a
+database alias (the first branch uses ``default``). :class:`BranchMiddleware`
+picks the branch for a request from the host name or, failing that, from the
+user's :class:`~school_management.models.BranchMembership`, and
+:class:`BranchRouter` sends student/payment data to that branch's database.
+Users, sessions, memberships and the job queue stay in ``default``.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULT_BRANCH = 'default'
+
+# school_management models shared by all branches, kept in the default database
+SHARED_MODELS = {'branchmembership', 'backgroundjob'}
+
+_current_branch = contextvars.ContextVar('branch', default=DEFAULT_BRANCH)
+
+
+def get_branches():
+    """``(code, name)`` pairs in configured order."""
+    branches = getattr(settings, 'BRANCHES', None) or {DEFAULT_BRANCH: {'name': ''}}
+    return [(code, conf.get('name', code)) for code, conf in branches.items()]
+
+
+def branch_name(code):
+    return dict(get_branches()).get(code, code)
+
+
+def current_branch():
+    return _current_branch.get()
+
+
+@contextmanager
+def use_branch(code):
+    """Route data queries to ``code`` for the duration of the block."""
+    if code not in dict(get_branches()):
+        raise ValueError(f"Unknown branch: {code}")
+    token = _current_branch.set(code)
+    try:
+        yield code
+    finally:
+        _current_branch.reset(token)
+
+
+def branch_for_request(request):
+    """Branch selected by host name first, then by the user's membership."""
+    host = request.get_host().split(':')[0].lower()
+    for code, conf in getattr(settings, 'BRANCHES', {}).items():
+        if host in [h.lower() for h in conf.get('hosts', [])]:
+            return code
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        from .models import BranchMembership
+
+        code = BranchMembership.objects.filter(user=user).values_list('branch', flat=True).first()
+        if code in dict(get_branches()):
+            return code
+    return DEFAULT_BRANCH
+
+
+class BranchMiddleware:
+    """Select the branch database for each request; sets ``request.branch``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.branch = branch_for_request(request)
+        request.branch_name = branch_name(request.branch)
+        with use_branch(request.branch):
+            return self.get_response(request)
+
+
+class BranchRouter:
+    """Send school data to the current branch's database."""
+
+    def _db(self, model):
+        meta = model._meta
+        if meta.app_label == 'school_management' and meta.model_name not in SHARED_MODELS:
+            return current_branch()
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_BRANCH:
+            return None
+        # Branch databases only hold the per-branch school tables
+        return app_label == 'school_management' and model_name not in SHARED_MODELS
+
+
+def _in_branch(code, func, args):
+    try:
+        with use_branch(code):
+            return func(*args)
+    finally:
+        # Each thread has its own connections; don't leave them open
+        connections.close_all()
+
+
+def map_branches(func, *args, max_workers=None):
+    """Run ``func(*args)`` once per branch in parallel; returns ``{code: result}``."""
+    codes = [code for code, _ in get_branches()]
+    if len(codes) == 1:
+        # Nothing to overlap; also keeps the caller's connection (and transaction)
+        with use_branch(codes[0]):
+            return {codes[0]: func(*args)}
+    with ThreadPoolExecutor(max_workers=max_workers or len(codes)) as pool:
+        futures = {code: pool.submit(_in_branch, code, func, args) for code in codes}
+        return {code: future.result() for code, future in futures.items()}
@@ -0,0 +1,186 @@
+"""Cash received by ``payment_date``, as opposed to the accrual ``month_year``.
+
+A date range is split into day, week (Saturday to Friday) or Jalali month
+buckets. Each bucket is labelled in SQL with a ``CASE`` on ``payment_date``, so
+the range and its same-period-last-year comparison are summed by one grouped
+query per payment table.
+"""
+import datetime
+from decimal import Decimal
+
+import jdatetime
+from django.db.models import Case, Count, DateField, F, Q, Sum, Value, When
+
+from .utils import get_afghan_month_name, parse_jalali
+
+GRANULARITIES = ('day', 'week', 'month')
+# Keep the bucket list (and the CASE) to a sensible size
+MAX_DAYS = {'day': 366, 'week': 3 * 366, 'month': 5 * 366}
+# jdatetime weekday(): Saturday is 0
+WEEK_START = 0
+
+
+def jalali_label(date):
+    return jdatetime.date.fromgregorian(date=date).strftime('%Y/%m/%d')
+
+
+def shift_year(date, years=-1):
+    """Same Jalali day ``years`` away; 30 Hoot falls back to 29 in common years."""
+    j = jdatetime.date.fromgregorian(date=date)
+    try:
+        return jdatetime.date(j.year + years, j.month, j.day).togregorian()
+    except ValueError:
+        return jdatetime.date(j.year + years, j.month, j.day - 1).togregorian()
+
+
+def parse_cash_flow_filters(params):
+    """``(start, end, granularity, compare)`` from query params, with defaults.
+
+    ``from``/``to`` are Jalali dates; the default range is the current Jalali
+    month up to today. Dates are returned as Gregorian ``datetime.date``.
+    """
+    today = jdatetime.date.today()
+    start = parse_jalali(params.get('from')) or today.replace(day=1)
+    end = parse_jalali(params.get('to')) or today
+    granularity = params.get('granularity')
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+    start, end = start.togregorian(), end.togregorian()
+    if end < start:
+        start, end = end, start
+    end = min(end, start + datetime.timedelta(days=MAX_DAYS[granularity] - 1))
+    compare = params.get('compare') in ('1', 'true', 'on')
+    return start, end, granularity, compare
+
+
+def bucket_starts(start, end, granularity):
+    """First day of every bucket in ``start``..``end``; the first is clamped to ``start``."""
+    starts = [start]
+    if granularity == 'day':
+        day = start + datetime.timedelta(days=1)
+        while day <= end:
+            starts.append(day)
+            day += datetime.timedelta(days=1)
+    elif granularity == 'week':
+        offset = (jdatetime.date.fromgregorian(date=start).weekday() - WEEK_START) % 7
+        day = start + datetime.timedelta(days=7 - offset)
+        while day <= end:
+            starts.append(day)
+            day += datetime.timedelta(days=7)
+    else:
+        j = jdatetime.date.fromgregorian(date=start)
+        year, month = j.year, j.month
+        while True:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            day = jdatetime.date(year, month, 1).togregorian()
+            if day > end:
+                break
+            starts.append(day)
+    return starts
+
+
+def bucket_label(start, end, granularity):
+    if granularity == 'day':
+        return jalali_label(start)
+    if granularity == 'month':
+        j = jdatetime.date.fromgregorian(date=start)
+        return f"{get_afghan_month_name(j.month)} {j.year}"
+    return f"{jalali_label(start)} - {jalali_label(end)}"
+
+
+def _buckets(start, end, granularity):
+    """``(first_day, last_day, label)`` for each bucket."""
+    starts = bucket_starts(start, end, granularity)
+    ends = [day - datetime.timedelta(days=1) for day in starts[1:]] + [end]
+    return [(s, e, bucket_label(s, e, granularity)) for s, e in zip(starts, ends)]
+
+
+def _grouped_totals(ranges, starts, granularity):
+    """``{bucket_start: (total, count)}`` for payments dated inside ``ranges``."""
+    from .archive import payment_models
+
+    in_range = Q()
+    for first, last in ranges:
+        in_range |= Q(payment_date__range=(first, last))
+    if granularity == 'day':
+        bucket = F('payment_date')
+    else:
+        # Latest start first: the first matching WHEN is the payment's bucket
+        bucket = Case(
+            *[When(payment_date__gte=s, then=Value(s)) for s in sorted(starts, reverse=True)],
+            output_field=DateField(),
+        )
+
+    totals = {}
+    # One query per table; the archive is only read once something is archived
+    for model in payment_models():
+        rows = (
+            model.objects.filter(in_range).order_by()
+            .annotate(bucket=bucket).values('bucket')
+            .annotate(total_amount=Sum('amount'), payment_count=Count('id'))
+        )
+        for row in rows:
+            amount, count = totals.get(row['bucket'], (Decimal('0.00'), 0))
+            totals[row['bucket']] = (amount + row['total_amount'], count + row['payment_count'])
+    return totals
+
+
+def cash_flow(start, end, granularity='day', compare=False):
+    """Cash received per bucket between ``start`` and ``end`` (Gregorian dates).
+
+    With ``compare`` every row also carries the same bucket of the period one
+    Jalali year earlier (matched by position).
+    """
+    if compare:
+        # The two periods must not overlap, so compare at most one year
+        end = min(end, shift_year(start, 1) - datetime.timedelta(days=1))
+    buckets = _buckets(start, end, granularity)
+    ranges = [(start, end)]
+    starts = [b[0] for b in buckets]
+    previous = []
+    if compare:
+        prev_start, prev_end = shift_year(start), shift_year(end)
+        previous = _buckets(prev_start, prev_end, granularity)
+        ranges.append((prev_start, prev_end))
+        # Both periods share one CASE; the ranges are disjoint
+        starts += [b[0] for b in previous]
+
+    totals = _grouped_totals(ranges, starts, granularity)
+    empty = (Decimal('0.00'), 0)
+    rows = []
+    for index, (first, last, label) in enumerate(buckets):
+        amount, count = totals.get(first, empty)
+        row = {
+            'start': first,
+            'end': last,
+            'label': label,
+            'total_amount': amount,
+            'payment_count': count,
+        }
+        if compare:
+            prev = previous[index] if index < len(previous) else None
+            prev_amount, prev_count = totals.get(prev[0], empty) if prev else empty
+            row.update({
+                'previous_label': prev[2] if prev else '',
+                'previous_amount': prev_amount,
+                'previous_count': prev_count,
+                'change': amount - prev_amount,
+            })
+        rows.append(row)
+
+    summary = {
+        'start': start,
+        'end': end,
+        'total_amount': sum((r['total_amount'] for r in rows), Decimal('0.00')),
+        'payment_count': sum(r['payment_count'] for r in rows),
+    }
+    if compare:
+        summary['previous_amount'] = sum((r['previous_amount'] for r in rows), Decimal('0.00'))
+        summary['previous_count'] = sum(r['previous_count'] for r in rows)
+        # Previous buckets beyond the current count (e.g. an extra week) still count
+        for first, _, _ in previous[len(buckets):]:
+            amount, count = totals.get(first, empty)
+            summary['previous_amount'] += amount
+            summary['previous_count'] += count
+        summary['change'] = summary['total_amount'] - summary['previous_amount']
+    return rows, summary
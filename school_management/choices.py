@@ -0,0 +1,72 @@
+"""Choice lists for the filter bars and forms, and the data version of their fragments.
+
+The month and year lists are built once at import. Forms get them through
+callables: Django deep-copies a field's choices for every form instance,
+but a callable is copied by reference, so a batch of row forms doesn't
+copy 301 years per row.
+
+Filter bars and student dropdowns are cached as template fragments keyed by
+:func:`data_version`, a per-branch counter bumped whenever students or
+classes change. Saves and deletions bump it through signals; set-based
+updates (``QuerySet.update``) call :func:`bump_data_version` themselves.
+With the default per-process cache other workers notice a bump only when
+their fragments expire, so fragments are only kept for five minutes.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .branches import DEFAULT_BRANCH, current_branch
+from .utils import AFGHAN_MONTHS
+
+MONTH_CHOICES = tuple(enumerate(AFGHAN_MONTHS, 1))
+YEARS = tuple(range(1300, 1601))
+YEAR_CHOICES = tuple((year, str(year)) for year in YEARS)
+
+
+def month_choices():
+    return MONTH_CHOICES
+
+
+def year_choices():
+    return YEAR_CHOICES
+
+
+def _version_key(branch):
+    return f"data-version:{branch}"
+
+
+def data_version(branch=None):
+    """Version of ``branch``'s students and classes, for fragment cache keys."""
+    branch = branch or current_branch()
+    version = cache.get(_version_key(branch))
+    if version is None:
+        # Seeded from the clock so a lost counter never reuses an old version
+        cache.add(_version_key(branch), int(time.time()), None)
+        version = cache.get(_version_key(branch))
+    return f"{branch}.{version}"
+
+
+def bump_data_version(branch=None):
+    branch = branch or current_branch()
+    try:
+        cache.incr(_version_key(branch))
+    except ValueError:
+        # Not set yet; the first data_version() call seeds it
+        pass
+
+
+def _on_change(sender, instance, **kwargs):
+    branch = instance._state.db or DEFAULT_BRANCH
+    # After commit, so a fragment cached under the new version never holds old rows
+    transaction.on_commit(lambda: bump_data_version(branch), using=branch)
+
+
+def connect():
+    from .models import SchoolClass, Student
+
+    for model in (Student, SchoolClass):
+        post_save.connect(_on_change, sender=model, dispatch_uid=f'choices_{model._meta.model_name}_save')
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f'choices_{model._meta.model_name}_delete')
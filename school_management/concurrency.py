@@ -0,0 +1,80 @@
+"""Concurrent reads: query fan-out and SQLite WAL mode.
+
+:func:`fan_out` runs independent aggregate blocks of a page in a small thread
+pool. Each thread opens its own database connection and sees the caller's
+context (current branch, audit user). SQLite releases the GIL while a query
+runs, and in WAL mode readers don't block each other or the writer, so the
+blocks overlap instead of running back to back.
+
+``manage.py benchmark_fanout`` compares a page with and without fan-out.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+_serial = contextvars.ContextVar('fan_out_serial', default=False)
+
+
+@contextmanager
+def serial():
+    """Run fan-outs in the calling thread within the block (e.g. while profiling)."""
+    token = _serial.set(True)
+    try:
+        yield
+    finally:
+        _serial.reset(token)
+
+
+def _run(context, func):
+    try:
+        return context.run(func)
+    finally:
+        # Pool threads are discarded after the call; don't leave connections open
+        connections.close_all()
+
+
+def _in_transaction():
+    # Other threads can't see uncommitted rows (or a test's in-memory database)
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def fan_out(**blocks):
+    """Run each zero-argument callable in ``blocks``; returns ``{name: result}``.
+
+    Blocks must return evaluated data (lists, dicts, numbers), not lazy
+    querysets. They run one after another in the calling thread when
+    ``settings.QUERY_FANOUT`` is off, inside a transaction or inside
+    :func:`serial`.
+    """
+    if (
+        len(blocks) < 2 or not getattr(settings, 'QUERY_FANOUT', False)
+        or _serial.get() or _in_transaction()
+    ):
+        return {name: func() for name, func in blocks.items()}
+    workers = min(len(blocks), getattr(settings, 'QUERY_FANOUT_WORKERS', 4))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(_run, contextvars.copy_context(), func)
+            for name, func in blocks.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _enable_wal(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    if not getattr(settings, 'SQLITE_WAL', False):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # Safe with WAL; at worst the last commits are lost on power failure
+        cursor.execute('PRAGMA synchronous=NORMAL')
+
+
+def connect():
+    connection_created.connect(_enable_wal, dispatch_uid='sqlite_wal')
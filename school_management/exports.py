@@ -0,0 +1,158 @@
+"""Payment filtering and CSV export helpers shared by views and background jobs."""
+import csv
+
+import jdatetime
+from django.db.models import Q
+
+from . import metrics
+from .archive import payment_model_for_year, payment_models
+from .models import FeePayment
+from .utils import get_afghan_month_name, year_months
+
+
+PAYMENT_EXPORT_HEADER = ['تاریخ پرداخت', 'شاگرد', 'شماره شاگرد', 'صنف', 'مقدار', 'ماه/سال', 'روش پرداخت', 'یادداشت']
+REPORT_EXPORT_HEADER = ['سال', 'ماه'] + PAYMENT_EXPORT_HEADER
+
+
+def _parse_int(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def filter_payments(params, model=None):
+    """Apply the payment_list filters and sorting in ``params``.
+
+    Reads the table holding the selected year (the live table when no year is
+    selected) unless ``model`` is given.
+    """
+    year_int = _parse_int((params.get('year') or '').strip())
+    model = model or payment_model_for_year(year_int)
+    qs = model.objects.select_related('student__school_class')
+
+    search = (params.get('search') or '').strip()
+    class_id = _parse_int((params.get('class') or '').strip())
+    month_int = _parse_int((params.get('month') or '').strip())
+    student_id = (params.get('student') or '').strip()
+
+    if search:
+        qs = qs.filter(
+            Q(student__name__icontains=search) |
+            Q(student__student_id__icontains=search) |
+            Q(student__father_name__icontains=search)
+        )
+
+    if class_id:
+        qs = qs.filter(student__school_class_id=class_id)
+
+    # Month/Year filter logic using month_year stored as YYYY-MM
+    if year_int and month_int:
+        qs = qs.filter(month_year=f"{year_int}-{month_int:02d}")
+    elif year_int:
+        qs = qs.filter(month_year__range=year_months(year_int))
+    elif month_int:
+        qs = qs.filter(month_year__endswith=f"-{month_int:02d}")
+
+    if student_id:
+        qs = qs.filter(student_id=student_id)
+
+    # Sorting
+    sort_map = {
+        'payment_date': 'payment_date',
+        'amount': 'amount',
+    }
+    sort_field = sort_map.get(params.get('sort', 'payment_date'), 'payment_date')
+    if params.get('dir', 'desc') == 'asc':
+        qs = qs.order_by(sort_field, '-id')
+    else:
+        qs = qs.order_by(f'-{sort_field}', '-id')
+    return qs
+
+
+def export_payment_querysets(params):
+    """Filtered querysets for a payments export; includes the archive for all-time exports."""
+    year_int = _parse_int((params.get('year') or '').strip())
+    return [filter_payments(params, model) for model in payment_models(year_int)]
+
+
+def parse_report_filters(params):
+    """Validate the reports year/month/class filters.
+
+    Returns ``(year, month_int, class_id)``; ``class`` is a SchoolClass pk.
+    """
+    year = _parse_int(params.get('year')) or jdatetime.date.today().year
+    month_int = _parse_int(params.get('month'))
+    if month_int is not None and (month_int < 1 or month_int > 12):
+        month_int = None
+    class_id = _parse_int(params.get('class'))
+    return year, month_int, class_id
+
+
+def filter_report_payments(year, month_int=None, class_id=None):
+    """Base reports queryset filtered by year/month and optional class."""
+    model = payment_model_for_year(year)
+    qs = model.objects.select_related('student__school_class').filter(month_year__range=year_months(year))
+    if month_int:
+        qs = qs.filter(month_year=f"{year}-{month_int:02d}")
+    if class_id:
+        qs = qs.filter(student__school_class_id=class_id)
+    return qs
+
+
+def report_export_filename(year, month_int=None):
+    return f"report_{year}{'-'+str(month_int).zfill(2) if month_int else ''}.csv"
+
+
+def payment_export_row(p):
+    return [
+        p.payment_date.strftime('%Y/%m/%d'),
+        p.student.name,
+        p.student.student_id or '',
+        p.student.school_class.name,
+        str(p.amount),
+        p.month_year,
+        p.payment_method,
+        (p.notes or '').replace('\n', ' ').strip(),
+    ]
+
+
+def report_export_row(p, year):
+    month_num = int(p.month_year.split('-')[1]) if p.month_year else 0
+    return [year, get_afghan_month_name(month_num)] + payment_export_row(p)
+
+
+def write_payments_csv(fileobj, querysets, progress=None, chunk_size=1000):
+    """Write the payment_list CSV export for ``querysets`` into ``fileobj``.
+
+    ``querysets`` is the list from :func:`export_payment_querysets`; the live
+    table comes first and archived (older) years follow.
+    ``progress`` is called with the number of rows written after every chunk.
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(PAYMENT_EXPORT_HEADER)
+    written = 0
+    with metrics.timer('export_duration_seconds', export='payments'):
+        for qs in querysets:
+            for p in qs.iterator(chunk_size=chunk_size):
+                writer.writerow(payment_export_row(p))
+                written += 1
+                if progress and written % chunk_size == 0:
+                    progress(written)
+    metrics.inc('export_rows_total', written, export='payments')
+    return written
+
+
+def write_report_csv(fileobj, qs, year, progress=None, chunk_size=1000):
+    """Write the reports CSV export for ``qs`` into ``fileobj``."""
+    writer = csv.writer(fileobj)
+    writer.writerow(REPORT_EXPORT_HEADER)
+    written = 0
+    with metrics.timer('export_duration_seconds', export='report'):
+        for p in qs.order_by('-payment_date', '-id').iterator(chunk_size=chunk_size):
+            writer.writerow(report_export_row(p, year))
+            written += 1
+            if progress and written % chunk_size == 0:
+                progress(written)
+    metrics.inc('export_rows_total', written, export='report')
+    return written
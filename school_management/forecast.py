@@ -0,0 +1,226 @@
+"""Forecast of fee collections up to the end of a Jalali year.
+
+Each active student is expected to pay the unpaid part of their
+``monthly_fee`` for every remaining month of the year with probability
+``punctuality × season[month]``:
+
+* punctuality: the share of their fee the student paid per month over the
+  last ``HISTORY_MONTHS`` months since they registered, smoothed towards the
+  school-wide rate so new students get the school average;
+* season: how the school-wide rate for that calendar month compares with
+  the average month (e.g. fewer payments in the winter holidays).
+
+Payment history is read in one query over the live and archive tables
+into flat arrays (a students × months coverage grid and a students × 12
+grid of what is already paid this year), and every figure is computed
+column-wise over those arrays. The bands treat students' payments as
+independent: the expected amount ± ``Z`` standard deviations, clipped to
+what can still be paid.
+"""
+import math
+from array import array
+from decimal import Decimal
+
+import jdatetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import metrics
+from .archive import payment_models
+from .branches import current_branch
+from .models import SchoolClass, Student
+from .utils import get_afghan_month_name
+
+HISTORY_MONTHS = 24
+# Months of the school-wide rate a student's own punctuality is blended with
+PRIOR_WEIGHT = 3
+# Student-months of the overall rate each calendar month's rate is blended
+# with, so a month with little history stays close to average
+SEASON_PRIOR = 30
+# Two-sided 90% normal interval
+CONFIDENCE = 90
+Z = 1.645
+CENT = Decimal('0.01')
+
+
+def _money(value):
+    return Decimal(str(round(value, 2))).quantize(CENT)
+
+
+def _period(year, month):
+    return year * 12 + month - 1
+
+
+def _month_year(period):
+    return f"{period // 12}-{period % 12 + 1:02d}"
+
+
+def _history(first, last):
+    """``(student, month_year, amount)`` of every payment for months ``first``..``last``.
+
+    One statement over the live and archive tables, read straight from the
+    cursor: skipping the ORM's per-row Decimal conversion keeps a few
+    hundred thousand rows well under a second.
+    """
+    querysets = [
+        model.objects.filter(month_year__gte=_month_year(first), month_year__lte=_month_year(last))
+        .order_by().values_list('student', 'month_year', 'amount')
+        for model in payment_models()
+    ]
+    qs = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    sql, params = qs.query.sql_with_params()
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        yield from cursor
+
+
+def compute_forecast(year, today=None):
+    """Collected, expected and banded totals for Jalali ``year``, per class and month."""
+    today = today or jdatetime.date.today()
+    if year < today.year:
+        first_month = 13  # Nothing left to forecast
+    else:
+        first_month = today.month if year == today.year else 1
+    start = _period(year, min(first_month, 12))
+    history_start = start - HISTORY_MONTHS
+    year_start, year_end = _period(year, 1), _period(year, 12)
+
+    # Active students as parallel columns; inactive ones only for their class
+    students = Student.objects.order_by('pk').values_list(
+        'pk', 'school_class', 'is_active', 'monthly_fee', 'registration_date'
+    )
+    class_by_student, index, class_of, fee, registered = {}, {}, [], array('d'), array('q')
+    for pk, class_id, is_active, monthly_fee, registration_date in students:
+        class_by_student[pk] = class_id
+        if not is_active:
+            continue
+        index[pk] = len(class_of)
+        class_of.append(class_id)
+        fee.append(float(monthly_fee))
+        jalali = jdatetime.date.fromgregorian(date=registration_date)
+        registered.append(_period(jalali.year, jalali.month))
+    n = len(class_of)
+
+    # Coverage grid: share of the fee paid, students × history months
+    width = HISTORY_MONTHS
+    coverage = array('d', bytes(8 * n * width))
+    # Already paid for each month of ``year``: students × 12
+    paid = array('d', bytes(8 * n * 12))
+    collected_by_class, collected_by_month = {}, [0.0] * 12
+    periods = {}
+    for student, month_year, amount in _history(min(history_start, year_start), year_end):
+        period = periods.get(month_year)
+        if period is None:
+            period = periods[month_year] = _period(int(month_year[:4]), int(month_year[5:7]))
+        amount = float(amount)
+        if period >= year_start:
+            class_id = class_by_student.get(student)
+            collected_by_class[class_id] = collected_by_class.get(class_id, 0.0) + amount
+            collected_by_month[period - year_start] += amount
+        i = index.get(student)
+        if i is None:
+            continue
+        if history_start <= period < start:
+            coverage[i * width + period - history_start] += amount / fee[i]
+        if period >= year_start:
+            paid[i * 12 + period - year_start] += amount
+    # A month paid twice over still counts as one month paid
+    coverage = array('d', [min(c, 1.0) for c in coverage])
+
+    # Which history months each student was enrolled for
+    first_seen = [max(r - history_start, 0) for r in registered]
+    eligible = [max(width - f, 0) for f in first_seen]
+
+    # School-wide rate per history month, then per calendar month
+    month_paid, month_eligible = [0.0] * width, [0] * width
+    for i in range(n):
+        row = coverage[i * width:(i + 1) * width]
+        for j in range(first_seen[i], width):
+            month_paid[j] += row[j]
+            month_eligible[j] += 1
+    total_eligible = sum(month_eligible)
+    overall = sum(month_paid) / total_eligible if total_eligible else 1.0
+    season_paid, season_eligible = [0.0] * 12, [0] * 12
+    for j in range(width):
+        calendar_month = (history_start + j) % 12
+        season_paid[calendar_month] += month_paid[j]
+        season_eligible[calendar_month] += month_eligible[j]
+    season = [
+        (season_paid[m] + SEASON_PRIOR * overall) / (season_eligible[m] + SEASON_PRIOR) / overall
+        if overall else 1.0
+        for m in range(12)
+    ]
+
+    punctuality = [
+        (sum(coverage[i * width + first_seen[i]:(i + 1) * width]) + PRIOR_WEIGHT * overall)
+        / (eligible[i] + PRIOR_WEIGHT)
+        for i in range(n)
+    ]
+
+    # Expected payments and variances for each remaining month, column by column
+    expected_by_class, variance_by_class, open_by_class = {}, {}, {}
+    months = []
+    for month in range(first_month, 13):
+        column = paid[month - 1::12]
+        outstanding = [max(f - p, 0.0) for f, p in zip(fee, column)]
+        probability = [min(p * season[month - 1], 1.0) for p in punctuality]
+        expected = [o * q for o, q in zip(outstanding, probability)]
+        variance = [o * o * q * (1 - q) for o, q in zip(outstanding, probability)]
+        for class_id, e, v, o in zip(class_of, expected, variance, outstanding):
+            expected_by_class[class_id] = expected_by_class.get(class_id, 0.0) + e
+            variance_by_class[class_id] = variance_by_class.get(class_id, 0.0) + v
+            open_by_class[class_id] = open_by_class.get(class_id, 0.0) + o
+        months.append(_banded(
+            collected_by_month[month - 1], sum(expected), sum(variance), sum(outstanding),
+            month=month, month_name=get_afghan_month_name(month),
+        ))
+
+    students_by_class = {}
+    for class_id in class_of:
+        students_by_class[class_id] = students_by_class.get(class_id, 0) + 1
+    classes = []
+    for school_class in SchoolClass.objects.order_by('grade'):
+        pk = school_class.pk
+        if pk not in collected_by_class and pk not in students_by_class:
+            continue
+        classes.append(_banded(
+            collected_by_class.get(pk, 0.0), expected_by_class.get(pk, 0.0),
+            variance_by_class.get(pk, 0.0), open_by_class.get(pk, 0.0),
+            class_name=school_class.name, students=students_by_class.get(pk, 0),
+        ))
+
+    return {
+        'year': year,
+        'confidence': CONFIDENCE,
+        'first_month': first_month if first_month <= 12 else None,
+        'months': months,
+        'classes': classes,
+        **_banded(
+            sum(collected_by_class.values()), sum(expected_by_class.values()),
+            sum(variance_by_class.values()), sum(open_by_class.values()),
+        ),
+    }
+
+
+def _banded(collected, expected, variance, outstanding, **extra):
+    spread = Z * math.sqrt(variance)
+    return {
+        **extra,
+        'collected': _money(collected),
+        'expected': _money(expected),
+        'forecast': _money(collected + expected),
+        'low': _money(collected + max(expected - spread, 0.0)),
+        'high': _money(collected + min(expected + spread, outstanding)),
+    }
+
+
+def get_forecast(year):
+    """:func:`compute_forecast`, cached per branch and year."""
+    key = f"forecast:{current_branch()}:{year}"
+    data = cache.get(key)
+    metrics.cache_lookup('forecast', data is not None)
+    if data is None:
+        data = compute_forecast(year)
+        cache.set(key, data, getattr(settings, 'FORECAST_CACHE_SECONDS', 300))
+    return data
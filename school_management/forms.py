@@ -1,7 +1,12 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.forms.utils import ErrorDict
 from django.utils import timezone
-from .models import Student, FeePayment
+from .archive import is_archived
+from .cashflow import jalali_label
+from .choices import MONTH_CHOICES, YEAR_CHOICES, month_choices, year_choices
+from .models import SchoolClass, Student, FeePayment
+from .utils import parse_jalali
 import re
 import jdatetime
 from jalali_date.fields import JalaliDateField
@@ -14,7 +19,7 @@ class StudentForm(forms.ModelForm):
     class Meta:
         model = Student
         fields = [
-            'name', 'father_name', 'class_name', 
+            'name', 'father_name', 'school_class',
             'phone', 'monthly_fee'
         ]
         widgets = {
@@ -26,7 +31,7 @@ class StudentForm(forms.ModelForm):
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500',
                 'placeholder': 'نام پدر را وارد کنید'
             }),
-            'class_name': forms.Select(attrs={
+            'school_class': forms.Select(attrs={
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
             }),
             'phone': forms.TextInput(attrs={
@@ -42,22 +47,9 @@ class StudentForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Define class choices
-        self.fields['class_name'].widget.choices = [
-            ('', 'صنف را انتخاب کنید'),
-            ('اول', 'اول'),
-            ('دوم', 'دوم'),
-            ('سوم', 'سوم'),
-            ('چهارم', 'چهارم'),
-            ('پنجم', 'پنجم'),
-            ('ششم', 'ششم'),
-            ('هفتم', 'هفتم'),
-            ('هشتم', 'هشتم'),
-            ('نهم', 'نهم'),
-            ('دهم', 'دهم'),
-            ('یازدهم', 'یازدهم'),
-            ('دوازدهم', 'دوازدهم'),
-        ]
+        # Classes are listed in grade order
+        self.fields['school_class'].queryset = SchoolClass.objects.order_by('grade')
+        self.fields['school_class'].empty_label = 'صنف را انتخاب کنید'
 
     def clean_phone(self):
         phone = self.cleaned_data.get('phone', '')
@@ -80,27 +72,29 @@ class FeePaymentForm(forms.ModelForm):
     """Form for recording fee payments with separate month and year selectors."""
 
     # Separate selectors to match the template
-    MONTH_CHOICES = [
-        (1, 'حمل'), (2, 'ثور'), (3, 'جوزا'), (4, 'سرطان'),
-        (5, 'اسد'), (6, 'سنبله'), (7, 'میزان'), (8, 'عقرب'),
-        (9, 'قوس'), (10, 'جدی'), (11, 'دلو'), (12, 'حوت')
-    ]
-    YEAR_CHOICES = [(y, str(y)) for y in range(1300, 1601)]
+    MONTH_CHOICES = MONTH_CHOICES
+    YEAR_CHOICES = YEAR_CHOICES
+    # Ask for confirmation before recording the same amount twice for a month
+    warn_duplicates = True
 
     month = forms.ChoiceField(
-        choices=MONTH_CHOICES,
+        choices=month_choices,
         label='ماه',
         widget=forms.Select(attrs={
             'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
         })
     )
     year = forms.ChoiceField(
-        choices=YEAR_CHOICES,
+        choices=year_choices,
         label='سال',
         widget=forms.Select(attrs={
             'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
         })
     )
+    confirm_duplicate = forms.BooleanField(
+        required=False,
+        label='با وجود پرداخت مشابه ثبت شود'
+    )
 
     class Meta:
         model = FeePayment
@@ -125,8 +119,12 @@ class FeePaymentForm(forms.ModelForm):
             }),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, archived_years=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # Earlier payment this one repeats, set by clean()
+        self.duplicate = None
+        # Batches load the archived years once for all their rows; None asks per form
+        self.archived_years = archived_years
         # Only show active students
         self.fields['student'].queryset = Student.objects.filter(is_active=True).order_by('name')
 
@@ -164,9 +162,44 @@ class FeePaymentForm(forms.ModelForm):
         if year_int < 1300 or year_int > 1600:
             raise ValidationError('سال باید بین 1300 تا 1600 باشد.')
 
+        if self.archived_years is not None:
+            archived = year_int in self.archived_years
+        else:
+            archived = is_archived(year_int)
+        if archived:
+            raise ValidationError('این سال بایگانی شده است و پرداخت جدید پذیرفته نمی‌شود.')
+
         cleaned['month_year'] = f"{year_int}-{month_int:02d}"
+        self.check_duplicate(cleaned)
         return cleaned
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # A prefetched student is known to exist; skip the model's per-row FK query
+        if isinstance(self.fields['student'], PrefetchedStudentField):
+            exclude.add('student')
+        return exclude
+
+    def check_duplicate(self, cleaned):
+        """Stop a second payment of the same amount for the same student and month.
+
+        Uses the (student, month_year) index. The cashier can still record it
+        by ticking ``confirm_duplicate``.
+        """
+        student, amount = cleaned.get('student'), cleaned.get('amount')
+        if not self.warn_duplicates or cleaned.get('confirm_duplicate') or student is None or amount is None:
+            return
+        self.duplicate = (
+            FeePayment.objects.filter(student=student, month_year=cleaned['month_year'], amount=amount)
+            .exclude(pk=self.instance.pk).order_by('-payment_date').first()
+        )
+        if self.duplicate is not None:
+            raise ValidationError(
+                f'پرداخت {amount} افغانی برای {student.name} در همین ماه قبلاً در تاریخ '
+                f'{jalali_label(self.duplicate.payment_date)} ثبت شده است. '
+                'اگر پرداخت دوم درست است، گزینه تأیید را انتخاب کنید.'
+            )
+
     def save(self, commit=True):
         instance = super().save(commit=False)
         # Ensure month_year is set from cleaned data
@@ -182,18 +215,156 @@ class FeePaymentForm(forms.ModelForm):
         return instance
 
 
+class ClassBatchSelectForm(forms.Form):
+    """Class and Jalali month for entering a whole class's payments at once"""
+
+    school_class = forms.ModelChoiceField(
+        queryset=SchoolClass.objects.order_by('grade'),
+        label='صنف',
+        empty_label='انتخاب صنف',
+        widget=forms.Select(attrs={
+            'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
+        })
+    )
+    month = forms.TypedChoiceField(
+        choices=month_choices,
+        coerce=int,
+        initial=jdatetime.date.today().month,
+        label='ماه',
+        widget=forms.Select(attrs={
+            'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
+        })
+    )
+    year = forms.TypedChoiceField(
+        choices=year_choices,
+        coerce=int,
+        initial=jdatetime.date.today().year,
+        label='سال',
+        widget=forms.Select(attrs={
+            'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
+        })
+    )
+
+
+class PrefetchedStudentField(forms.ModelChoiceField):
+    """Student choice resolved from a dict loaded once for a whole batch"""
+
+    def __init__(self, students, **kwargs):
+        self.students = students
+        super().__init__(queryset=Student.objects.none(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.students[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class BatchPaymentRowForm(FeePaymentForm):
+    """One student's row in the class batch; same rules as a single payment.
+
+    Month and year come from the batch header, and rows left unticked are
+    not validated or saved. ``students`` maps primary keys to the class's
+    active students, loaded once by the view, so rows don't each query for
+    their student.
+    """
+
+    include = forms.BooleanField(required=False, label='ثبت')
+    # The batch already shows what each student paid this month
+    warn_duplicates = False
+
+    class Meta(FeePaymentForm.Meta):
+        widgets = {
+            'student': forms.HiddenInput(),
+            'amount': forms.NumberInput(attrs={
+                'class': 'w-32 px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500',
+                'step': '0.01'
+            }),
+            'payment_method': forms.Select(attrs={
+                'class': 'px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
+            }),
+            'notes': forms.TextInput(attrs={
+                'class': 'w-full px-2 py-1 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500',
+                'placeholder': 'یادداشت (اختیاری)'
+            }),
+        }
+
+    def __init__(self, *args, students=None, month=None, year=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only students of the selected class can be posted back
+        self.fields['student'] = PrefetchedStudentField(students or {}, widget=forms.HiddenInput())
+        # Disabled fields ignore posted data and always use the header values
+        for name, value in (('month', month), ('year', year)):
+            self.fields[name].initial = value
+            self.fields[name].disabled = True
+
+    @property
+    def is_included(self):
+        field = self['include']
+        return field.field.to_python(field.data) if self.is_bound else bool(self.initial.get('include'))
+
+    def full_clean(self):
+        if self.is_bound and not self.is_included:
+            self._errors = ErrorDict()
+            self.cleaned_data = {'include': False}
+            return
+        super().full_clean()
+
+
+class PaymentSyncForm(FeePaymentForm):
+    """One payment from an offline cashier client; same rules as a single payment.
+
+    ``students`` maps primary keys to the batch's active students so rows
+    don't each query for their student. ``payment_date`` is the Jalali day
+    the money was received (today if omitted).
+    """
+
+    payment_date = forms.CharField(required=False)
+    # Retries are caught by client_key; nobody is there to confirm a warning
+    warn_duplicates = False
+
+    class Meta(FeePaymentForm.Meta):
+        fields = ['student', 'amount', 'payment_method', 'notes', 'client_key']
+
+    def __init__(self, *args, students=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['student'] = PrefetchedStudentField(students or {})
+        self.fields['client_key'].required = True
+
+    def clean_payment_date(self):
+        value = self.cleaned_data.get('payment_date')
+        if not value:
+            return None
+        date = parse_jalali(value)
+        if date is None:
+            raise ValidationError('تاریخ پرداخت معتبر نیست (YYYY/MM/DD).')
+        if date > jdatetime.date.today():
+            raise ValidationError('تاریخ پرداخت نمی‌تواند در آینده باشد.')
+        return date.togregorian()
+
+    def validate_unique(self):
+        # client_key is checked once for the whole batch by sync.ingest_payments
+        pass
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if self.cleaned_data.get('payment_date'):
+            instance.payment_date = self.cleaned_data['payment_date']
+        if commit:
+            instance.save()
+        return instance
+
+
 class ReportFilterForm(forms.Form):
     """Form for filtering reports"""
     
-    YEAR_CHOICES = [(year, str(year)) for year in range(1300, 1601)]
-    MONTH_CHOICES = [
-        (1, 'حمل'), (2, 'ثور'), (3, 'جوزا'), (4, 'سرطان'),
-        (5, 'اسد'), (6, 'سنبله'), (7, 'میزان'), (8, 'عقرب'),
-        (9, 'قوس'), (10, 'جدی'), (11, 'دلو'), (12, 'حوت')
-    ]
+    YEAR_CHOICES = YEAR_CHOICES
+    MONTH_CHOICES = MONTH_CHOICES
     
     year = forms.ChoiceField(
-        choices=YEAR_CHOICES,
+        choices=year_choices,
         initial=jdatetime.date.today().year,
         widget=forms.Select(attrs={
             'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
@@ -202,7 +373,7 @@ class ReportFilterForm(forms.Form):
     )
     
     month = forms.ChoiceField(
-        choices=MONTH_CHOICES,
+        choices=month_choices,
         initial=jdatetime.date.today().month,
         widget=forms.Select(attrs={
             'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline:none focus:ring-2 focus:ring-blue-500'
@@ -223,17 +394,64 @@ class StudentSearchForm(forms.Form):
         label='جستجو'
     )
     
-    class_filter = forms.ChoiceField(
+    class_filter = forms.ModelChoiceField(
+        queryset=SchoolClass.objects.order_by('grade'),
         required=False,
+        empty_label='همه صنف‌ها',
         widget=forms.Select(attrs={
             'class': 'px-3 py-2 border border-gray-300 rounded-md focus:outline:none focus:ring-2 focus:ring-blue-500'
         }),
         label='فیلتر بر اساس صنف'
     )
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Get unique class names from database
-        classes = Student.objects.values_list('class_name', flat=True).distinct().order_by('class_name')
-        class_choices = [('', 'همه صنف‌ها')] + [(cls, cls) for cls in classes if cls]
-        self.fields['class_filter'].choices = class_choices
+
+
+class StudentClassChangeForm(forms.Form):
+    """Admin bulk action: move the selected students to another class"""
+
+    school_class = forms.ModelChoiceField(
+        queryset=SchoolClass.objects.order_by('grade'),
+        label='صنف جدید'
+    )
+
+
+class FeeAdjustmentForm(forms.Form):
+    """Admin bulk action: change the monthly fee of the selected students"""
+
+    MODE_SET = 'set'
+    MODE_AMOUNT = 'amount'
+    MODE_PERCENT = 'percent'
+    MODE_CHOICES = [
+        (MODE_SET, 'تعیین فیس جدید'),
+        (MODE_AMOUNT, 'افزایش/کاهش به مقدار'),
+        (MODE_PERCENT, 'افزایش/کاهش به فیصد'),
+    ]
+
+    mode = forms.ChoiceField(choices=MODE_CHOICES, label='نوع تغییر')
+    value = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        label='مقدار',
+        help_text='برای کاهش، عدد منفی وارد کنید'
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        mode, value = cleaned_data.get('mode'), cleaned_data.get('value')
+        if value is None:
+            return cleaned_data
+        if mode == self.MODE_SET and value <= 0:
+            raise ValidationError('فیس ماهانه باید بیشتر از صفر باشد.')
+        if mode == self.MODE_PERCENT and value <= -100:
+            raise ValidationError('کاهش نمی‌تواند ۱۰۰ فیصد یا بیشتر باشد.')
+        return cleaned_data
+
+
+class PromotionForm(forms.Form):
+    """Admin action: confirm the year-end promotion of the selected classes"""
+
+    year = forms.IntegerField(
+        min_value=1300,
+        max_value=1600,
+        initial=lambda: jdatetime.date.today().year,
+        label='سال تعلیمی جدید'
+    )
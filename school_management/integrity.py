@@ -0,0 +1,147 @@
+"""Data-integrity scan of students, payments and the ledger.
+
+:func:`scan` yields one :class:`Issue` per problem found, streaming every
+table in primary-key or student order with ``QuerySet.iterator`` so memory
+stays bounded by ``chunk_size`` rows plus one student's payments. Payments
+are merge-joined with the student stream (both in student order), so:
+
+* ``duplicate_payment``: same student, ``month_year``, amount and payment
+  date as an earlier payment, found through a per-student hash index;
+* ``malformed_period``: ``month_year`` not in ``YYYY-MM`` form;
+* ``fee_mismatch``: a student's payments for a month don't add up to their
+  ``monthly_fee`` (partial payments and fee changes show up here too);
+* ``orphan_payment``: the payment's student no longer exists.
+
+Students are checked for a missing ``student_id`` (``missing_student_id``)
+and a missing class (``orphan_student``); invoices and payment allocations
+pointing at deleted students, payments or invoices are ``orphan_invoice``
+and ``orphan_allocation``.
+"""
+import csv
+import os
+import re
+from collections import Counter, namedtuple
+from itertools import groupby
+
+import jdatetime
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .archive import payment_models
+from .branches import current_branch
+from .models import FeeInvoice, PaymentAllocation, SchoolClass, Student
+
+INTEGRITY_DIR = 'integrity'
+PERIOD = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+Issue = namedtuple('Issue', 'check table pk student month_year detail')
+
+
+def _students(chunk_size):
+    return Student.objects.order_by('pk').values_list(
+        'pk', 'student_id', 'school_class', 'monthly_fee'
+    ).iterator(chunk_size=chunk_size)
+
+
+def _scan_students(chunk_size):
+    table = Student._meta.db_table
+    classes = set(SchoolClass.objects.values_list('pk', flat=True))
+    for pk, student_id, class_id, _ in _students(chunk_size):
+        if not student_id:
+            yield Issue('missing_student_id', table, pk, pk, '', 'student_id is empty')
+        if class_id not in classes:
+            yield Issue('orphan_student', table, pk, pk, '', f'class {class_id} does not exist')
+
+
+def _check_student_payments(table, student, fee, payments):
+    """Issues in one student's payments (sorted by ``month_year``, then pk)."""
+    seen = {}
+    for month_year, rows in groupby(payments, key=lambda row: row[1]):
+        rows = list(rows)
+        if not PERIOD.match(month_year or ''):
+            for pk, _, amount, _ in rows:
+                yield Issue('malformed_period', table, pk, student, month_year, f'amount {amount}')
+            continue
+        for pk, _, amount, payment_date in rows:
+            key = (month_year, amount, payment_date)
+            first = seen.setdefault(key, pk)
+            if first != pk:
+                yield Issue(
+                    'duplicate_payment', table, pk, student, month_year,
+                    f'same amount {amount} and date {payment_date} as payment {first}',
+                )
+        total = sum(amount for _, _, amount, _ in rows)
+        if fee is not None and total != fee:
+            yield Issue(
+                'fee_mismatch', table, rows[0][0], student, month_year,
+                f'paid {total} of monthly fee {fee} in {len(rows)} payment(s)',
+            )
+
+
+def _scan_payments(model, chunk_size):
+    table = model._meta.db_table
+    payments = model.objects.order_by('student_id', 'month_year', 'pk').values_list(
+        'student_id', 'pk', 'month_year', 'amount', 'payment_date'
+    ).iterator(chunk_size=chunk_size)
+    students = _students(chunk_size)
+    current = next(students, None)
+    for student, rows in groupby(payments, key=lambda row: row[0]):
+        rows = [row[1:] for row in rows]
+        # Both streams are in student order: advance the students to this one
+        while current is not None and current[0] < student:
+            current = next(students, None)
+        if current is None or current[0] != student:
+            for pk, month_year, amount, _ in rows:
+                yield Issue('orphan_payment', table, pk, student, month_year, f'amount {amount}')
+            continue
+        yield from _check_student_payments(table, student, current[3], rows)
+
+
+def _scan_ledger(chunk_size):
+    invoices = FeeInvoice.objects.filter(~Exists(Student.objects.filter(pk=OuterRef('student_id'))))
+    for pk, student, month_year in invoices.order_by('pk').values_list(
+        'pk', 'student_id', 'month_year'
+    ).iterator(chunk_size=chunk_size):
+        yield Issue('orphan_invoice', FeeInvoice._meta.db_table, pk, student, month_year, 'student does not exist')
+
+    allocations = PaymentAllocation.objects.all()
+    for model in payment_models():
+        allocations = allocations.filter(~Exists(model.objects.filter(pk=OuterRef('payment_id'))))
+    invoice_missing = ~Exists(FeeInvoice.objects.filter(pk=OuterRef('invoice_id')))
+    allocations = allocations | PaymentAllocation.objects.filter(invoice_missing)
+    for pk, payment, invoice in allocations.order_by('pk').values_list(
+        'pk', 'payment_id', 'invoice_id'
+    ).iterator(chunk_size=chunk_size):
+        yield Issue(
+            'orphan_allocation', PaymentAllocation._meta.db_table, pk, '', '',
+            f'payment {payment} / invoice {invoice} missing',
+        )
+
+
+def scan(chunk_size=2000):
+    """Yield every :class:`Issue` in the current branch's database."""
+    yield from _scan_students(chunk_size)
+    for model in payment_models():
+        yield from _scan_payments(model, chunk_size)
+    yield from _scan_ledger(chunk_size)
+
+
+def default_report_path():
+    branch = current_branch()
+    suffix = '' if branch == 'default' else f'-{branch}'
+    stamp = jdatetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(settings.MEDIA_ROOT, INTEGRITY_DIR, f'integrity-{stamp}{suffix}.csv')
+
+
+def write_report(issues, path):
+    """Write ``issues`` to a CSV file as they arrive; returns the count per check."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    counts = Counter()
+    # utf-8-sig so spreadsheet programs detect the encoding
+    with open(path, 'w', newline='', encoding='utf-8-sig') as out:
+        writer = csv.writer(out)
+        writer.writerow(Issue._fields)
+        for issue in issues:
+            writer.writerow(issue)
+            counts[issue.check] += 1
+    return counts
@@ -0,0 +1,182 @@
+"""Small database-backed job queue for exports, report builds and reminders.
+
+Views call :func:`enqueue`; ``manage.py run_workers`` claims pending jobs and
+runs them in a process pool via :func:`run_job`. Results are written as files
+under ``MEDIA_ROOT/jobs/``.
+
+A job whose worker is killed or crashes stays "running" with nobody to
+finish it. ``run_workers`` fails such jobs once they have run longer than
+``JOB_TIMEOUT_SECONDS`` (:func:`fail_stale_jobs`), and puts the jobs it was
+running back in the queue when it is stopped with Ctrl-C (:func:`requeue_jobs`).
+"""
+import csv
+import datetime
+import os
+import traceback
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .branches import current_branch, use_branch
+from .models import BackgroundJob
+
+JOBS_DIR = 'jobs'
+PROGRESS_CHUNK = 1000
+
+
+def enqueue(kind, params=None, branch=None):
+    """Queue a job of ``kind`` with JSON-serialisable ``params`` for a branch."""
+    return BackgroundJob.objects.create(kind=kind, params=params or {}, branch=branch or current_branch())
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to running and return it."""
+    pending = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_PENDING)
+    for job_id in pending.order_by('created_at').values_list('id', flat=True)[:5]:
+        # Conditional UPDATE so two workers never claim the same job
+        claimed = BackgroundJob.objects.filter(
+            pk=job_id, status=BackgroundJob.STATUS_PENDING
+        ).update(status=BackgroundJob.STATUS_RUNNING, started_at=timezone.now())
+        if claimed:
+            return BackgroundJob.objects.get(pk=job_id)
+    return None
+
+
+def fail_stale_jobs(max_age=None):
+    """Fail running jobs started more than ``max_age`` seconds ago; returns how many."""
+    if max_age is None:
+        max_age = getattr(settings, 'JOB_TIMEOUT_SECONDS', 60 * 60)
+    now = timezone.now()
+    return BackgroundJob.objects.filter(
+        status=BackgroundJob.STATUS_RUNNING, started_at__lt=now - datetime.timedelta(seconds=max_age),
+    ).update(
+        status=BackgroundJob.STATUS_FAILED,
+        error=f"The worker stopped without finishing the job within {max_age} seconds.",
+        finished_at=now,
+    )
+
+
+def requeue_jobs(job_ids):
+    """Return claimed jobs to the queue, e.g. when their workers are stopped."""
+    return BackgroundJob.objects.filter(pk__in=job_ids, status=BackgroundJob.STATUS_RUNNING).update(
+        status=BackgroundJob.STATUS_PENDING, started_at=None, progress=0,
+    )
+
+
+def _set_progress(job_id, done, total):
+    percent = min(99, int(done * 100 / total)) if total else 0
+    BackgroundJob.objects.filter(pk=job_id).update(progress=percent)
+
+
+def _result_path(job, filename):
+    relative = f"{JOBS_DIR}/{job.pk}-{filename}"
+    absolute = os.path.join(settings.MEDIA_ROOT, relative)
+    os.makedirs(os.path.dirname(absolute), exist_ok=True)
+    return relative, absolute
+
+
+def _payments_export(job):
+    from .exports import export_payment_querysets, write_payments_csv
+
+    querysets = export_payment_querysets(job.params)
+    total = sum(qs.count() for qs in querysets)
+    relative, absolute = _result_path(job, 'payments.csv')
+    with open(absolute, 'w', newline='', encoding='utf-8') as fh:
+        write_payments_csv(
+            fh, querysets,
+            progress=lambda done: _set_progress(job.pk, done, total),
+            chunk_size=PROGRESS_CHUNK,
+        )
+    return relative
+
+
+def _report_export(job):
+    from .exports import filter_report_payments, parse_report_filters, report_export_filename, write_report_csv
+
+    year, month_int, class_id = parse_report_filters(job.params)
+    qs = filter_report_payments(year, month_int, class_id)
+    total = qs.count()
+    relative, absolute = _result_path(job, report_export_filename(year, month_int))
+    with open(absolute, 'w', newline='', encoding='utf-8') as fh:
+        write_report_csv(
+            fh, qs, year,
+            progress=lambda done: _set_progress(job.pk, done, total),
+            chunk_size=PROGRESS_CHUNK,
+        )
+    return relative
+
+
+def _statements(job):
+    from .statements import generate_statements
+
+    params = job.params
+    fmt = 'html' if params.get('format') == 'html' else 'zip'
+    year = int(params['year']) if str(params.get('year', '')).isdigit() else None
+    relative, absolute = _result_path(job, f"statements.{fmt}")
+    # Already inside a pool worker, so render inline rather than nesting pools
+    generate_statements(
+        year=year,
+        class_id=int(params['class']) if str(params.get('class', '')).isdigit() else None,
+        fmt=fmt,
+        include_receipts=bool(params.get('receipts')),
+        output_path=absolute,
+        workers=0,
+        progress=lambda done, total: _set_progress(job.pk, done, total),
+    )
+    return relative
+
+
+def _reminders(job):
+    from .models import Reminder
+    from .reminders import send_reminders
+
+    month_year = job.params['month_year']
+    send_reminders(month_year, progress=lambda done, total: _set_progress(job.pk, done, total))
+    # The delivery report of every reminder of the month
+    relative, absolute = _result_path(job, f"reminders-{month_year}.csv")
+    rows = Reminder.objects.filter(month_year=month_year).order_by('pk').values_list(
+        'student__student_id', 'student__name', 'phone', 'status', 'attempts', 'sent_at', 'error'
+    )
+    with open(absolute, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['student_id', 'name', 'phone', 'status', 'attempts', 'sent_at', 'error'])
+        writer.writerows(rows.iterator(chunk_size=PROGRESS_CHUNK))
+    return relative
+
+
+HANDLERS = {
+    BackgroundJob.KIND_PAYMENTS_EXPORT: _payments_export,
+    BackgroundJob.KIND_REPORT_EXPORT: _report_export,
+    BackgroundJob.KIND_STATEMENTS: _statements,
+    BackgroundJob.KIND_REMINDERS: _reminders,
+}
+
+
+def run_job(job_id):
+    """Execute a claimed job; runs inside a worker process."""
+    job = BackgroundJob.objects.get(pk=job_id)
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        with use_branch(job.branch):
+            relative = handler(job)
+    except Exception:
+        BackgroundJob.objects.filter(pk=job_id).update(
+            status=BackgroundJob.STATUS_FAILED,
+            error=traceback.format_exc(),
+            finished_at=timezone.now(),
+        )
+        status = BackgroundJob.STATUS_FAILED
+    else:
+        BackgroundJob.objects.filter(pk=job_id).update(
+            status=BackgroundJob.STATUS_DONE,
+            progress=100,
+            result_file=relative,
+            finished_at=timezone.now(),
+        )
+        status = BackgroundJob.STATUS_DONE
+    finally:
+        connections.close_all()
+    return status
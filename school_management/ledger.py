@@ -0,0 +1,184 @@
+"""Monthly dues invoices and allocation of payments against them.
+
+``generate_invoices`` bills every active student for a Jalali month with one
+idempotent ``bulk_create``.
+
+Payments are applied in the order they were recorded (by id). Each first
+covers the invoice for its own month; any excess settles the oldest open
+invoices, so arrears are cleared before later months. Whatever is left over
+stays as credit and is applied once later invoices exist.
+
+A new payment always comes last in that order, so :func:`apply_payment`
+allocates it to the student's open invoices alone. Edits and deletions can
+change earlier allocations; ``allocate_students`` rebuilds them.
+
+Archived payments (see :mod:`school_management.archive`) keep their ids and
+their allocations, so both payment tables are read here.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+import jdatetime
+from django.db import router, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+BATCH_SIZE = 500
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_range(start, end):
+    """``(year, month)`` pairs from ``start`` to ``end`` inclusive."""
+    current = start
+    while current <= end:
+        yield current
+        current = _next_month(*current)
+
+
+def generate_invoices(year, month, student_ids=None):
+    """Create missing invoices for ``year``/``month``; returns how many were added.
+
+    Students registered after the month are skipped. Existing invoices are left
+    untouched, so the job can be re-run safely.
+    """
+    from .models import Student, FeeInvoice
+
+    month_year = f"{year}-{month:02d}"
+    next_start = jdatetime.date(*_next_month(year, month), 1).togregorian()
+    students = Student.objects.filter(is_active=True, registration_date__lt=next_start)
+    if student_ids is not None:
+        students = students.filter(pk__in=student_ids)
+
+    invoices = [
+        FeeInvoice(student_id=pk, month_year=month_year, amount_due=fee, balance=fee)
+        for pk, fee in students.values_list('pk', 'monthly_fee').iterator()
+    ]
+    existing = FeeInvoice.objects.filter(month_year=month_year)
+    with transaction.atomic(using=router.db_for_write(FeeInvoice)):
+        before = existing.count()
+        FeeInvoice.objects.bulk_create(invoices, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        created = existing.count() - before
+
+    # Apply carried-forward credit to the new invoices
+    if created:
+        allocate_students(students_with_credit())
+    return created
+
+
+def students_with_credit():
+    """Primary keys of students whose payments are not fully allocated."""
+    from .archive import student_payment_totals
+    from .models import Student, PaymentAllocation
+
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid, _ = student_payment_totals()
+    subquery = (
+        PaymentAllocation.objects.filter(invoice__student=OuterRef('pk'))
+        .values('invoice__student').annotate(total=Sum('amount')).values('total')
+    )
+    allocated = Coalesce(Subquery(subquery, output_field=money), Value(Decimal('0.00')), output_field=money)
+    return list(
+        Student.objects.annotate(paid=paid, allocated=allocated)
+        .filter(paid__gt=F('allocated')).values_list('pk', flat=True)
+    )
+
+
+def _allocate(payment_id, month_year, amount, invoices, paid):
+    """Allocations of one payment over ``invoices`` (by month), updating ``paid``.
+
+    Its own month's invoice comes first, then the oldest open ones.
+    """
+    from .models import PaymentAllocation
+
+    allocations = []
+    remaining = amount
+    for invoice in sorted(invoices, key=lambda invoice: invoice.month_year != month_year):
+        if remaining <= 0:
+            break
+        open_amount = invoice.amount_due - paid[invoice.pk]
+        if open_amount <= 0:
+            continue
+        applied = min(open_amount, remaining)
+        allocations.append(PaymentAllocation(payment_id=payment_id, invoice=invoice, amount=applied))
+        paid[invoice.pk] += applied
+        remaining -= applied
+    return allocations
+
+
+def _save_paid(invoices, paid):
+    """Store ``paid`` amounts on the invoices whose amount or status changed."""
+    from .models import FeeInvoice
+
+    changed = []
+    now = timezone.now()
+    for invoice in invoices:
+        before = (invoice.amount_paid, invoice.status)
+        invoice.set_paid(paid[invoice.pk])
+        if (invoice.amount_paid, invoice.status) != before:
+            invoice.updated_at = now
+            changed.append(invoice)
+    FeeInvoice.objects.bulk_update(
+        changed, ['amount_paid', 'balance', 'status', 'updated_at'], batch_size=BATCH_SIZE
+    )
+
+
+def apply_payment(payment):
+    """Allocate a newly recorded payment to its student's open invoices."""
+    from .models import FeeInvoice, PaymentAllocation
+
+    with transaction.atomic(using=router.db_for_write(FeeInvoice)):
+        invoices = list(
+            FeeInvoice.objects.filter(student_id=payment.student_id)
+            .exclude(status=FeeInvoice.STATUS_PAID).order_by('month_year')
+        )
+        paid = {invoice.pk: invoice.amount_paid for invoice in invoices}
+        allocations = _allocate(payment.pk, payment.month_year, payment.amount, invoices, paid)
+        if allocations:
+            PaymentAllocation.objects.bulk_create(allocations)
+            _save_paid([a.invoice for a in allocations], paid)
+
+
+def allocate_students(student_ids):
+    """Recompute allocations, paid amounts and statuses for ``student_ids``."""
+    from .archive import payment_models
+    from .models import FeeInvoice, PaymentAllocation
+
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+
+    # Branch data lives in the branch's database, not necessarily ``default``
+    with transaction.atomic(using=router.db_for_write(FeeInvoice)):
+        invoices = defaultdict(list)
+        for invoice in FeeInvoice.objects.filter(student_id__in=student_ids).order_by('month_year'):
+            invoices[invoice.student_id].append(invoice)
+        payments = sorted(
+            row
+            for model in payment_models()
+            for row in model.objects.filter(student_id__in=student_ids).values_list(
+                'id', 'student_id', 'month_year', 'amount'
+            )
+        )
+
+        paid = defaultdict(Decimal)
+        allocations = []
+        for payment_id, student_id, month_year, amount in payments:
+            allocations.extend(_allocate(payment_id, month_year, amount, invoices[student_id], paid))
+
+        PaymentAllocation.objects.filter(invoice__student_id__in=student_ids).delete()
+        PaymentAllocation.objects.bulk_create(allocations, batch_size=BATCH_SIZE)
+        _save_paid([invoice for student_invoices in invoices.values() for invoice in student_invoices], paid)
+
+
+def reallocate_all(chunk_size=BATCH_SIZE):
+    """Rebuild allocations for every student, in chunks."""
+    from .models import Student
+
+    ids = list(Student.objects.values_list('pk', flat=True))
+    for start in range(0, len(ids), chunk_size):
+        allocate_students(ids[start:start + chunk_size])
+    return len(ids)
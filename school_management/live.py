@@ -0,0 +1,300 @@
+"""Live dashboard updates over Server-Sent Events.
+
+Each process keeps, per branch, the dashboard counters for the current Jalali
+month in memory. They are seeded from the database when the first dashboard
+connects. New payments then adjust them incrementally and are pushed as small
+deltas to every open ``/dashboard/stream/`` connection.
+
+Edits and deletions of payments, and student changes, can't be applied as
+simple deltas, so they mark the counters stale. The next event reseeds them
+once. Nothing is tracked while no dashboard of a branch is open: the counters
+are dropped with the last subscriber and payments skip the work entirely.
+
+Signals only fire in the process that saved, so deltas only cover payments
+saved by this process. Writes from other processes (another web worker,
+``run_workers``, management commands) are caught by a cheap fingerprint of
+the branch's payments and students, checked at most once per keep-alive
+interval while a dashboard is open; a change reseeds the counters and pushes
+a fresh snapshot, so they show up within ``KEEPALIVE_SECONDS``.
+"""
+import json
+import queue
+import threading
+import time
+from decimal import Decimal
+
+import jdatetime
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .branches import DEFAULT_BRANCH, use_branch
+
+KEEPALIVE_SECONDS = 15
+MAX_SUBSCRIBERS = 50
+
+_lock = threading.Lock()
+_states = {}
+_subscribers = {}
+
+
+def _current_month_year():
+    today = jdatetime.date.today()
+    return today.year, today.month
+
+
+def _seed():
+    """Dashboard counters from the database for the current branch."""
+    from django.db.models import Sum
+    from .archive import payment_models
+    from .models import FeePayment
+
+    year, month = _current_month_year()
+    summary = FeePayment.get_monthly_summary(year, month)
+    classes = FeePayment.get_class_wise_collections(year, month)
+    paid_students = set(
+        FeePayment.objects.filter(month_year=summary['month_year']).values_list('student', flat=True).distinct()
+    )
+    totals = {
+        model: model.objects.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        for model in payment_models()
+    }
+    return {
+        'month_year': summary['month_year'],
+        'total_collected': summary['total_collected'],
+        'paid_students': paid_students,
+        'total_students': summary['total_students'],
+        'total_collected_all_time': sum(totals.values(), Decimal('0.00')),
+        'classes': {row['class_name']: row['class_total'] for row in classes},
+        'stale': False,
+        'fingerprint': {
+            'total': totals[FeePayment],
+            'month_total': summary['total_collected'],
+            'active_students': summary['total_students'],
+        },
+        'checked_at': time.monotonic(),
+    }
+
+
+def _fingerprint():
+    """The figures of :func:`_seed` that other processes' writes change.
+
+    Payments added, deleted, edited or archived move the live total, and
+    students added or (de)activated the active count. Two queries instead of
+    the seed's eight.
+    """
+    from django.db.models import Q, Sum
+    from .models import FeePayment, Student
+
+    year, month = _current_month_year()
+    payments = FeePayment.objects.aggregate(
+        total=Sum('amount'), month_total=Sum('amount', filter=Q(month_year=f"{year}-{month:02d}")),
+    )
+    return {
+        'total': payments['total'] or Decimal('0.00'),
+        'month_total': payments['month_total'] or Decimal('0.00'),
+        'active_students': Student.objects.filter(is_active=True).count(),
+    }
+
+
+def _money(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def _counters(state):
+    return {
+        'total_collected': _money(state['total_collected']),
+        'students_paid': len(state['paid_students']),
+        'students_unpaid': state['total_students'] - len(state['paid_students']),
+        'total_students': state['total_students'],
+        'total_collected_all_time': _money(state['total_collected_all_time']),
+    }
+
+
+def _snapshot_event(state):
+    return {
+        'type': 'snapshot',
+        'counters': _counters(state),
+        'classes': {name: _money(total) for name, total in state['classes'].items()},
+    }
+
+
+def _state_for(branch):
+    """``(state, reseeded)`` for ``branch``; reseeds when stale or the month changed."""
+    year, month = _current_month_year()
+    with _lock:
+        state = _states.get(branch)
+    if state is not None and not state['stale'] and state['month_year'] == f"{year}-{month:02d}":
+        return state, False
+    with use_branch(branch):
+        state = _seed()
+    with _lock:
+        _states[branch] = state
+    return state, True
+
+
+def _broadcast(branch, event):
+    data = json.dumps(event, ensure_ascii=False)
+    with _lock:
+        subscribers = list(_subscribers.get(branch, ()))
+    for q in subscribers:
+        q.put(data)
+
+
+def _listening(branch):
+    with _lock:
+        return bool(_subscribers.get(branch))
+
+
+def payments_added(payments):
+    """Push new payments (saved, or inserted with ``bulk_create``) to open dashboards."""
+    payments = list(payments)
+    if not payments:
+        return
+    branch = payments[0]._state.db or DEFAULT_BRANCH
+    if not _listening(branch):
+        return
+
+    def apply():
+        from .models import Student
+
+        if not _listening(branch):
+            return  # The last dashboard closed before the commit
+
+        # A reseed reads the committed payments, so they are already counted
+        state, reseeded = _state_for(branch)
+        students = {
+            s.pk: s for s in Student.objects.using(branch).select_related('school_class')
+            .filter(pk__in={p.student_id for p in payments})
+        }
+        for payment in payments:
+            student = students.get(payment.student_id)
+            class_name = student.school_class.name if student else ''
+            with _lock:
+                if not reseeded:
+                    # Keep the fingerprint in step so resync() doesn't reseed for our own saves
+                    state['fingerprint']['total'] += payment.amount
+                    state['total_collected_all_time'] += payment.amount
+                if not reseeded and payment.month_year == state['month_year']:
+                    state['fingerprint']['month_total'] += payment.amount
+                    state['total_collected'] += payment.amount
+                    state['paid_students'].add(payment.student_id)
+                    state['classes'][class_name] = state['classes'].get(class_name, Decimal('0.00')) + payment.amount
+                event = {
+                    'type': 'payment',
+                    'payment': {
+                        'id': payment.pk,
+                        'student_name': student.name if student else '',
+                        'student_code': student.student_id if student else '',
+                        'amount': _money(payment.amount),
+                        'month_year': payment.month_year,
+                        'payment_method': payment.payment_method,
+                        'payment_date': payment.payment_date.strftime('%Y/%m/%d'),
+                    },
+                    'counters': _counters(state),
+                    'class': {'name': class_name, 'total': _money(state['classes'].get(class_name, 0))},
+                }
+            _broadcast(branch, event)
+
+    transaction.on_commit(apply, using=branch)
+
+
+def _mark_stale(instance):
+    mark_stale(instance._state.db or DEFAULT_BRANCH)
+
+
+def mark_stale(branch):
+    """Reseed ``branch``'s counters after changes made without signals (``QuerySet.update``)."""
+    if not _listening(branch):
+        return
+
+    def apply():
+        with _lock:
+            state = _states.get(branch)
+            if state is None or not _subscribers.get(branch):
+                return
+            state['stale'] = True
+        state, _ = _state_for(branch)
+        _broadcast(branch, _snapshot_event(state))
+
+    transaction.on_commit(apply, using=branch)
+
+
+def _on_payment_save(sender, instance, created, **kwargs):
+    if created:
+        payments_added([instance])
+    else:
+        _mark_stale(instance)
+
+
+def _on_change(sender, instance, **kwargs):
+    _mark_stale(instance)
+
+
+def subscribe(branch):
+    """Queue of events for ``branch`` plus the snapshot to send first; None when full."""
+    state, _ = _state_for(branch)
+    q = queue.Queue()
+    with _lock:
+        subscribers = _subscribers.setdefault(branch, [])
+        if len(subscribers) >= MAX_SUBSCRIBERS:
+            return None, None
+        subscribers.append(q)
+        snapshot = _snapshot_event(state)
+    return q, snapshot
+
+
+def unsubscribe(branch, q):
+    with _lock:
+        if q in _subscribers.get(branch, []):
+            _subscribers[branch].remove(q)
+        if not _subscribers.get(branch):
+            # Nothing updates the counters now; the next subscriber reseeds
+            _states.pop(branch, None)
+
+
+def resync(branch):
+    """Reseed ``branch`` and push a snapshot if another process changed its data.
+
+    Runs the fingerprint queries at most once per ``KEEPALIVE_SECONDS`` however
+    many dashboards are open.
+    """
+    now = time.monotonic()
+    with _lock:
+        state = _states.get(branch)
+        if state is None or now - state['checked_at'] < KEEPALIVE_SECONDS:
+            return
+        state['checked_at'] = now
+    with use_branch(branch):
+        fingerprint = _fingerprint()
+    with _lock:
+        if fingerprint == state['fingerprint']:
+            return
+        state['stale'] = True
+    state, _ = _state_for(branch)
+    _broadcast(branch, _snapshot_event(state))
+
+
+def event_stream(branch, q, snapshot):
+    """SSE body: the snapshot, then deltas as they arrive, with keep-alive comments."""
+    try:
+        yield 'retry: 5000\n\n'
+        yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+        while True:
+            resync(branch)
+            try:
+                data = q.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield f"data: {data}\n\n"
+    finally:
+        unsubscribe(branch, q)
+
+
+def connect():
+    from .models import FeePayment, Student
+
+    post_save.connect(_on_payment_save, sender=FeePayment, dispatch_uid='live_payment_save')
+    post_delete.connect(_on_change, sender=FeePayment, dispatch_uid='live_payment_delete')
+    post_save.connect(_on_change, sender=Student, dispatch_uid='live_student_save')
+    post_delete.connect(_on_change, sender=Student, dispatch_uid='live_student_delete')
@@ -0,0 +1,74 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Move payments of closed Jalali years into the archive table (or back with --restore)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, action='append', help='Year to archive (repeatable)')
+        parser.add_argument('--keep-years', type=int, default=2,
+                            help='Without --year, archive everything older than this many recent years')
+        parser.add_argument('--restore', type=int, metavar='YEAR', help='Move an archived year back to the live table')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would be archived')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.archive import archive_year, incomplete_years, restore_year
+        from school_management.models import FeePayment
+        from school_management.utils import year_months
+
+        def progress(done):
+            self.stdout.write(f'  moved {done} payment(s)')
+
+        interrupted = incomplete_years()
+        if interrupted:
+            self.stdout.write(self.style.WARNING(
+                f'Unfinished move for {interrupted}: reports read both tables until it is run again '
+                '(with --year to archive, or --restore)'
+            ))
+
+        if options['restore']:
+            if options['dry_run']:
+                self.stdout.write(f"Would restore {options['restore']}")
+                return
+            moved = restore_year(options['restore'], options['batch_size'], progress)
+            self.stdout.write(self.style.SUCCESS(f"Restored {moved} payment(s) of {options['restore']}"))
+            return
+
+        current_year = jdatetime.date.today().year
+        if options['year']:
+            years = sorted(set(options['year']))
+        else:
+            cutoff = current_year - max(1, options['keep_years']) + 1
+            live_years = {
+                int(month_year[:4])
+                for month_year in FeePayment.objects.values_list('month_year', flat=True).distinct()
+                if month_year[:4].isdigit()
+            }
+            years = sorted(y for y in live_years if y < cutoff)
+
+        open_years = [y for y in years if y >= current_year]
+        if open_years:
+            raise CommandError(f'Only closed years can be archived: {open_years}')
+        if not years:
+            self.stdout.write('Nothing to archive')
+            return
+
+        for year in years:
+            count = FeePayment.objects.filter(month_year__range=year_months(year)).count()
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {count} payment(s) of {year}')
+                continue
+            self.stdout.write(f'Archiving {year} ({count} payment(s))...')
+            moved = archive_year(year, options['batch_size'], progress)
+            self.stdout.write(self.style.SUCCESS(f'Archived {moved} payment(s) of {year}'))
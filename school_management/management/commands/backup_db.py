@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Back up the SQLite database(s) while the server runs, verify, compress and rotate old backups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', action='append', help='Branch code from settings.BRANCHES (repeatable)')
+        parser.add_argument('--all-branches', action='store_true', help='Back up every branch database')
+        parser.add_argument('--dir', help='Backup directory (default: settings.BACKUP_DIR)')
+        parser.add_argument('--no-compress', action='store_true', help='Keep the plain .sqlite3 copy')
+        parser.add_argument('--pages', type=int, help='Pages copied per step (default: settings.BACKUP_STEP_PAGES)')
+        parser.add_argument('--sleep', type=float, help='Seconds between steps (default: settings.BACKUP_STEP_SLEEP)')
+        parser.add_argument('--no-prune', action='store_true', help='Keep all old backups')
+
+    def handle(self, *args, **options):
+        from school_management.backup import backup_database, prune_backups
+        from school_management.branches import get_branches
+
+        codes = [code for code, _ in get_branches()]
+        if options['all_branches']:
+            selected = codes
+        else:
+            selected = options['branch'] or ['default']
+        unknown = [code for code in selected if code not in codes]
+        if unknown:
+            raise CommandError(f'Unknown branch: {", ".join(unknown)}')
+
+        if hasattr(os, 'nice'):
+            # Copying and compressing are CPU work; let request workers go first
+            os.nice(getattr(settings, 'BACKUP_NICE', 10))
+        for code in selected:
+            start = time.monotonic()
+            try:
+                path = backup_database(
+                    code, options['dir'], compress=not options['no_compress'],
+                    pages=options['pages'], sleep=options['sleep'],
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                f'{code}: {path} ({time.monotonic() - start:.1f}s, integrity ok)'
+            ))
+            if not options['no_prune']:
+                for deleted in prune_backups(code, options['dir']):
+                    self.stdout.write(f'  removed {deleted}')
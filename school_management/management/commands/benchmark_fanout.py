@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+
+class Command(BaseCommand):
+    help = 'Time the dashboard and reports pages with and without concurrent query fan-out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Timed requests per page and mode')
+        parser.add_argument('--year', type=int, help='Jalali year for the reports page (default: current)')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import branch_name, get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(branch_name(options['branch']), **options)
+
+    def _handle(self, name, **options):
+        from school_management import views
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(f'Branch: {name}, journal mode: {journal_mode}')
+
+        params = {'year': options['year']} if options['year'] else {}
+        pages = [('dashboard', views.dashboard, {}), ('reports', views.reports, params)]
+        factory = RequestFactory()
+        for label, view, query in pages:
+            def call():
+                request = factory.get('/', query, HTTP_HOST='localhost')
+                request.user = AnonymousUser()
+                request.branch = options['branch']
+                request.branch_name = name
+                start = time.perf_counter()
+                view(request)
+                return (time.perf_counter() - start) * 1000
+
+            timings = {}
+            for mode, enabled in (('serial', False), ('fan-out', True)):
+                with override_settings(QUERY_FANOUT=enabled):
+                    call()  # warm up caches and connections
+                    timings[mode] = statistics.median(call() for _ in range(options['runs']))
+            speedup = timings['serial'] / timings['fan-out'] if timings['fan-out'] else 0
+            self.stdout.write(
+                f"{label:10} serial {timings['serial']:8.1f} ms   "
+                f"fan-out {timings['fan-out']:8.1f} ms   x{speedup:.2f}"
+            )
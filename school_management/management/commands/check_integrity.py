@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Scan students, payments and the ledger for duplicates, malformed periods, fee mismatches and orphans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='CSV report path (default: MEDIA_ROOT/integrity/)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.integrity import default_report_path, scan, write_report
+
+        path = options['output'] or default_report_path()
+        start = time.monotonic()
+        counts = write_report(scan(max(1, options['chunk_size'])), path)
+        for check, count in sorted(counts.items()):
+            self.stdout.write(f'  {check}: {count}')
+        summary = f'Wrote {path} ({sum(counts.values())} issue(s), {time.monotonic() - start:.1f}s)'
+        self.stdout.write(self.style.WARNING(summary) if counts else self.style.SUCCESS(summary))
@@ -0,0 +1,48 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _parse_month(value):
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        raise CommandError(f'Invalid month "{value}", expected YYYY-MM')
+    if not 1 <= month <= 12:
+        raise CommandError(f'Invalid month "{value}", expected YYYY-MM')
+    return year, month
+
+
+class Command(BaseCommand):
+    help = 'Create monthly dues invoices for active students and allocate payments to them (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Jalali month as YYYY-MM (default: current month)')
+        parser.add_argument('--since', help='Also back-fill every month from this YYYY-MM up to --month')
+        parser.add_argument('--reallocate', action='store_true', help='Rebuild payment allocations for all students')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.ledger import generate_invoices, month_range, reallocate_all
+
+        today = jdatetime.date.today()
+        end = _parse_month(options['month']) if options['month'] else (today.year, today.month)
+        start = _parse_month(options['since']) if options['since'] else end
+        if start > end:
+            raise CommandError('--since must not be after --month')
+
+        for year, month in month_range(start, end):
+            created = generate_invoices(year, month)
+            self.stdout.write(f'{year}-{month:02d}: {created} invoice(s) created')
+
+        if options['reallocate']:
+            count = reallocate_all()
+            self.stdout.write(f'Reallocated payments for {count} student(s)')
+        self.stdout.write(self.style.SUCCESS('Done'))
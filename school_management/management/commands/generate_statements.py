@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Render fee statements and receipts for all students into a zip or one print-ready HTML file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Jalali year for the per-month status (default: current year)')
+        parser.add_argument('--class', dest='class_name', help='Only students of this class, by name or grade (e.g. اول or 1)')
+        parser.add_argument('--include-inactive', action='store_true', help='Include inactive students')
+        parser.add_argument('--format', choices=['zip', 'html'], default='zip', help='Output format')
+        parser.add_argument('--no-receipts', action='store_true', help='Skip per-payment receipts')
+        parser.add_argument('--output', help='Output file path (default: MEDIA_ROOT/statements/)')
+        parser.add_argument('--workers', type=int, default=2, help='Render processes (0 renders inline)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Students fetched and rendered per chunk')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.models import SchoolClass
+        from school_management.statements import generate_statements
+
+        class_id = None
+        if options['class_name']:
+            value = options['class_name'].strip()
+            lookup = {'grade': int(value)} if value.isdigit() else {'name': value}
+            school_class = SchoolClass.objects.filter(**lookup).first()
+            if school_class is None:
+                raise CommandError(f'Unknown class: {value}')
+            class_id = school_class.pk
+
+        def progress(done, total):
+            self.stdout.write(f'Rendered chunk {done}/{total}')
+
+        path, rendered, cached = generate_statements(
+            year=options['year'],
+            class_id=class_id,
+            include_inactive=options['include_inactive'],
+            fmt=options['format'],
+            include_receipts=not options['no_receipts'],
+            output_path=options['output'],
+            workers=max(0, options['workers']),
+            chunk_size=max(1, options['chunk_size']),
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {path} ({rendered} rendered, {cached} unchanged from cache)'
+        ))
@@ -0,0 +1,62 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Move active students up one class for the new Jalali year and graduate the last class (or revert)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Jalali academic year (default: current)')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would change')
+        parser.add_argument('--revert', action='store_true', help='Undo the promotion of --year')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.models import Promotion
+        from school_management.promotion import apply_promotion, plan_promotion, revert_promotion
+
+        year = options['year'] or jdatetime.date.today().year
+
+        if options['revert']:
+            promotion = Promotion.objects.filter(year=year, reverted_at__isnull=True).first()
+            if promotion is None:
+                raise CommandError(f'No promotion to revert for {year}')
+            if options['dry_run']:
+                self.stdout.write(f'Would revert {promotion} ({promotion.students.count()} student(s))')
+                return
+            try:
+                restored, skipped = revert_promotion(promotion)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f'Reverted {restored} student(s)'))
+            if skipped:
+                self.stdout.write(self.style.WARNING(f'Skipped {skipped} student(s) changed since the promotion'))
+            return
+
+        try:
+            plan = plan_promotion()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not plan:
+            self.stdout.write('Nothing to promote')
+            return
+        for row in plan:
+            target = row['to'].name if row['to'] else 'graduated'
+            self.stdout.write(f"  {row['from'].name:>12} -> {target:<12} {row['count']} student(s)")
+        if options['dry_run']:
+            return
+        try:
+            promotion = apply_promotion(year)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Promoted {promotion.promoted_count} and graduated {promotion.graduated_count} student(s) for {year}'
+        ))
@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Restore a database from a backup_db file (the current database is backed up first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', nargs='?', help='Backup file; default: the newest backup of the branch')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+        parser.add_argument('--dir', help='Backup directory (default: settings.BACKUP_DIR)')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        from school_management.backup import list_backups, restore_database
+        from school_management.branches import get_branches
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        path = options['backup']
+        if path is None:
+            backups = list_backups(options['branch'], options['dir'])
+            if not backups:
+                raise CommandError(f"No backups of {options['branch']} found")
+            path = backups[0][1]
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+
+        if options['interactive']:
+            answer = input(f"Replace the {options['branch']} database with {path}? [y/N] ")
+            if answer.strip().lower() not in ('y', 'yes'):
+                self.stdout.write('Cancelled')
+                return
+        try:
+            safety = restore_database(path, options['branch'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Restored {options['branch']} from {path}"))
+        self.stdout.write(f'The previous database was saved as {safety}')
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from school_management.process_pool import make_pool
+
+# Seconds between checks for jobs left running by a dead worker
+STALE_CHECK_INTERVAL = 60
+
+
+def _execute(job_id):
+    from school_management.jobs import run_job
+    return run_job(job_id)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (exports, report builds) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between queue polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
+        from school_management import metrics
+        from school_management.jobs import claim_next_job, fail_stale_jobs, requeue_jobs
+        from school_management.models import BackgroundJob
+
+        # Forked workers inherit this and report their exports too
+        metrics.publish()
+
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        running = {}
+
+        self.stdout.write(f'Starting {workers} worker process(es)...')
+        checked_at = None
+        with make_pool(workers) as pool:
+            try:
+                while True:
+                    if checked_at is None or time.monotonic() - checked_at >= STALE_CHECK_INTERVAL:
+                        checked_at = time.monotonic()
+                        stale = fail_stale_jobs()
+                        if stale:
+                            self.stdout.write(f'Failed {stale} job(s) left running by a stopped worker')
+
+                    while len(running) < workers:
+                        job = claim_next_job()
+                        if job is None:
+                            break
+                        # Workers must not inherit an open SQLite connection
+                        connections.close_all()
+                        running[pool.submit(_execute, job.pk)] = job
+                        self.stdout.write(f'Started {job}')
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+
+                    done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        try:
+                            status = future.result()
+                        except Exception as exc:
+                            # The worker process died before recording a result
+                            BackgroundJob.objects.filter(pk=job.pk).update(
+                                status=BackgroundJob.STATUS_FAILED,
+                                error=repr(exc),
+                                finished_at=timezone.now(),
+                            )
+                            status = BackgroundJob.STATUS_FAILED
+                        self.stdout.write(f'Finished job #{job.pk}: {status}')
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping workers...')
+                # The next run starts them again instead of leaving them "running"
+                requeue_jobs([job.pk for job in running.values()])
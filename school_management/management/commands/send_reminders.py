@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Send SMS fee reminders to active students who have not paid for a Jalali month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Jalali year (default: current month)')
+        parser.add_argument('--month', type=int, help='Jalali month 1-12 (default: current month)')
+        parser.add_argument('--retry-failed', action='store_true', help='Send failed reminders of the month again')
+        parser.add_argument('--gateway', help='Gateway class import path (default: settings.REMINDER_GATEWAY)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the unpaid students')
+        parser.add_argument('--branch', default='default', help='Branch code from settings.BRANCHES')
+
+    def handle(self, *args, **options):
+        from school_management.branches import get_branches, use_branch
+
+        if options['branch'] not in dict(get_branches()):
+            raise CommandError(f"Unknown branch: {options['branch']}")
+        with use_branch(options['branch']):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        from school_management.reminders import (
+            current_month_year, dispatch, get_gateway, queue_reminders, retry_failed, unpaid_students,
+        )
+
+        if (options['year'] is None) != (options['month'] is None):
+            raise CommandError('Give both --year and --month, or neither')
+        if options['month'] is not None and not 1 <= options['month'] <= 12:
+            raise CommandError('--month must be between 1 and 12')
+        month_year = (
+            f"{options['year']}-{options['month']:02d}" if options['year'] is not None else current_month_year()
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{unpaid_students(month_year).count()} unpaid student(s) with a phone for {month_year}')
+            return
+
+        start = time.monotonic()
+        if options['retry_failed']:
+            self.stdout.write(f'Requeued {retry_failed(month_year)} failed reminder(s)')
+        self.stdout.write(f'Queued {queue_reminders(month_year)} new reminder(s) for {month_year}')
+
+        def progress(done, total):
+            self.stdout.write(f'  sent {done}/{total}')
+
+        counts = dispatch(month_year, gateway=get_gateway(options['gateway']), progress=progress)
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f'{month_year}: {summary} ({time.monotonic() - start:.1f}s)'))
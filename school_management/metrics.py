@@ -0,0 +1,353 @@
+"""In-process metrics with a Prometheus text endpoint at ``/metrics``.
+
+Counters and histograms are kept per thread in plain dicts, so recording a
+value takes no lock: one thread-local lookup and a dict update, a couple of
+microseconds. A scrape sums the per-thread dicts. Long-running processes
+(the WSGI server and ``run_workers``) call :func:`publish` and then write
+their totals to ``settings.METRICS_DIR/<pid>-<start>.json`` every few
+seconds; ``/metrics`` adds up the files of all live processes, so request
+workers and the ``run_workers`` export processes report as one. A process
+removes its file at exit, and files of processes that died without doing
+so are dropped once they stop being updated. Tests and one-off commands
+write nothing.
+
+Recorded:
+
+* ``http_request_duration_seconds{view}``: per named URL of
+  ``school_management/urls.py`` (everything else is ``view="other"``)
+* ``db_queries_total`` / ``db_query_duration_seconds{db}``: every SQL query
+* ``payments_created_total{source}``: single saves, class batches, sync API
+* ``export_rows_total`` / ``export_duration_seconds{export}``: CSV exports
+* ``cache_requests_total{cache, result}``: hits and misses per cache
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Upper bounds in seconds; requests and exports use the first, queries the second
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+METRICS = {
+    'http_request_duration_seconds': (HISTOGRAM, 'Time to produce a response, per URL name', REQUEST_BUCKETS),
+    'http_responses_total': (COUNTER, 'Responses per URL name and status class', None),
+    'db_queries_total': (COUNTER, 'SQL queries executed', None),
+    'db_query_duration_seconds': (HISTOGRAM, 'SQL query execution time', QUERY_BUCKETS),
+    'payments_created_total': (COUNTER, 'Fee payments inserted', None),
+    'export_rows_total': (COUNTER, 'Rows written to CSV exports', None),
+    'export_duration_seconds': (HISTOGRAM, 'Time to write a CSV export', REQUEST_BUCKETS),
+    'cache_requests_total': (COUNTER, 'Cache lookups by result (hit or miss)', None),
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+# (thread, shard) for every thread that recorded something
+_shards = []
+# Totals of threads that have exited
+_retired = {}
+_flusher = None
+_process_id = None
+# Set by publish(); inherited by forked children, which start their own flusher
+_publishing = False
+
+
+def _new_process():
+    global _flusher, _process_id
+    _local.__dict__.clear()
+    del _shards[:]
+    _retired.clear()
+    _flusher = None
+    _process_id = f"{os.getpid()}-{int(time.time())}"
+
+
+_new_process()
+# A forked worker must not report the parent's numbers a second time
+os.register_at_fork(after_in_child=_new_process)
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _lock:
+            _shards.append((threading.current_thread(), shard))
+        if _publishing:
+            _ensure_flusher()
+        return shard
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def inc(name, value=1, **labels):
+    """Add ``value`` to the counter ``name``."""
+    shard = _shard()
+    key = _key(name, labels)
+    shard[key] = shard.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record ``value`` (seconds) in the histogram ``name``."""
+    buckets = METRICS[name][2]
+    shard = _shard()
+    key = _key(name, labels)
+    row = shard.get(key)
+    if row is None:
+        # Per-bucket counts (last one is +Inf), then sum and count
+        row = shard[key] = [0] * (len(buckets) + 3)
+    row[bisect_left(buckets, value)] += 1
+    row[-2] += value
+    row[-1] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the duration of the block in the histogram ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def cache_lookup(cache, hit):
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def _merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, list):
+            row = target.get(key)
+            target[key] = list(value) if row is None else [a + b for a, b in zip(row, value)]
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def snapshot():
+    """Totals recorded by this process, as ``{(name, labels): value}``."""
+    totals = {}
+    with _lock:
+        alive = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                _merge(_retired, shard.copy())
+        _shards[:] = alive
+        _merge(totals, _retired)
+        for _, shard in alive:
+            # dict.copy() is atomic under the GIL, so writers never block
+            _merge(totals, shard.copy())
+    return totals
+
+
+def _metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', None) or os.path.join(settings.BASE_DIR, 'metrics'))
+
+
+def _path():
+    return os.path.join(_metrics_dir(), f"{_process_id}.json")
+
+
+def flush():
+    """Write this process's totals for other processes' ``/metrics`` to read."""
+    totals = snapshot()
+    if not totals:
+        return
+    os.makedirs(_metrics_dir(), exist_ok=True)
+    path = _path()
+    rows = [[name, list(labels), value] for (name, labels), value in totals.items()]
+    with open(f"{path}.tmp", 'w') as fh:
+        json.dump(rows, fh)
+    os.replace(f"{path}.tmp", path)
+
+
+def _flush_loop():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _ensure_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+            _flusher.start()
+
+
+def _unpublish():
+    try:
+        os.remove(_path())
+    except OSError:
+        pass
+
+
+def publish():
+    """Share this process's totals with the other processes' ``/metrics``.
+
+    Only for long-running processes; their file is removed at exit.
+    """
+    global _publishing
+    if _publishing or not getattr(settings, 'METRICS_ENABLED', True):
+        return
+    _publishing = True
+    _ensure_flusher()
+    atexit.register(_unpublish)
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        # os.kill() would terminate the process on Windows; rely on the age check
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _is_stale(path, filename):
+    """True for files of processes that have exited or stopped flushing."""
+    max_age = 3 * getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+    try:
+        if time.time() - os.path.getmtime(path) > max_age:
+            return True
+    except OSError:
+        return True
+    pid = filename.split('-', 1)[0]
+    return pid.isdigit() and not _pid_alive(int(pid))
+
+
+def collect():
+    """Totals of every live process: this one from memory, the others from their files."""
+    totals = snapshot()
+    directory = _metrics_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for filename in names:
+        if not filename.endswith('.json') or filename == f"{_process_id}.json":
+            continue
+        path = os.path.join(directory, filename)
+        if _is_stale(path, filename):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as fh:
+                rows = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        _merge(totals, {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in rows})
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals=None):
+    """Prometheus text exposition format (version 0.0.4)."""
+    totals = collect() if totals is None else totals
+    by_name = {}
+    for (name, labels), value in totals.items():
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name.get(name, [])):
+            if kind == COUNTER:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([repr(float(b)) for b in buckets] + ['+Inf'], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Time every request; labelled with the URL name of school_management views."""
+
+    def __init__(self, get_response):
+        from django.core.exceptions import MiddlewareNotUsed
+        from .urls import urlpatterns
+
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.view_names = {pattern.name for pattern in urlpatterns if pattern.name}
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name in self.view_names and not match.namespace else 'other'
+        observe('http_request_duration_seconds', time.perf_counter() - start, view=view)
+        inc('http_responses_total', view=view, code=f"{response.status_code // 100}xx")
+        return response
+
+
+def _time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context['connection'].alias
+        observe('db_query_duration_seconds', time.perf_counter() - start, db=alias)
+        inc('db_queries_total', db=alias)
+
+
+def _on_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _on_payment_save(sender, instance, created, **kwargs):
+    if created:
+        inc('payments_created_total', source='single')
+
+
+def connect():
+    from django.db.backends.signals import connection_created
+    from django.db.models.signals import post_save
+    from .models import FeePayment
+
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return
+    connection_created.connect(_on_connection, dispatch_uid='metrics_sql')
+    post_save.connect(_on_payment_save, sender=FeePayment, dispatch_uid='metrics_payment_save')
@@ -4,11 +4,12 @@ from django.db import migrations
 
 
 def backfill_student_ids(apps, schema_editor):
+    db = schema_editor.connection.alias
     Student = apps.get_model('school_management', 'Student')
     # Iterate through students missing student_id and backfill
-    for s in Student.objects.filter(student_id__isnull=True).iterator():
+    for s in Student.objects.using(db).filter(student_id__isnull=True).iterator():
         s.student_id = f"STD-{s.pk:06d}"
-        s.save(update_fields=['student_id'])
+        s.save(using=db, update_fields=['student_id'])
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.14 on 2026-10-19 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0003_backfill_student_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('payments_export', 'خروجی پرداخت\u200cها'), ('report_export', 'خروجی گزارش')], max_length=50, verbose_name='نوع')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='پارامترها')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار'), ('running', 'در حال اجرا'), ('done', 'تکمیل شده'), ('failed', 'ناموفق')], default='pending', max_length=10, verbose_name='وضعیت')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='پیشرفت (%)')),
+                ('result_file', models.FileField(blank=True, upload_to='jobs/', verbose_name='فایل نتیجه')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='شروع')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='پایان')),
+            ],
+            options={
+                'verbose_name': 'کار پس\u200cزمینه',
+                'verbose_name_plural': 'کارهای پس\u200cزمینه',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='school_mana_status_a82b22_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0004_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('payments_export', 'خروجی پرداخت\u200cها'), ('report_export', 'خروجی گزارش'), ('statements', 'صورت حساب\u200cهای شاگردان')], max_length=50, verbose_name='نوع'),
+        ),
+    ]
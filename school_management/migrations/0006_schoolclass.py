@@ -0,0 +1,32 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0005_alter_backgroundjob_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolClass',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='نام صنف')),
+                ('grade', models.PositiveSmallIntegerField(unique=True, verbose_name='درجه')),
+            ],
+            options={
+                'verbose_name': 'صنف',
+                'verbose_name_plural': 'صنف\u200cها',
+                'ordering': ['grade'],
+            },
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='school_class',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='students', to='school_management.schoolclass', verbose_name='صنف'),
+        ),
+    ]
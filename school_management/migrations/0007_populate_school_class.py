@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+STANDARD_CLASSES = [
+    "اول", "دوم", "سوم", "چهارم", "پنجم", "ششم",
+    "هفتم", "هشتم", "نهم", "دهم", "یازدهم", "دوازدهم",
+]
+UNKNOWN_CLASS = "نامشخص"
+
+
+def forwards(apps, schema_editor):
+    db = schema_editor.connection.alias
+    SchoolClass = apps.get_model('school_management', 'SchoolClass')
+    Student = apps.get_model('school_management', 'Student')
+
+    by_name = {}
+    for grade, name in enumerate(STANDARD_CLASSES, start=1):
+        by_name[name], _ = SchoolClass.objects.using(db).get_or_create(name=name, defaults={'grade': grade})
+    # Older records stored the grade number ("1".."12") instead of the name
+    by_number = {str(grade): cls for grade, cls in enumerate(by_name.values(), start=1)}
+
+    next_grade = max(SchoolClass.objects.using(db).values_list('grade', flat=True)) + 1
+    names = Student.objects.using(db).values_list('class_name', flat=True).distinct()
+    for raw in names:
+        value = (raw or '').strip() or UNKNOWN_CLASS
+        cls = by_name.get(value) or by_number.get(value)
+        if cls is None:
+            cls = SchoolClass.objects.using(db).create(name=value, grade=next_grade)
+            by_name[value] = cls
+            next_grade += 1
+        Student.objects.using(db).filter(class_name=raw).update(school_class=cls)
+
+
+def backwards(apps, schema_editor):
+    db = schema_editor.connection.alias
+    SchoolClass = apps.get_model('school_management', 'SchoolClass')
+    Student = apps.get_model('school_management', 'Student')
+    for cls in SchoolClass.objects.using(db).all():
+        Student.objects.using(db).filter(school_class=cls).update(class_name=cls.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0006_schoolclass'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0007_populate_school_class'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='student',
+            name='class_name',
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='school_class',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='students', to='school_management.schoolclass', verbose_name='صنف'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:11
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0008_remove_student_class_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_year', models.CharField(help_text='فرمت: YYYY-MM', max_length=7, verbose_name='ماه/سال')),
+                ('amount_due', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='مبلغ قابل پرداخت')),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='مبلغ پرداخت شده')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='باقی\u200cمانده')),
+                ('status', models.CharField(choices=[('unpaid', 'پرداخت نشده'), ('partial', 'پرداخت ناقص'), ('paid', 'پرداخت شده')], default='unpaid', max_length=10, verbose_name='وضعیت')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به روز رسانی')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='school_management.student', verbose_name='شاگرد')),
+            ],
+            options={
+                'verbose_name': 'صورت حساب ماهانه',
+                'verbose_name_plural': 'صورت حساب\u200cهای ماهانه',
+                'ordering': ['student', 'month_year'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='مقدار')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='school_management.feeinvoice', verbose_name='صورت حساب')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='school_management.feepayment', verbose_name='پرداخت')),
+            ],
+            options={
+                'verbose_name': 'تخصیص پرداخت',
+                'verbose_name_plural': 'تخصیص پرداخت\u200cها',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeinvoice',
+            index=models.Index(fields=['month_year', 'status'], name='school_mana_month_y_cd46c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeinvoice',
+            index=models.Index(fields=['student', 'status'], name='school_mana_student_f1cf65_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeinvoice',
+            constraint=models.UniqueConstraint(fields=('student', 'month_year'), name='unique_invoice_per_student_month'),
+        ),
+    ]
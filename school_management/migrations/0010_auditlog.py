@@ -0,0 +1,37 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('school_management', '0009_feeinvoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=30, verbose_name='نوع')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='شناسه')),
+                ('student_ref', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='شاگرد')),
+                ('action', models.CharField(choices=[('create', 'ایجاد'), ('update', 'ویرایش'), ('delete', 'حذف')], max_length=10, verbose_name='عملیات')),
+                ('changes', models.JSONField(default=dict, verbose_name='تغییرات')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='نام کاربر')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'سابقه تغییر',
+                'verbose_name_plural': 'سوابق تغییرات',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['model_name', 'object_id', 'created_at'], name='school_mana_model_n_d6b6f9_idx'), models.Index(fields=['student_ref', 'created_at'], name='school_mana_student_1cef66_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('school_management', '0010_auditlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='branch',
+            field=models.CharField(default='default', max_length=50, verbose_name='شعبه'),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='کاربر'),
+        ),
+        migrations.CreateModel(
+            name='BranchMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.CharField(max_length=50, verbose_name='شعبه')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='branch_membership', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'شعبه کاربر',
+                'verbose_name_plural': 'شعبه\u200cهای کاربران',
+            },
+        ),
+    ]
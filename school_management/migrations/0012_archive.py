@@ -0,0 +1,53 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0011_branches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(unique=True, verbose_name='سال')),
+                ('payments_count', models.PositiveIntegerField(default=0, verbose_name='تعداد پرداخت\u200cها')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بایگانی')),
+            ],
+            options={
+                'verbose_name': 'سال بایگانی شده',
+                'verbose_name_plural': 'سال\u200cهای بایگانی شده',
+                'ordering': ['year'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='paymentallocation',
+            name='payment',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='allocations', to='school_management.feepayment', verbose_name='پرداخت'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedFeePayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('payment_date', models.DateField(verbose_name='تاریخ پرداخت')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='مقدار')),
+                ('month_year', models.CharField(max_length=7, verbose_name='ماه/سال')),
+                ('payment_method', models.CharField(choices=[('نقدی', 'نقدی'), ('چک', 'چک'), ('انتقال بانکی', 'انتقال بانکی')], max_length=20, verbose_name='طریقه پرداخت')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='school_management.student', verbose_name='شاگرد')),
+            ],
+            options={
+                'verbose_name': 'پرداخت بایگانی شده',
+                'verbose_name_plural': 'پرداخت\u200cهای بایگانی شده',
+                'ordering': ['-payment_date'],
+                'indexes': [models.Index(fields=['month_year'], name='school_mana_month_y_c834a6_idx'), models.Index(fields=['student', 'payment_date'], name='school_mana_student_fc6505_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedfeepayment',
+            index=models.Index(fields=['payment_date'], name='school_mana_payment_500c5c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['payment_date'], name='school_mana_payment_de0a0d_idx'),
+        ),
+    ]
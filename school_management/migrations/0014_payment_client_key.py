@@ -0,0 +1,23 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0013_payment_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedfeepayment',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='کلید همگام\u200cسازی'),
+        ),
+        migrations.AddField(
+            model_name='feepayment',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='کلید همگام\u200cسازی'),
+        ),
+    ]
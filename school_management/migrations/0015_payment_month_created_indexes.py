@@ -0,0 +1,21 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0014_payment_client_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['month_year'], name='school_mana_month_y_7f151f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['created_at'], name='school_mana_created_3af650_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.14 on 2026-10-19 08:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('school_management', '0015_payment_month_created_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='سال تعلیمی')),
+                ('promoted_count', models.PositiveIntegerField(default=0, verbose_name='ترفیع یافته')),
+                ('graduated_count', models.PositiveIntegerField(default=0, verbose_name='فارغ شده')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='نام کاربر')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ اجرا')),
+                ('reverted_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ برگشت')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'ترفیع سالانه',
+                'verbose_name_plural': 'ترفیع\u200cهای سالانه',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PromotionStudent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_class', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='school_management.schoolclass', verbose_name='صنف قبلی')),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='students', to='school_management.promotion', verbose_name='ترفیع')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='school_management.student', verbose_name='شاگرد')),
+                ('to_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='school_management.schoolclass', verbose_name='صنف جدید')),
+            ],
+            options={
+                'verbose_name': 'شاگرد ترفیع یافته',
+                'verbose_name_plural': 'شاگردان ترفیع یافته',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='promotionstudent',
+            constraint=models.UniqueConstraint(fields=('promotion', 'student'), name='unique_promotion_student'),
+        ),
+    ]
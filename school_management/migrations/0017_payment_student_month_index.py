@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-19 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0016_promotion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['student', 'month_year'], name='school_mana_student_a04e9e_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.14 on 2026-10-19 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0017_payment_student_month_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('payments_export', 'خروجی پرداخت\u200cها'), ('report_export', 'خروجی گزارش'), ('statements', 'صورت حساب\u200cهای شاگردان'), ('reminders', 'یادآوری فیس')], max_length=50, verbose_name='نوع'),
+        ),
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_year', models.CharField(help_text='فرمت: YYYY-MM', max_length=7, verbose_name='ماه/سال')),
+                ('phone', models.CharField(max_length=20, verbose_name='تلفن')),
+                ('message', models.TextField(verbose_name='پیام')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار'), ('sent', 'ارسال شده'), ('failed', 'ناموفق'), ('skipped', 'لغو شده (پرداخت شد)')], default='pending', max_length=10, verbose_name='وضعیت')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='تعداد تلاش')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ ارسال')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='school_management.student', verbose_name='شاگرد')),
+            ],
+            options={
+                'verbose_name': 'یادآوری فیس',
+                'verbose_name_plural': 'یادآوری\u200cهای فیس',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['month_year', 'status'], name='school_mana_month_y_176b3e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reminder',
+            constraint=models.UniqueConstraint(fields=('student', 'month_year'), name='unique_reminder_per_student_month'),
+        ),
+    ]
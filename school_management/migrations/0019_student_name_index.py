@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0018_reminder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name'], name='school_mana_name_85854d_idx'),
+        ),
+    ]
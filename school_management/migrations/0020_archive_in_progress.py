@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+PAYMENT_COLUMNS = 'id, student_id, payment_date, amount, month_year, payment_method, notes, client_key, created_at'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0019_student_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedyear',
+            name='is_complete',
+            field=models.BooleanField(default=True, verbose_name='انتقال کامل شده'),
+        ),
+        migrations.CreateModel(
+            name='PaymentRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('payment_date', models.DateField(verbose_name='تاریخ پرداخت')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='مقدار')),
+                ('month_year', models.CharField(max_length=7, verbose_name='ماه/سال')),
+                ('payment_method', models.CharField(choices=[('نقدی', 'نقدی'), ('چک', 'چک'), ('انتقال بانکی', 'انتقال بانکی')], max_length=20, verbose_name='طریقه پرداخت')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت')),
+                ('client_key', models.CharField(blank=True, max_length=64, null=True, verbose_name='کلید همگام‌سازی')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('student', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='school_management.student', verbose_name='شاگرد')),
+            ],
+            options={
+                'verbose_name': 'پرداخت',
+                'verbose_name_plural': 'پرداخت‌ها',
+                'db_table': 'school_management_paymentrecord',
+                'ordering': ['-payment_date'],
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            f'''
+            CREATE VIEW school_management_paymentrecord AS
+            SELECT {PAYMENT_COLUMNS} FROM school_management_feepayment
+            UNION ALL
+            SELECT {PAYMENT_COLUMNS} FROM school_management_archivedfeepayment
+            ''',
+            'DROP VIEW school_management_paymentrecord',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.14 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0020_archive_in_progress'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedfeepayment',
+            name='school_mana_month_y_c834a6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feepayment',
+            name='school_mana_month_y_7f151f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feepayment',
+            name='school_mana_student_a04e9e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedfeepayment',
+            index=models.Index(fields=['month_year', 'student', 'payment_method', 'amount'], name='school_mana_month_y_3c4588_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['month_year', 'student', 'payment_method', 'amount'], name='school_mana_month_y_291d82_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['student', 'month_year', 'amount'], name='school_mana_student_9b1046_idx'),
+        ),
+    ]
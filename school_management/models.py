@@ -1,9 +1,31 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
 
+class SchoolClass(models.Model):
+    """School class (grade) dimension; ``grade`` gives the natural sort order"""
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="نام صنف"
+    )
+    grade = models.PositiveSmallIntegerField(
+        unique=True,
+        verbose_name="درجه"
+    )
+
+    class Meta:
+        verbose_name = "صنف"
+        verbose_name_plural = "صنف‌ها"
+        ordering = ['grade']
+
+    def __str__(self):
+        return self.name
+
+
 class Student(models.Model):
     """Student model for managing student information"""
     student_id = models.CharField(
@@ -22,8 +44,10 @@ class Student(models.Model):
         max_length=255,
         verbose_name="نام پدر"
     )
-    class_name = models.CharField(
-        max_length=100,
+    school_class = models.ForeignKey(
+        SchoolClass,
+        on_delete=models.PROTECT,
+        related_name='students',
         verbose_name="صنف"
     )
     phone = models.CharField(
@@ -59,24 +83,58 @@ class Student(models.Model):
         verbose_name = "شاگرد"
         verbose_name_plural = "شاگردان"
         ordering = ['name']
+        indexes = [
+            # Default ordering: student list pages and dropdowns
+            models.Index(fields=['name']),
+        ]
 
     def __str__(self):
         sid = self.student_id if self.student_id else "—"
         return f"{sid} - {self.name}"
 
+    def _payment_sets(self):
+        """Live payments, plus archived ones once any year has been archived"""
+        from .archive import has_archive
+
+        if not hasattr(self, '_has_archive'):
+            self._has_archive = has_archive()
+        sets = [self.payments.all()]
+        if self._has_archive:
+            sets.append(self.archived_payments.all())
+        return sets
+
     def get_total_payments(self):
         """Calculate total payments made by this student"""
-        return self.payments.aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
+        return sum((
+            qs.aggregate(total=models.Sum('amount'))['total'] or Decimal('0.00')
+            for qs in self._payment_sets()
+        ), Decimal('0.00'))
 
     def get_payments_count(self):
         """Get number of payments made by this student"""
-        return self.payments.count()
+        return sum(qs.count() for qs in self._payment_sets())
 
     def get_latest_payment(self):
         """Get the latest payment made by this student"""
-        return self.payments.order_by('-payment_date').first()
+        # Archived years are always older, so only fall back to them
+        for qs in self._payment_sets():
+            latest = qs.order_by('-payment_date').first()
+            if latest:
+                return latest
+        return None
+
+    def get_outstanding_balance(self):
+        """Sum of open invoice balances"""
+        return self.invoices.exclude(status=FeeInvoice.STATUS_PAID).aggregate(
+            total=models.Sum('balance')
+        )['total'] or Decimal('0.00')
+
+    def get_credit(self):
+        """Paid amount not yet allocated to any invoice (carried forward)"""
+        allocated = PaymentAllocation.objects.filter(invoice__student=self).aggregate(
+            total=models.Sum('amount')
+        )['total'] or Decimal('0.00')
+        return self.get_total_payments() - allocated
 
     def save(self, *args, **kwargs):
         # On initial save, we need a primary key before generating student_id
@@ -130,25 +188,86 @@ class FeePayment(models.Model):
         null=True, 
         verbose_name="یادداشت"
     )
+    # Idempotency key sent by offline cashier clients; retries are skipped
+    client_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="کلید همگام‌سازی"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True, 
         verbose_name="تاریخ ایجاد"
     )
 
+    # Reverse name on Student, for annotations that span either table
+    student_relation = 'payments'
+
     class Meta:
         verbose_name = "پرداخت فیس"
         verbose_name_plural = "پرداخت‌های فیس"
         ordering = ['-payment_date']
+        indexes = [
+            # Cash-flow report ranges
+            models.Index(fields=['payment_date']),
+            # Monthly summaries and report filters. Covering: the reports page
+            # reads a whole year's totals from the index alone; a year is too
+            # large a share of the table to fetch row by row
+            models.Index(fields=['month_year', 'student', 'payment_method', 'amount']),
+            # Dashboard "recent payments"
+            models.Index(fields=['created_at']),
+            # Duplicate check when a payment is entered, which also compares the
+            # amount; the reports page's per-student totals read it alone
+            models.Index(fields=['student', 'month_year', 'amount']),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - {self.amount} افغانی - {self.month_year}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored student, so a save that moves the payment needs no query
+        instance._stored_student_id = instance.__dict__.get('student_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .ledger import allocate_students, apply_payment
+
+        if self._state.adding and self.pk is None:
+            self._previous_student_id = None
+            super().save(*args, **kwargs)
+            self._stored_student_id = self.student_id
+            # Comes after every other payment, so only open invoices change
+            apply_payment(self)
+            return
+
+        previous = getattr(self, '_stored_student_id', None)
+        if previous is None:
+            previous = FeePayment.objects.filter(pk=self.pk).values_list('student_id', flat=True).first()
+        # Read by post_save handlers that also refresh the previous student
+        self._previous_student_id = previous
+        super().save(*args, **kwargs)
+        self._stored_student_id = self.student_id
+        allocate_students({self.student_id, previous} - {None})
+
+    def delete(self, *args, **kwargs):
+        from .ledger import allocate_students
+
+        student_id = self.student_id
+        result = super().delete(*args, **kwargs)
+        allocate_students([student_id])
+        return result
+
     @classmethod
     def get_monthly_summary(cls, year, month):
         """Get monthly payment summary"""
+        from .archive import payment_model_for_year
+
         month_year = f"{year}-{month:02d}"
         
-        payments = cls.objects.filter(month_year=month_year)
+        payments = payment_model_for_year(year).objects.filter(month_year=month_year)
         total_collected = payments.aggregate(
             total=models.Sum('amount')
         )['total'] or Decimal('0.00')
@@ -170,36 +289,80 @@ class FeePayment(models.Model):
         """Get class-wise collection data"""
         month_year = f"{year}-{month:02d}"
         
-        from django.db.models import Sum, Count, Q
-        
-        class_data = Student.objects.filter(is_active=True).values('class_name').annotate(
+        from django.db.models import Sum, Count, F
+        from .archive import payment_model_for_year
+
+        # Month totals come from the month's payments only (month_year index);
+        # joining every payment of every student would scan the whole table
+        paid = {
+            row['student__school_class']: row
+            for row in payment_model_for_year(year).objects.filter(
+                month_year=month_year, student__is_active=True,
+            ).values('student__school_class').annotate(
+                class_total=Sum('amount'),
+                students_paid=Count('student', distinct=True),
+            ).order_by()
+        }
+        # Group on the class key and order by grade rather than by name
+        class_data = list(Student.objects.filter(is_active=True).values(
+            'school_class', class_name=F('school_class__name'),
+        ).annotate(
             total_students=Count('id'),
-            class_total=Sum(
-                'payments__amount',
-                filter=Q(payments__month_year=month_year)
-            ),
-            students_paid=Count(
-                'payments__student',
-                filter=Q(payments__month_year=month_year),
-                distinct=True
-            )
-        ).order_by('class_name')
-        
-        # Convert None values to 0
+        ).order_by('school_class__grade'))
+
         for item in class_data:
-            item['class_total'] = item['class_total'] or Decimal('0.00')
-            item['students_paid'] = item['students_paid'] or 0
-            
+            row = paid.get(item['school_class'], {})
+            item['class_total'] = row.get('class_total') or Decimal('0.00')
+            item['students_paid'] = row.get('students_paid') or 0
+
         return class_data
 
+    @classmethod
+    def get_period_rollup(cls, year, month=None):
+        """Totals, monthly sums and per-class sums for a year (or one month)"""
+        from django.db.models import Sum, Count, F
+        from .archive import payment_model_for_year
+        from .utils import year_months
+
+        year_qs = payment_model_for_year(year).objects.filter(month_year__range=year_months(year))
+        qs = year_qs.filter(month_year=f"{year}-{month:02d}") if month else year_qs
+        totals = qs.aggregate(
+            total_amount=Sum('amount'),
+            payment_count=Count('id'),
+            paying_students=Count('student', distinct=True),
+        )
+        monthly = {
+            int(row['month_year'][5:7]): row['total']
+            for row in year_qs.values('month_year').annotate(total=Sum('amount')).order_by()
+        }
+        classes = list(
+            qs.values(
+                grade=F('student__school_class__grade'),
+                class_name=F('student__school_class__name'),
+            ).annotate(
+                total_amount=Sum('amount'),
+                payment_count=Count('id'),
+            ).order_by('grade')
+        )
+        return {
+            'total_amount': totals['total_amount'] or Decimal('0.00'),
+            'payment_count': totals['payment_count'] or 0,
+            'paying_students': totals['paying_students'] or 0,
+            'active_students': Student.objects.filter(is_active=True).count(),
+            'monthly': monthly,
+            'classes': classes,
+        }
+
     @classmethod
     def get_yearly_summary(cls, year):
         """Get Jalali yearly payment summary by month using month_year (YYYY-MM)."""
         from django.db.models import Sum, Count
+        from .archive import payment_model_for_year
+        from .utils import year_months
 
         # Aggregate by month_year prefix matching the Jalali year
-        records = cls.objects.filter(
-            month_year__startswith=f"{year}-"
+        records = payment_model_for_year(year).objects.filter(
+            month_year__range=year_months(year)
         ).values('month_year').annotate(
             monthly_total=Sum('amount'),
             payment_count=Count('id')
@@ -228,3 +391,537 @@ class FeePayment(models.Model):
             }
             for month in range(1, 13)
         ]
+
+
+class ArchivedFeePayment(models.Model):
+    """Payment moved out of FeePayment for a closed year; keeps the original id"""
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='archived_payments',
+        verbose_name="شاگرد"
+    )
+    payment_date = models.DateField(verbose_name="تاریخ پرداخت")
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="مقدار"
+    )
+    month_year = models.CharField(max_length=7, verbose_name="ماه/سال")
+    payment_method = models.CharField(
+        max_length=20,
+        choices=FeePayment.PAYMENT_METHODS,
+        verbose_name="طریقه پرداخت"
+    )
+    notes = models.TextField(blank=True, null=True, verbose_name="یادداشت")
+    client_key = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="کلید همگام‌سازی")
+    created_at = models.DateTimeField(verbose_name="تاریخ ایجاد")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ بایگانی")
+
+    # Reverse name on Student, for annotations that span either table
+    student_relation = 'archived_payments'
+
+    class Meta:
+        verbose_name = "پرداخت بایگانی شده"
+        verbose_name_plural = "پرداخت‌های بایگانی شده"
+        ordering = ['-payment_date']
+        indexes = [
+            # Covering, as on FeePayment
+            models.Index(fields=['month_year', 'student', 'payment_method', 'amount']),
+            models.Index(fields=['payment_date']),
+            models.Index(fields=['student', 'payment_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.name} - {self.amount} افغانی - {self.month_year}"
+
+
+class PaymentRecord(models.Model):
+    """Live and archived payments together: a read-only SQL view over both tables.
+
+    Year-scoped pages read it for a year whose payments are being moved
+    between the tables (see ``ArchivedYear.is_complete``).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name="شاگرد"
+    )
+    payment_date = models.DateField(verbose_name="تاریخ پرداخت")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="مقدار")
+    month_year = models.CharField(max_length=7, verbose_name="ماه/سال")
+    payment_method = models.CharField(
+        max_length=20,
+        choices=FeePayment.PAYMENT_METHODS,
+        verbose_name="طریقه پرداخت"
+    )
+    notes = models.TextField(blank=True, null=True, verbose_name="یادداشت")
+    client_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="کلید همگام‌سازی")
+    created_at = models.DateTimeField(verbose_name="تاریخ ایجاد")
+
+    class Meta:
+        managed = False
+        db_table = 'school_management_paymentrecord'
+        verbose_name = "پرداخت"
+        verbose_name_plural = "پرداخت‌ها"
+        ordering = ['-payment_date']
+
+    def __str__(self):
+        return f"{self.student.name} - {self.amount} افغانی - {self.month_year}"
+
+
+class ArchivedYear(models.Model):
+    """Jalali year whose payments live in ArchivedFeePayment
+
+    ``is_complete`` is False while the year's payments are being moved in
+    either direction, or after such a move was interrupted.
+    """
+    year = models.PositiveSmallIntegerField(unique=True, verbose_name="سال")
+    payments_count = models.PositiveIntegerField(default=0, verbose_name="تعداد پرداخت‌ها")
+    is_complete = models.BooleanField(default=True, verbose_name="انتقال کامل شده")
+    archived_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بایگانی")
+
+    class Meta:
+        verbose_name = "سال بایگانی شده"
+        verbose_name_plural = "سال‌های بایگانی شده"
+        ordering = ['year']
+
+    def __str__(self):
+        return str(self.year)
+
+
+class Promotion(models.Model):
+    """Year-end move of active students up one class; kept so it can be reverted"""
+    year = models.PositiveSmallIntegerField(verbose_name="سال تعلیمی")
+    promoted_count = models.PositiveIntegerField(default=0, verbose_name="ترفیع یافته")
+    graduated_count = models.PositiveIntegerField(default=0, verbose_name="فارغ شده")
+    # Users live in the default database, so no constraint in branch databases
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_constraint=False,
+        verbose_name="کاربر"
+    )
+    username = models.CharField(max_length=150, blank=True, verbose_name="نام کاربر")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ اجرا")
+    reverted_at = models.DateTimeField(null=True, blank=True, verbose_name="تاریخ برگشت")
+
+    class Meta:
+        verbose_name = "ترفیع سالانه"
+        verbose_name_plural = "ترفیع‌های سالانه"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"ترفیع {self.year}"
+
+
+class PromotionStudent(models.Model):
+    """Where one student was before a promotion; ``to_class`` is empty for graduates"""
+    promotion = models.ForeignKey(
+        Promotion,
+        on_delete=models.CASCADE,
+        related_name='students',
+        verbose_name="ترفیع"
+    )
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='promotions',
+        verbose_name="شاگرد"
+    )
+    from_class = models.ForeignKey(
+        SchoolClass,
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name="صنف قبلی"
+    )
+    to_class = models.ForeignKey(
+        SchoolClass,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="صنف جدید"
+    )
+
+    class Meta:
+        verbose_name = "شاگرد ترفیع یافته"
+        verbose_name_plural = "شاگردان ترفیع یافته"
+        constraints = [
+            models.UniqueConstraint(fields=['promotion', 'student'], name='unique_promotion_student'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id}: {self.from_class_id} → {self.to_class_id or '-'}"
+
+
+class FeeInvoice(models.Model):
+    """Expected monthly dues for one student; payments are allocated against it"""
+
+    STATUS_UNPAID = 'unpaid'
+    STATUS_PARTIAL = 'partial'
+    STATUS_PAID = 'paid'
+    STATUS_CHOICES = [
+        (STATUS_UNPAID, 'پرداخت نشده'),
+        (STATUS_PARTIAL, 'پرداخت ناقص'),
+        (STATUS_PAID, 'پرداخت شده'),
+    ]
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='invoices',
+        verbose_name="شاگرد"
+    )
+    month_year = models.CharField(
+        max_length=7,
+        help_text="فرمت: YYYY-MM",
+        verbose_name="ماه/سال"
+    )
+    amount_due = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="مبلغ قابل پرداخت"
+    )
+    amount_paid = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="مبلغ پرداخت شده"
+    )
+    balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="باقی‌مانده"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_UNPAID,
+        verbose_name="وضعیت"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاریخ ایجاد"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاریخ به روز رسانی"
+    )
+
+    class Meta:
+        verbose_name = "صورت حساب ماهانه"
+        verbose_name_plural = "صورت حساب‌های ماهانه"
+        ordering = ['student', 'month_year']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'month_year'], name='unique_invoice_per_student_month'),
+        ]
+        indexes = [
+            models.Index(fields=['month_year', 'status']),
+            models.Index(fields=['student', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.name} - {self.month_year} - {self.balance} افغانی"
+
+    def set_paid(self, amount_paid):
+        """Update paid amount, balance and status in memory"""
+        self.amount_paid = amount_paid
+        self.balance = max(self.amount_due - amount_paid, Decimal('0.00'))
+        if amount_paid >= self.amount_due:
+            self.status = self.STATUS_PAID
+        elif amount_paid > 0:
+            self.status = self.STATUS_PARTIAL
+        else:
+            self.status = self.STATUS_UNPAID
+
+    @classmethod
+    def get_status_counts(cls, year, month):
+        """Number of invoices per status for a month"""
+        rows = cls.objects.filter(month_year=f"{year}-{month:02d}").values('status').annotate(
+            count=models.Count('id')
+        ).order_by()
+        counts = {key: 0 for key, _ in cls.STATUS_CHOICES}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
+
+
+class PaymentAllocation(models.Model):
+    """Part of a payment applied to an invoice"""
+    # No constraint: archived payments keep their id in ArchivedFeePayment.
+    # Allocations are rebuilt by the ledger whenever payments change.
+    payment = models.ForeignKey(
+        FeePayment,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='allocations',
+        verbose_name="پرداخت"
+    )
+    invoice = models.ForeignKey(
+        FeeInvoice,
+        on_delete=models.CASCADE,
+        related_name='allocations',
+        verbose_name="صورت حساب"
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="مقدار"
+    )
+
+    class Meta:
+        verbose_name = "تخصیص پرداخت"
+        verbose_name_plural = "تخصیص پرداخت‌ها"
+
+    def __str__(self):
+        return f"{self.payment_id} → {self.invoice_id}: {self.amount}"
+
+
+class AuditLog(models.Model):
+    """Append-only record of a create/update/delete on a student or payment"""
+
+    ACTION_CHOICES = [
+        ('create', 'ایجاد'),
+        ('update', 'ویرایش'),
+        ('delete', 'حذف'),
+    ]
+
+    model_name = models.CharField(max_length=30, verbose_name="نوع")
+    object_id = models.PositiveBigIntegerField(verbose_name="شناسه")
+    # Student the change belongs to; kept as a plain id so history survives deletes
+    student_ref = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="شاگرد")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="عملیات")
+    changes = models.JSONField(default=dict, verbose_name="تغییرات")
+    # Users live in the default database, so no constraint in branch databases
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_constraint=False,
+        verbose_name="کاربر"
+    )
+    username = models.CharField(max_length=150, blank=True, verbose_name="نام کاربر")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="زمان")
+
+    class Meta:
+        verbose_name = "سابقه تغییر"
+        verbose_name_plural = "سوابق تغییرات"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['model_name', 'object_id', 'created_at']),
+            models.Index(fields=['student_ref', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.model_name} #{self.object_id}"
+
+    def get_change_lines(self):
+        """``(label, old, new)`` rows for display; ``old`` is None for create/delete"""
+        from django.apps import apps
+
+        model = apps.get_model('school_management', self.model_name)
+        labels = {f.name: f.verbose_name for f in model._meta.fields}
+        lines = []
+        for name, value in self.changes.items():
+            label = labels.get(name, name)
+            if self.action == 'update':
+                lines.append((label, value[0], value[1]))
+            else:
+                lines.append((label, None, value))
+        return lines
+
+
+class BranchMembership(models.Model):
+    """Branch a user works in; stored in the default database"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='branch_membership',
+        verbose_name="کاربر"
+    )
+    branch = models.CharField(max_length=50, verbose_name="شعبه")
+
+    class Meta:
+        verbose_name = "شعبه کاربر"
+        verbose_name_plural = "شعبه‌های کاربران"
+
+    def __str__(self):
+        return f"{self.user} - {self.branch}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .branches import get_branches
+
+        if self.branch not in dict(get_branches()):
+            raise ValidationError({'branch': 'شعبه معتبر نیست.'})
+
+
+class BackgroundJob(models.Model):
+    """Database-backed queue entry for heavy exports run by ``run_workers``"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'در انتظار'),
+        (STATUS_RUNNING, 'در حال اجرا'),
+        (STATUS_DONE, 'تکمیل شده'),
+        (STATUS_FAILED, 'ناموفق'),
+    ]
+
+    KIND_PAYMENTS_EXPORT = 'payments_export'
+    KIND_REPORT_EXPORT = 'report_export'
+    KIND_STATEMENTS = 'statements'
+    KIND_REMINDERS = 'reminders'
+    KIND_CHOICES = [
+        (KIND_PAYMENTS_EXPORT, 'خروجی پرداخت‌ها'),
+        (KIND_REPORT_EXPORT, 'خروجی گزارش'),
+        (KIND_STATEMENTS, 'صورت حساب‌های شاگردان'),
+        (KIND_REMINDERS, 'یادآوری فیس'),
+    ]
+
+    kind = models.CharField(
+        max_length=50,
+        choices=KIND_CHOICES,
+        verbose_name="نوع"
+    )
+    branch = models.CharField(
+        max_length=50,
+        default='default',
+        verbose_name="شعبه"
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="پارامترها"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="وضعیت"
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="پیشرفت (%)"
+    )
+    result_file = models.FileField(
+        upload_to='jobs/',
+        blank=True,
+        verbose_name="فایل نتیجه"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="خطا"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاریخ ایجاد"
+    )
+    started_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="شروع"
+    )
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="پایان"
+    )
+
+    class Meta:
+        verbose_name = "کار پس‌زمینه"
+        verbose_name_plural = "کارهای پس‌زمینه"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} - {self.get_status_display()}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class Reminder(models.Model):
+    """One fee reminder message to a student's phone and its delivery status"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'در انتظار'),
+        (STATUS_SENT, 'ارسال شده'),
+        (STATUS_FAILED, 'ناموفق'),
+        (STATUS_SKIPPED, 'لغو شده (پرداخت شد)'),
+    ]
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name="شاگرد"
+    )
+    month_year = models.CharField(
+        max_length=7,
+        help_text="فرمت: YYYY-MM",
+        verbose_name="ماه/سال"
+    )
+    phone = models.CharField(
+        max_length=20,
+        verbose_name="تلفن"
+    )
+    message = models.TextField(
+        verbose_name="پیام"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="وضعیت"
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="تعداد تلاش"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="خطا"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاریخ ایجاد"
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="تاریخ ارسال"
+    )
+
+    class Meta:
+        verbose_name = "یادآوری فیس"
+        verbose_name_plural = "یادآوری‌های فیس"
+        ordering = ['-created_at']
+        constraints = [
+            # At most one reminder per student and month, however often the run is repeated
+            models.UniqueConstraint(fields=['student', 'month_year'], name='unique_reminder_per_student_month'),
+        ]
+        indexes = [
+            models.Index(fields=['month_year', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} {self.month_year}: {self.get_status_display()}"
@@ -0,0 +1,189 @@
+"""Read-only fee page for parents, behind a signed per-student link.
+
+The link carries the branch and the student's id signed with ``SECRET_KEY``
+(:func:`make_token`), so parents need no account and can't reach another
+student's page by changing the id.
+
+Pages are cached whole, as rendered HTML, per student and Jalali month. An
+entry is dropped when that student's payments or the student change: saves
+and deletions through signals, bulk paths by calling :func:`invalidate`. A
+hit is one cache read; a miss renders from a single query over the student,
+their class and both payment tables.
+
+Invalidation only reaches the cache the writing process uses. Unless
+``CACHES`` is shared between processes, writes from other web workers,
+``run_workers`` or management commands (promotion, archiving, restoring a
+backup) leave other processes' pages in place, so entries also expire after
+``PORTAL_CACHE_SECONDS`` (five minutes by default).
+"""
+import datetime
+from decimal import Decimal
+
+import jdatetime
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .branches import DEFAULT_BRANCH, branch_name, current_branch, get_branches
+from .cashflow import jalali_label
+from .models import ArchivedFeePayment, FeePayment, SchoolClass, Student
+from .utils import get_afghan_month_name
+
+SALT = 'school_management.portal'
+CENT = Decimal('0.01')
+
+
+def make_token(student_pk, branch=None):
+    return signing.Signer(salt=SALT).sign(f"{branch or current_branch()}.{student_pk}")
+
+
+def read_token(token):
+    """``(branch, student_pk)`` from a portal token; None if it is forged or stale."""
+    try:
+        value = signing.Signer(salt=SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+    branch, _, pk = value.rpartition('.')
+    if branch not in dict(get_branches()) or not pk.isdigit():
+        return None
+    return branch, int(pk)
+
+
+def portal_path(student, branch=None):
+    return reverse('parent_portal', args=[make_token(student.pk, branch)])
+
+
+def _cache_key(branch, student_pk, month_year):
+    return f"portal:{branch}:{student_pk}:{month_year}"
+
+
+def _current_month_year():
+    today = jdatetime.date.today()
+    return f"{today.year}-{today.month:02d}"
+
+
+def invalidate(student_ids, branch=None):
+    """Drop the cached pages of ``student_ids`` once the current transaction commits."""
+    branch = branch or current_branch()
+    keys = [_cache_key(branch, pk, _current_month_year()) for pk in set(student_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys), using=branch)
+
+
+def _sql():
+    payments = '\n            UNION ALL\n'.join(
+        f"""            SELECT id, student_id, payment_date, month_year, amount, payment_method
+            FROM {model._meta.db_table} WHERE student_id = %s"""
+        for model in (FeePayment, ArchivedFeePayment)
+    )
+    return f"""
+        SELECT s.name, s.student_id, s.father_name, s.monthly_fee, s.is_active, c.name,
+               p.payment_date, p.month_year, p.amount, p.payment_method
+        FROM {Student._meta.db_table} s
+        LEFT JOIN {SchoolClass._meta.db_table} c ON c.id = s.school_class_id
+        LEFT JOIN (
+{payments}
+        ) p ON p.student_id = s.id
+        WHERE s.id = %s
+        ORDER BY p.payment_date DESC, p.id DESC
+    """
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def page_context(student_pk, today=None):
+    """Everything the portal page shows for one student; None if there is no such student."""
+    using = router.db_for_read(Student)
+    with connections[using].cursor() as cursor:
+        cursor.execute(_sql(), [student_pk, student_pk, student_pk])
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    name, student_id, father_name, monthly_fee, is_active, class_name = rows[0][:6]
+    today = today or jdatetime.date.today()
+    fee = _money(monthly_fee)
+    payments, paid_by_month = [], {}
+    for *_, payment_date, month_year, amount, method in rows:
+        if month_year is None:
+            continue  # The student has no payments
+        amount = _money(amount)
+        paid_by_month[month_year] = paid_by_month.get(month_year, Decimal('0.00')) + amount
+        year, _, month = month_year.partition('-')
+        payments.append({
+            'date': jalali_label(_date(payment_date)),
+            'period': f"{get_afghan_month_name(int(month))} {year}" if month.isdigit() else month_year,
+            'amount': amount,
+            'method': method,
+        })
+
+    months = []
+    for month in range(1, 13):
+        paid = paid_by_month.get(f"{today.year}-{month:02d}", Decimal('0.00'))
+        if paid >= fee:
+            status = 'paid'
+        elif paid:
+            status = 'partial'
+        elif month <= today.month:
+            status = 'unpaid'
+        else:
+            status = 'upcoming'
+        months.append({'name': get_afghan_month_name(month), 'paid': paid, 'status': status})
+
+    return {
+        'name': name,
+        'student_id': student_id,
+        'father_name': father_name,
+        'class_name': class_name,
+        'monthly_fee': fee,
+        'is_active': bool(is_active),
+        'year': today.year,
+        'months': months,
+        'payments': payments,
+        'total_paid': sum((p['amount'] for p in payments), Decimal('0.00')),
+        'updated': today.strftime('%Y/%m/%d'),
+    }
+
+
+def get_page(branch, student_pk):
+    """Rendered portal page (bytes) of a student, from the cache when possible."""
+    key = _cache_key(branch, student_pk, _current_month_year())
+    page = cache.get(key)
+    if page is None:
+        context = page_context(student_pk)
+        if context is None:
+            return None
+        page = render_to_string('school_management/portal.html', {
+            **context, 'school_name': branch_name(branch),
+        }).encode('utf-8')
+        cache.set(key, page, getattr(settings, 'PORTAL_CACHE_SECONDS', 300))
+    return page
+
+
+def _on_payment_change(sender, instance, **kwargs):
+    # An edit can move the payment to another student; refresh both pages
+    previous = getattr(instance, '_previous_student_id', None)
+    invalidate({instance.student_id, previous} - {None}, instance._state.db or DEFAULT_BRANCH)
+
+
+def _on_student_change(sender, instance, **kwargs):
+    invalidate([instance.pk], instance._state.db or DEFAULT_BRANCH)
+
+
+def connect():
+    for model in (FeePayment, ArchivedFeePayment):
+        name = model._meta.model_name
+        post_save.connect(_on_payment_change, sender=model, dispatch_uid=f'portal_{name}_save')
+        post_delete.connect(_on_payment_change, sender=model, dispatch_uid=f'portal_{name}_delete')
+    post_save.connect(_on_student_change, sender=Student, dispatch_uid='portal_student_save')
+    post_delete.connect(_on_student_change, sender=Student, dispatch_uid='portal_student_delete')
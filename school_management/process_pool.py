@@ -0,0 +1,23 @@
+"""Process pool helpers shared by the background commands.
+
+This module must stay importable before Django is configured: on Windows the
+pool spawns fresh interpreters that import task functions by reference.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.db import connections
+
+
+def init_worker():
+    # Spawned workers (Windows) start without Django configured
+    if not apps.ready:
+        django.setup()
+
+
+def make_pool(workers):
+    """Create a process pool whose workers can use the ORM and templates."""
+    # Workers must not inherit an open SQLite connection across fork()
+    connections.close_all()
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
@@ -0,0 +1,165 @@
+"""On-demand request profiling.
+
+Staff users add ``?_profile=1`` to any page: the request runs under cProfile
+and, instead of the page, they get a table of the hottest functions and the
+timeline of SQL queries it ran. ``settings.PROFILE_SAMPLE_RATE`` profiles
+that fraction of ordinary requests as well, without changing their response.
+
+Every profile is saved under ``MEDIA_ROOT/profiles/`` as a raw ``.prof``
+file (open with ``python -m pstats`` or snakeviz) plus a ``.json`` file with
+the request and its SQL timeline. Only the newest ``PROFILE_KEEP`` are kept.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.shortcuts import render
+from django.utils import timezone
+
+from .concurrency import serial
+
+PROFILE_DIR = 'profiles'
+SORT_KEYS = {'tottime': 2, 'cumulative': 3, 'calls': 1}
+TOP_FUNCTIONS = 40
+SQL_PREVIEW = 500
+
+
+class _SQLTimeline:
+    """Execute wrapper recording each query's start offset and duration."""
+
+    def __init__(self, start):
+        self.start = start
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'offset_ms': round((began - self.start) * 1000, 2),
+                'duration_ms': round((time.perf_counter() - began) * 1000, 2),
+                'db': context['connection'].alias,
+                'sql': sql[:SQL_PREVIEW],
+            })
+
+
+def _function_label(key):
+    filename, line, name = key
+    if filename == '~':
+        # Built-ins are reported as ('~', 0, '<built-in method ...>')
+        return name
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f"{filename}:{line}({name})"
+
+
+def hot_functions(profiler, sort='tottime', limit=TOP_FUNCTIONS):
+    """Rows of ``{calls, tottime_ms, cumtime_ms, function}``, hottest first."""
+    stats = pstats.Stats(profiler).stats
+    index = SORT_KEYS.get(sort, SORT_KEYS['tottime'])
+    ranked = sorted(stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            'calls': f"{nc}/{cc}" if nc != cc else str(nc),
+            'tottime_ms': round(tt * 1000, 2),
+            'cumtime_ms': round(ct * 1000, 2),
+            'function': _function_label(key),
+        }
+        for key, (cc, nc, tt, ct, _) in ranked
+    ]
+
+
+def _prune(directory):
+    keep = getattr(settings, 'PROFILE_KEEP', 200)
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.prof')),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - keep)]:
+        for path in (entry.path, entry.path[:-len('.prof')] + '.json'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def save_profile(request, profiler, timeline, duration_ms):
+    """Write the ``.prof`` and ``.json`` files; returns the ``.prof`` path."""
+    directory = os.path.join(settings.MEDIA_ROOT, PROFILE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    match = getattr(request, 'resolver_match', None)
+    name = f"{timezone.now():%Y%m%d-%H%M%S}-{match.url_name if match and match.url_name else 'other'}-{uuid.uuid4().hex[:6]}"
+    path = os.path.join(directory, f"{name}.prof")
+    profiler.dump_stats(path)
+    with open(os.path.join(directory, f"{name}.json"), 'w', encoding='utf-8') as fh:
+        json.dump({
+            'path': request.get_full_path(),
+            'user': request.user.get_username() if request.user.is_authenticated else '',
+            'branch': getattr(request, 'branch', ''),
+            'duration_ms': duration_ms,
+            'queries': timeline.queries,
+        }, fh, ensure_ascii=False, indent=1)
+    _prune(directory)
+    return path
+
+
+class ProfilerMiddleware:
+    """Profile ``?_profile=1`` requests of staff users and a sample of all others."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        explicit = request.GET.get('_profile') == '1' and getattr(request, 'user', None) and request.user.is_staff
+        if not explicit and random.random() >= getattr(settings, 'PROFILE_SAMPLE_RATE', 0):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        timeline = _SQLTimeline(start)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timeline))
+            # cProfile only sees this thread, so keep fan-out blocks in it
+            stack.enter_context(serial())
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active in this process
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        if response.streaming:
+            return response
+        path = save_profile(request, profiler, timeline, duration_ms)
+        if not explicit:
+            return response
+
+        sort = request.GET.get('_sort', 'tottime')
+        sort_links = []
+        for key in SORT_KEYS:
+            query = request.GET.copy()
+            query['_sort'] = key
+            sort_links.append((key, f"?{query.urlencode()}"))
+        return render(request, 'school_management/profile_report.html', {
+            'profiled_path': request.get_full_path(),
+            'status_code': response.status_code,
+            'duration_ms': duration_ms,
+            'sql_ms': round(sum(q['duration_ms'] for q in timeline.queries), 2),
+            'functions': hot_functions(profiler, sort),
+            'sort': sort,
+            'sort_links': sort_links,
+            'queries': timeline.queries,
+            'profile_file': os.path.relpath(path, settings.MEDIA_ROOT),
+        })
@@ -0,0 +1,161 @@
+"""Year-end promotion of students to the next class.
+
+Only the standard classes, grades 1 to ``FINAL_GRADE``, take part: active
+students of each move to the class with the next grade, and students of the
+final grade graduate (are deactivated). Other classes, such as the catch-all
+ones created from unrecognised class names, are left alone. :func:`apply_promotion` records every affected
+student's classes in ``PromotionStudent`` and then applies the whole
+promotion with two set-based UPDATEs in one transaction, instead of one
+``Student.save`` per student. :func:`revert_promotion` undoes it from the
+same record.
+"""
+from django.db import router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import audit, live, portal
+from .choices import bump_data_version
+from .branches import current_branch
+from .models import Promotion, PromotionStudent, SchoolClass, Student
+
+
+FINAL_GRADE = 12
+
+
+def class_mapping(class_ids=None):
+    """``({class_id: next_class_id}, graduating_class_id)`` over grades 1..``FINAL_GRADE``.
+
+    ``class_ids`` limits which classes are promoted; the graduating class is
+    None unless it is among them. Raises ``ValueError`` when a standard grade
+    has no class, since students would otherwise skip it.
+    """
+    by_grade = dict(SchoolClass.objects.filter(grade__lte=FINAL_GRADE).values_list('grade', 'pk'))
+    missing = [grade for grade in range(1, FINAL_GRADE + 1) if grade not in by_grade]
+    if missing:
+        raise ValueError(
+            f"صنف درجه {', '.join(map(str, missing))} تعریف نشده است؛ ترفیع ممکن نیست."
+        )
+    mapping = {by_grade[grade]: by_grade[grade + 1] for grade in range(1, FINAL_GRADE)}
+    graduating = by_grade[FINAL_GRADE]
+    if class_ids is not None:
+        class_ids = {int(pk) for pk in class_ids}
+        mapping = {source: target for source, target in mapping.items() if source in class_ids}
+        if graduating not in class_ids:
+            graduating = None
+    return mapping, graduating
+
+
+def plan_promotion(class_ids=None):
+    """Preview: one ``{'from', 'to', 'count'}`` row per class with active students.
+
+    ``to`` is None for the graduating class.
+    """
+    mapping, graduating = class_mapping(class_ids)
+    counts = dict(
+        Student.objects.filter(is_active=True).order_by()
+        .values('school_class').annotate(count=Count('pk')).values_list('school_class', 'count')
+    )
+    classes = SchoolClass.objects.in_bulk()
+    sources = list(mapping) + ([graduating] if graduating else [])
+    return [
+        {'from': classes[pk], 'to': classes.get(mapping.get(pk)), 'count': counts[pk]}
+        for pk in sorted(sources, key=lambda pk: classes[pk].grade)
+        if counts.get(pk)
+    ]
+
+
+def _active_promotion(year):
+    return Promotion.objects.filter(year=year, reverted_at__isnull=True).first()
+
+
+def apply_promotion(year, class_ids=None, user=None):
+    """Promote active students for the Jalali ``year``; returns the ``Promotion``.
+
+    Raises ``ValueError`` when ``year`` was already promoted (and not
+    reverted) or there is nobody to promote.
+    """
+    mapping, graduating = class_mapping(class_ids)
+    with transaction.atomic(using=router.db_for_write(Student)):
+        if _active_promotion(year):
+            raise ValueError(f"ترفیع سال {year} قبلاً اجرا شده است.")
+        sources = list(mapping) + ([graduating] if graduating else [])
+        # Loaded in full for the audit trail; QuerySet.update sends no signals
+        students = list(Student.objects.filter(is_active=True, school_class_id__in=sources))
+        if not students:
+            raise ValueError("شاگرد فعالی برای ترفیع وجود ندارد.")
+
+        promotion = Promotion.objects.create(
+            year=year,
+            promoted_count=sum(1 for s in students if s.school_class_id in mapping),
+            graduated_count=sum(1 for s in students if s.school_class_id == graduating),
+            user=user,
+            username=user.get_username() if user else '',
+        )
+        PromotionStudent.objects.bulk_create([
+            PromotionStudent(
+                promotion=promotion,
+                student=student,
+                from_class_id=student.school_class_id,
+                to_class_id=mapping.get(student.school_class_id),
+            )
+            for student in students
+        ], batch_size=500)
+
+        entries = promotion.students.all()
+        Student.objects.filter(promotions__in=entries.filter(to_class__isnull=True)).update(is_active=False)
+        Student.objects.filter(promotions__in=entries.filter(to_class__isnull=False)).update(
+            school_class=Subquery(entries.filter(student=OuterRef('pk')).values('to_class')[:1])
+        )
+        audit.record_updated(
+            [s for s in students if s.school_class_id == graduating], is_active=False
+        )
+        audit.record_updated(
+            [s for s in students if s.school_class_id in mapping],
+            school_class=lambda s: mapping[s.school_class_id],
+        )
+        portal.invalidate(s.pk for s in students)
+    live.mark_stale(current_branch())
+    bump_data_version()
+    return promotion
+
+
+def revert_promotion(promotion):
+    """Put students back where ``promotion`` found them; returns ``(restored, skipped)``.
+
+    Students whose class or status was changed by hand after the promotion
+    are left alone and counted as skipped. Only the latest promotion can be
+    reverted.
+    """
+    with transaction.atomic(using=router.db_for_write(Student)):
+        promotion = Promotion.objects.get(pk=promotion.pk)
+        if promotion.reverted_at:
+            raise ValueError("این ترفیع قبلاً برگردانده شده است.")
+        if Promotion.objects.filter(reverted_at__isnull=True, created_at__gt=promotion.created_at).exists():
+            raise ValueError("اول ترفیع‌های بعدی را برگردانید.")
+
+        entries = promotion.students.all()
+        promoted = entries.filter(
+            to_class__isnull=False, student__is_active=True, student__school_class=F('to_class')
+        )
+        graduated = entries.filter(
+            to_class__isnull=True, student__is_active=False, student__school_class=F('from_class')
+        )
+        previous = dict(promoted.values_list('student_id', 'from_class_id'))
+        promoted_students = list(Student.objects.filter(promotions__in=promoted))
+        graduated_students = list(Student.objects.filter(promotions__in=graduated))
+
+        Student.objects.filter(promotions__in=graduated).update(is_active=True)
+        Student.objects.filter(promotions__in=promoted).update(
+            school_class=Subquery(entries.filter(student=OuterRef('pk')).values('from_class')[:1])
+        )
+        audit.record_updated(graduated_students, is_active=True)
+        audit.record_updated(promoted_students, school_class=lambda s: previous[s.pk])
+        portal.invalidate(s.pk for s in promoted_students + graduated_students)
+
+        promotion.reverted_at = timezone.now()
+        promotion.save(update_fields=['reverted_at'])
+        restored = len(promoted_students) + len(graduated_students)
+        skipped = entries.count() - restored
+    live.mark_stale(current_branch())
+    bump_data_version()
+    return restored, skipped
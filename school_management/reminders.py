@@ -0,0 +1,232 @@
+"""SMS reminders to students who haven't paid for a month.
+
+:func:`queue_reminders` finds the unpaid students with one anti-join query
+and inserts a pending :class:`~.models.Reminder` for each; the unique
+(student, month) constraint means a repeated run only adds new ones.
+:func:`dispatch` then sends the pending reminders in chunks. Each chunk runs
+as asyncio tasks, at most ``REMINDER_CONCURRENCY`` in flight and
+``REMINDER_RATE`` started per second, with failed sends retried after an
+exponential backoff. Statuses are written back after each chunk with one
+``UPDATE`` per distinct outcome.
+
+Sending never happens inside a web request: the student list queues a
+background job for ``run_workers``, and ``manage.py send_reminders`` can run
+from cron.
+
+``settings.REMINDER_GATEWAY`` is the import path of the gateway class and
+``REMINDER_GATEWAY_OPTIONS`` its keyword arguments. A gateway implements
+``async send(phone, text)`` and raises on failure; :class:`FileGateway` and
+:class:`ConsoleGateway` stand in for a real SMS provider.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+import jdatetime
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import FeePayment, Reminder, Student
+from .utils import get_afghan_month_name
+
+CHUNK_SIZE = 500
+MESSAGE = '{name} عزیز، فیس ماه {month} {year} به مبلغ {fee} افغانی هنوز پرداخت نشده است. لطفاً در اولین فرصت پرداخت کنید.'
+
+
+class GatewayError(Exception):
+    """A send failed; ``retry`` is False when trying again can't help (e.g. an invalid number)."""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class Gateway:
+    """Interface of an SMS gateway."""
+
+    async def send(self, phone, text):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class ConsoleGateway(Gateway):
+    """Prints each message instead of sending it."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    async def send(self, phone, text):
+        self.stream.write(f'{phone}\t{text}\n')
+
+
+class FileGateway(Gateway):
+    """Appends each message to a text file (default ``MEDIA_ROOT/reminders/outbox.txt``)."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(settings.MEDIA_ROOT, 'reminders', 'outbox.txt')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    async def send(self, phone, text):
+        self.file.write(f'{timezone.now().isoformat()}\t{phone}\t{text}\n')
+
+    async def close(self):
+        self.file.close()
+
+
+def get_gateway(path=None):
+    gateway_class = import_string(path or getattr(settings, 'REMINDER_GATEWAY', 'school_management.reminders.FileGateway'))
+    return gateway_class(**getattr(settings, 'REMINDER_GATEWAY_OPTIONS', {}))
+
+
+def current_month_year():
+    today = jdatetime.date.today()
+    return f"{today.year}-{today.month:02d}"
+
+
+def _paid(month_year, student_ref):
+    # Served by the (student, month_year) index on payments
+    return Exists(FeePayment.objects.filter(student=OuterRef(student_ref), month_year=month_year))
+
+
+def unpaid_students(month_year):
+    """Active students with a phone number and no payment for ``month_year``."""
+    return (
+        Student.objects.filter(is_active=True, phone__gt='')
+        .filter(~_paid(month_year, 'pk'))
+    )
+
+
+def queue_reminders(month_year):
+    """Create pending reminders for unpaid students not reminded yet; returns how many."""
+    year, month = month_year.split('-')
+    reminded = Reminder.objects.filter(student=OuterRef('pk'), month_year=month_year)
+    rows = unpaid_students(month_year).filter(~Exists(reminded)).order_by('pk').values_list(
+        'pk', 'name', 'phone', 'monthly_fee'
+    )
+    reminders = [
+        Reminder(
+            student_id=pk,
+            month_year=month_year,
+            phone=phone.strip(),
+            message=MESSAGE.format(
+                name=name, month=get_afghan_month_name(int(month)), year=year, fee=f'{monthly_fee:,.0f}',
+            ),
+        )
+        for pk, name, phone, monthly_fee in rows
+    ]
+    # A run queued concurrently may have inserted some of them meanwhile
+    Reminder.objects.bulk_create(reminders, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+    return len(reminders)
+
+
+def retry_failed(month_year):
+    """Put the failed reminders of ``month_year`` back in the queue."""
+    return Reminder.objects.filter(month_year=month_year, status=Reminder.STATUS_FAILED).update(
+        status=Reminder.STATUS_PENDING
+    )
+
+
+class _RateLimiter:
+    """Spaces the start of sends ``1 / rate`` seconds apart (no limit if rate is 0)."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def _send(gateway, limiter, semaphore, row, retries, delay, timeout):
+    pk, phone, text, attempts = row
+    for attempt in range(retries + 1):
+        await limiter.wait()
+        async with semaphore:
+            attempts += 1
+            try:
+                await asyncio.wait_for(gateway.send(phone, text), timeout)
+            except Exception as exc:
+                error = f'{type(exc).__name__}: {exc}'
+                if not getattr(exc, 'retry', True):
+                    break
+            else:
+                return pk, Reminder.STATUS_SENT, attempts, ''
+        if attempt < retries:
+            # Backoff outside the semaphore so other messages keep going
+            await asyncio.sleep(delay * 2 ** attempt)
+    return pk, Reminder.STATUS_FAILED, attempts, error
+
+
+async def _send_chunk(gateway, limiter, rows):
+    semaphore = asyncio.Semaphore(max(1, getattr(settings, 'REMINDER_CONCURRENCY', 10)))
+    retries = getattr(settings, 'REMINDER_RETRIES', 3)
+    delay = getattr(settings, 'REMINDER_RETRY_DELAY', 1.0)
+    timeout = getattr(settings, 'REMINDER_TIMEOUT', 10)
+    return await asyncio.gather(*(
+        _send(gateway, limiter, semaphore, row, retries, delay, timeout) for row in rows
+    ))
+
+
+def dispatch(month_year, gateway=None, progress=None, chunk_size=CHUNK_SIZE):
+    """Send the pending reminders of ``month_year``; returns the count per status."""
+    counts = Counter()
+    # Students who paid since their reminder was queued are not messaged
+    counts[Reminder.STATUS_SKIPPED] = Reminder.objects.filter(
+        month_year=month_year, status=Reminder.STATUS_PENDING
+    ).filter(_paid(month_year, 'student')).update(status=Reminder.STATUS_SKIPPED)
+
+    pending = Reminder.objects.filter(month_year=month_year, status=Reminder.STATUS_PENDING).order_by('pk')
+    total = pending.count()
+    gateway = gateway or get_gateway()
+    limiter = _RateLimiter(getattr(settings, 'REMINDER_RATE', 20))
+    # One loop for the whole run, so a gateway may keep a connection open;
+    # database work happens between chunks, outside the loop
+    loop = asyncio.new_event_loop()
+    try:
+        done = 0
+        while True:
+            rows = list(pending.values_list('pk', 'phone', 'message', 'attempts')[:chunk_size])
+            if not rows:
+                break
+            results = loop.run_until_complete(_send_chunk(gateway, limiter, rows))
+            # One UPDATE per distinct outcome (usually just "sent, 1 attempt"):
+            # far cheaper than bulk_update's per-row CASE expressions
+            outcomes = {}
+            for pk, status, attempts, error in results:
+                outcomes.setdefault((status, attempts, error), []).append(pk)
+            now = timezone.now()
+            with transaction.atomic(using=router.db_for_write(Reminder)):
+                for (status, attempts, error), pks in outcomes.items():
+                    Reminder.objects.filter(pk__in=pks).update(
+                        status=status, attempts=attempts, error=error,
+                        sent_at=now if status == Reminder.STATUS_SENT else None,
+                    )
+                    counts[status] += len(pks)
+            done += len(rows)
+            if progress:
+                progress(done, total)
+    finally:
+        loop.run_until_complete(gateway.close())
+        loop.close()
+    return counts
+
+
+def send_reminders(month_year=None, gateway=None, progress=None):
+    """Queue and send this month's (or ``month_year``'s) reminders; returns the count per status."""
+    month_year = month_year or current_month_year()
+    queue_reminders(month_year)
+    return dispatch(month_year, gateway=gateway, progress=progress)
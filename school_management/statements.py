@@ -0,0 +1,278 @@
+"""Batch generation of per-student fee statements and payment receipts.
+
+Data is fetched for whole chunks of students with two grouped queries, turned
+into plain dicts and rendered in a process pool. Each student's output is
+cached under ``MEDIA_ROOT/statements/cache/<branch>/`` keyed by a hash of the data it
+was rendered from, so unchanged statements are never rebuilt.
+
+Model imports are kept inside functions: pool workers import this module
+before Django is set up when processes are spawned (Windows).
+"""
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+from decimal import Decimal
+
+import jdatetime
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from . import metrics
+from .branches import current_branch
+from .utils import get_afghan_month_name
+
+# Bump when the statement/receipt templates change so cached output is rebuilt
+TEMPLATE_VERSION = 1
+
+STATEMENTS_DIR = 'statements'
+BODY_MARKER = '<!--statement-body-->'
+
+
+def _jalali(d):
+    return jdatetime.date.fromgregorian(date=d).strftime('%Y/%m/%d') if d else ''
+
+
+def _cache_root(branch):
+    return os.path.join(settings.MEDIA_ROOT, STATEMENTS_DIR, 'cache', branch)
+
+
+def student_ids_for(class_id=None, include_inactive=False):
+    """Student primary keys to include, in print order (grade, then name)."""
+    from .models import Student
+
+    qs = Student.objects.all()
+    if not include_inactive:
+        qs = qs.filter(is_active=True)
+    if class_id:
+        qs = qs.filter(school_class_id=class_id)
+    return list(qs.order_by('school_class__grade', 'name', 'pk').values_list('pk', flat=True))
+
+
+def load_chunk(student_ids, year):
+    """Build statement payloads for ``student_ids`` using two grouped queries."""
+    from django.db.models import F
+    from .archive import has_archive
+    from .models import ArchivedFeePayment, Student, FeePayment
+
+    students = {
+        s['pk']: s for s in Student.objects.filter(pk__in=student_ids).values(
+            'pk', 'student_id', 'name', 'father_name',
+            'phone', 'monthly_fee', 'registration_date', 'is_active',
+            class_name=F('school_class__name'),
+        )
+    }
+    payments = {pk: [] for pk in students}
+    fields = ('id', 'student_id', 'payment_date', 'amount', 'month_year', 'payment_method', 'notes')
+    rows = FeePayment.objects.filter(student_id__in=student_ids).order_by().values(*fields)
+    if has_archive():
+        archived = ArchivedFeePayment.objects.filter(student_id__in=student_ids).order_by().values(*fields)
+        rows = rows.union(archived, all=True)
+    for row in rows.order_by('student_id', 'payment_date', 'id'):
+        payments[row['student_id']].append(row)
+
+    branch = current_branch()
+    return [
+        {**build_payload(students[pk], payments[pk], year), 'branch': branch}
+        for pk in student_ids if pk in students
+    ]
+
+
+def build_payload(student, payments, year):
+    """Statement context for one student: history, totals and per-month status."""
+    fee = student['monthly_fee']
+    paid_by_month = {}
+    for p in payments:
+        paid_by_month[p['month_year']] = paid_by_month.get(p['month_year'], Decimal('0.00')) + p['amount']
+
+    reg = student['registration_date']
+    reg_jalali = jdatetime.date.fromgregorian(date=reg) if reg else None
+    months = []
+    for m in range(1, 13):
+        paid = paid_by_month.get(f"{year}-{m:02d}", Decimal('0.00'))
+        if reg_jalali and (year, m) < (reg_jalali.year, reg_jalali.month) and not paid:
+            status = 'not_registered'
+        elif paid >= fee:
+            status = 'paid'
+        elif paid > 0:
+            status = 'partial'
+        else:
+            status = 'unpaid'
+        months.append({
+            'month': m,
+            'month_name': get_afghan_month_name(m),
+            'paid': paid,
+            'status': status,
+        })
+
+    due = sum((fee for mo in months if mo['status'] != 'not_registered'), Decimal('0.00'))
+    paid_in_year = sum((mo['paid'] for mo in months), Decimal('0.00'))
+    return {
+        'year': year,
+        'student': {
+            **student,
+            'registration_date': _jalali(reg),
+        },
+        'payments': [
+            {
+                **p,
+                'payment_date': _jalali(p['payment_date']),
+                'notes': p['notes'] or '',
+            }
+            for p in payments
+        ],
+        'months': months,
+        'total_paid': sum((p['amount'] for p in payments), Decimal('0.00')),
+        'payments_count': len(payments),
+        'year_due': due,
+        'year_paid': paid_in_year,
+        'year_balance': max(due - paid_in_year, Decimal('0.00')),
+    }
+
+
+def payload_version(payload):
+    """Short hash of everything a statement is rendered from."""
+    raw = json.dumps([TEMPLATE_VERSION, payload], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_dir(payload, version):
+    return os.path.join(_cache_root(payload['branch']), f"{payload['student']['pk']}-{payload['year']}-{version}")
+
+
+def is_cached(payload, version):
+    return os.path.exists(os.path.join(_cache_dir(payload, version), 'statement.html'))
+
+
+def render_chunk(items):
+    """Render ``(payload, version)`` pairs into the cache; runs in a pool worker."""
+    written = []
+    for payload, version in items:
+        target = _cache_dir(payload, version)
+        tmp = target + '.tmp'
+        os.makedirs(os.path.join(tmp, 'receipts'), exist_ok=True)
+        with open(os.path.join(tmp, 'receipts', 'index.json'), 'w', encoding='utf-8') as fh:
+            json.dump([p['id'] for p in payload['payments']], fh)
+        for payment in payload['payments']:
+            html = render_to_string('school_management/statements/receipt.html', {
+                'student': payload['student'],
+                'payment': payment,
+                'month_name': get_afghan_month_name(int(payment['month_year'].split('-')[1]))
+                if '-' in payment['month_year'] else payment['month_year'],
+            })
+            with open(os.path.join(tmp, 'receipts', f"{payment['id']}.html"), 'w', encoding='utf-8') as fh:
+                fh.write(html)
+        html = render_to_string('school_management/statements/statement.html', payload)
+        with open(os.path.join(tmp, 'statement.html'), 'w', encoding='utf-8') as fh:
+            fh.write(html)
+
+        # Drop older versions of this student's statement, then publish atomically
+        prefix = f"{payload['student']['pk']}-{payload['year']}-"
+        root = _cache_root(payload['branch'])
+        for name in os.listdir(root):
+            if name.startswith(prefix) and not name.endswith('.tmp'):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        os.replace(tmp, target)
+        written.append(payload['student']['pk'])
+    return written
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as fh:
+        return fh.read()
+
+
+def _document_parts(title):
+    """Print-ready HTML head and tail around the statement fragments."""
+    html = render_to_string('school_management/statements/document.html', {
+        'title': title,
+        'body_marker': BODY_MARKER,
+    })
+    head, tail = html.split(BODY_MARKER)
+    return head, tail
+
+
+def write_output(entries, output_path, fmt='zip', include_receipts=True, title='صورت حساب فیس'):
+    """Assemble cached statements into a zip or one combined print-ready HTML file.
+
+    ``entries`` is a list of ``(payload, version)`` pairs in print order.
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    head, tail = _document_parts(title)
+
+    if fmt == 'html':
+        with open(output_path, 'w', encoding='utf-8') as out:
+            out.write(head)
+            for payload, version in entries:
+                cache_dir = _cache_dir(payload, version)
+                out.write(_read(os.path.join(cache_dir, 'statement.html')))
+                if include_receipts:
+                    for payment_id in json.loads(_read(os.path.join(cache_dir, 'receipts', 'index.json'))):
+                        out.write(_read(os.path.join(cache_dir, 'receipts', f'{payment_id}.html')))
+            out.write(tail)
+        return output_path
+
+    with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for payload, version in entries:
+            cache_dir = _cache_dir(payload, version)
+            student = payload['student']
+            name = student['student_id'] or f"student-{student['pk']}"
+            zf.writestr(f"statements/{name}.html", head + _read(os.path.join(cache_dir, 'statement.html')) + tail)
+            if include_receipts:
+                for payment_id in json.loads(_read(os.path.join(cache_dir, 'receipts', 'index.json'))):
+                    receipt = _read(os.path.join(cache_dir, 'receipts', f'{payment_id}.html'))
+                    zf.writestr(f"receipts/{name}/{payment_id}.html", head + receipt + tail)
+    return output_path
+
+
+def default_output_path(year, fmt):
+    branch = current_branch()
+    suffix = '' if branch == 'default' else f'-{branch}'
+    return os.path.join(settings.MEDIA_ROOT, STATEMENTS_DIR, f"statements-{year}{suffix}.{'html' if fmt == 'html' else 'zip'}")
+
+
+def generate_statements(year=None, class_id=None, include_inactive=False, fmt='zip',
+                        include_receipts=True, output_path=None, workers=0, chunk_size=200,
+                        progress=None):
+    """Render statements for all selected students and write the combined output.
+
+    With ``workers`` > 0 rendering runs in a process pool; otherwise inline.
+    Returns ``(output_path, rendered_count, cached_count)``.
+    """
+    year = year or jdatetime.date.today().year
+    output_path = output_path or default_output_path(year, fmt)
+    os.makedirs(_cache_root(current_branch()), exist_ok=True)
+
+    ids = student_ids_for(class_id, include_inactive)
+    entries = []
+    to_render = []
+    for start in range(0, len(ids), chunk_size):
+        batch = []
+        for payload in load_chunk(ids[start:start + chunk_size], year):
+            version = payload_version(payload)
+            entries.append((payload, version))
+            cached = is_cached(payload, version)
+            metrics.cache_lookup('statements', cached)
+            if not cached:
+                batch.append((payload, version))
+        if batch:
+            to_render.append(batch)
+
+    total_chunks = len(to_render)
+    if workers and total_chunks > 1:
+        from .process_pool import make_pool
+
+        with make_pool(workers) as pool:
+            for done, _ in enumerate(pool.map(render_chunk, to_render), start=1):
+                if progress:
+                    progress(done, total_chunks)
+    else:
+        for done, batch in enumerate(to_render, start=1):
+            render_chunk(batch)
+            if progress:
+                progress(done, total_chunks)
+
+    rendered = sum(len(batch) for batch in to_render)
+    write_output(entries, output_path, fmt=fmt, include_receipts=include_receipts)
+    return output_path, rendered, len(entries) - rendered
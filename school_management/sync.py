@@ -0,0 +1,133 @@
+"""Batch ingestion of payments recorded offline by satellite cashiers.
+
+Every item carries a client-generated ``key`` stored in
+``FeePayment.client_key`` under a unique index. Keys already stored (or
+repeated within the batch) are reported as duplicates and skipped, so a
+client can safely resend a batch after a dropped connection. The remaining
+items are validated with the ``FeePaymentForm`` rules and inserted with one
+``bulk_create``. If another request stores some of the same keys first, the
+insert is retried without them, up to ``MAX_INSERT_ATTEMPTS`` times; items
+still not stored after that are reported as invalid, to be sent again. Students and archived years are loaded once per batch, so
+validation runs no queries per item.
+"""
+from django.db import IntegrityError, router, transaction
+
+MAX_ITEMS = 500
+MAX_INSERT_ATTEMPTS = 3
+
+STATUS_CREATED = 'created'
+STATUS_DUPLICATE = 'duplicate'
+STATUS_INVALID = 'invalid'
+
+
+def _existing_keys(keys):
+    from .archive import payment_models
+
+    found = {}
+    for model in payment_models():
+        found.update(model.objects.filter(client_key__in=keys).values_list('client_key', 'pk'))
+    return found
+
+
+def _form_data(item):
+    """Map an API item onto FeePaymentForm field names."""
+    year, _, month = str(item.get('month_year') or '').partition('-')
+    return {
+        'client_key': item.get('key'),
+        'student': item.get('student'),
+        'amount': item.get('amount'),
+        'month': month.lstrip('0'),
+        'year': year,
+        'payment_method': item.get('payment_method') or 'نقدی',
+        'notes': item.get('notes') or '',
+        'payment_date': item.get('payment_date') or '',
+    }
+
+
+def _form_errors(form):
+    return {field: [str(e) for e in errors] for field, errors in form.errors.items()}
+
+
+def ingest_payments(items):
+    """Validate and insert ``items``; returns one result dict per item, in order."""
+    from .archive import archived_years
+    from .forms import PaymentSyncForm
+    from .models import Student
+
+    results = [{'key': item.get('key') if isinstance(item, dict) else None} for item in items]
+    keys = [r['key'] for r in results if isinstance(r['key'], str) and r['key']]
+    existing = _existing_keys(keys)
+
+    student_ids = set()
+    for item in items:
+        if isinstance(item, dict):
+            try:
+                student_ids.add(int(item.get('student')))
+            except (TypeError, ValueError):
+                pass
+    students = Student.objects.filter(is_active=True).in_bulk(student_ids)
+    archived = archived_years()
+
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        result = results[index]
+        if not isinstance(item, dict):
+            result.update(status=STATUS_INVALID, errors={'__all__': ['Item must be an object.']})
+            continue
+        key = result['key']
+        if key in existing:
+            result.update(status=STATUS_DUPLICATE, id=existing[key])
+            continue
+        if key in seen:
+            result.update(status=STATUS_DUPLICATE)
+            continue
+        form = PaymentSyncForm(_form_data(item), students=students, archived_years=archived)
+        if not form.is_valid():
+            result.update(status=STATUS_INVALID, errors=_form_errors(form))
+            continue
+        seen.add(key)
+        pending.append((index, form.save(commit=False)))
+
+    for _ in range(MAX_INSERT_ATTEMPTS):
+        if not pending:
+            break
+        try:
+            _insert([payment for _, payment in pending])
+        except IntegrityError:
+            # Another request stored some of the keys meanwhile; skip those and retry
+            taken = _existing_keys([p.client_key for _, p in pending])
+            for index, payment in pending:
+                if payment.client_key in taken:
+                    results[index].update(status=STATUS_DUPLICATE, id=taken[payment.client_key])
+            pending = [(i, p) for i, p in pending if p.client_key not in taken]
+            if not taken:
+                break  # Not a key conflict; retrying won't help
+        else:
+            for index, payment in pending:
+                results[index].update(status=STATUS_CREATED, id=payment.pk)
+            pending = []
+    for index, _ in pending:
+        results[index].update(status=STATUS_INVALID, errors={
+            '__all__': ['Could not be stored because of a concurrent change; send it again.'],
+        })
+    return results
+
+
+def _insert(payments):
+    from . import live, metrics, portal
+    from .audit import record_created
+    from .ledger import allocate_students
+    from .models import FeePayment
+
+    if not payments:
+        return
+    # On the branch's database, so a failed batch leaves no rows behind
+    with transaction.atomic(using=router.db_for_write(FeePayment)):
+        FeePayment.objects.bulk_create(payments, batch_size=500)
+        # bulk_create skips save() and its signals
+        allocate_students({p.student_id for p in payments})
+        record_created(payments)
+        live.payments_added(payments)
+        portal.invalidate(p.student_id for p in payments)
+    metrics.inc('payments_created_total', len(payments), source='sync')
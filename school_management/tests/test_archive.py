@@ -0,0 +1,89 @@
+"""An interrupted archive run hides no payments and can be finished later."""
+from decimal import Decimal
+from unittest import mock
+
+import jdatetime
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from school_management import archive
+from school_management.exports import filter_payments
+from school_management.models import ArchivedFeePayment, ArchivedYear, FeePayment, SchoolClass, Student
+
+STUDENTS = 4
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class InterruptedArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.year = jdatetime.date.today().year - 2
+        school_class = SchoolClass.objects.order_by('grade').first()
+        payments = []
+        for i in range(STUDENTS):
+            student = Student.objects.create(
+                name=f'شاگرد {i}', father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'),
+            )
+            for month in range(1, 13):
+                payments.append(FeePayment(
+                    student=student, amount=Decimal('100'), month_year=f'{cls.year}-{month:02d}',
+                    payment_date=jdatetime.date(cls.year, month, 5).togregorian(),
+                ))
+        FeePayment.objects.bulk_create(payments)
+        cls.total = Decimal('100') * STUDENTS * 12
+
+    def interrupt_archive(self):
+        original = archive._delete_ids
+        calls = []
+
+        def fail_second_batch(model, ids):
+            calls.append(ids)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            original(model, ids)
+
+        with mock.patch.object(archive, '_delete_ids', fail_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                archive.archive_year(self.year, batch_size=10)
+
+    def assert_year_complete(self):
+        rollup = FeePayment.get_period_rollup(self.year)
+        self.assertEqual(rollup['total_amount'], self.total)
+        self.assertEqual(rollup['paying_students'], STUDENTS)
+        self.assertEqual(filter_payments({'year': str(self.year)}).count(), STUDENTS * 12)
+
+    def test_reads_use_both_tables_until_finished(self):
+        self.interrupt_archive()
+        self.assertTrue(FeePayment.objects.exists())
+        self.assertTrue(ArchivedFeePayment.objects.exists())
+        self.assertEqual(archive.incomplete_years(), [self.year])
+        self.assert_year_complete()
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        response = self.client.get(reverse('reports'), {'year': self.year})
+        self.assertEqual(response.status_code, 200)
+
+        # Running it again finishes the move
+        archive.archive_year(self.year, batch_size=10)
+        self.assertFalse(FeePayment.objects.exists())
+        self.assertEqual(ArchivedYear.objects.get(year=self.year).payments_count, STUDENTS * 12)
+        self.assertEqual(archive.incomplete_years(), [])
+        self.assert_year_complete()
+
+    def test_restore_keeps_year_readable(self):
+        archive.archive_year(self.year)
+        with mock.patch.object(archive, '_delete_ids', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                archive.restore_year(self.year)
+        self.assert_year_complete()
+        archive.restore_year(self.year)
+        self.assertFalse(ArchivedYear.objects.exists())
+        self.assert_year_complete()
@@ -0,0 +1,98 @@
+"""Audit entries record what changed, only once committed, in one batched insert."""
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from school_management import audit
+from school_management.models import AuditLog, FeePayment, SchoolClass, Student
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class AuditTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school_class = SchoolClass.objects.order_by('grade').first()
+        cls.student = Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=cls.school_class, monthly_fee=Decimal('1000'),
+        )
+        audit.flush()
+
+    def setUp(self):
+        # Entries left by other tests' saves would be written here
+        audit.flush()
+        AuditLog.objects.all().delete()
+
+    def save_and_flush(self, instance, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save(**kwargs)
+        audit.flush()
+
+    def test_update_records_only_changed_fields(self):
+        student = Student.objects.get(pk=self.student.pk)
+        student.name = 'نام جدید'
+        student.monthly_fee = Decimal('1000.00')  # Same value, other scale
+        self.save_and_flush(student)
+
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.action, entry.model_name, entry.object_id), ('update', 'student', student.pk))
+        self.assertEqual(entry.changes, {'name': ['شاگرد', 'نام جدید']})
+
+    def test_unchanged_save_records_nothing(self):
+        self.save_and_flush(Student.objects.get(pk=self.student.pk))
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_create_snapshot_includes_generated_student_id(self):
+        student = Student(name='تازه', father_name='پدر', school_class=self.school_class, monthly_fee=Decimal('500'))
+        self.save_and_flush(student)
+
+        entry = AuditLog.objects.get()
+        self.assertEqual(entry.action, 'create')
+        self.assertEqual(entry.changes['student_id'], student.student_id)
+        self.assertEqual(entry.changes['monthly_fee'], '500.00')
+
+    def test_payment_entries_point_at_the_student(self):
+        payment = FeePayment(student=self.student, amount=Decimal('250'), month_year='1405-01')
+        self.save_and_flush(payment)
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        audit.flush()
+
+        self.assertEqual(
+            list(AuditLog.objects.order_by('id').values_list('action', 'student_ref')),
+            [('create', self.student.pk), ('delete', self.student.pk)],
+        )
+
+    def test_rolled_back_changes_are_not_recorded(self):
+        student = Student.objects.get(pk=self.student.pk)
+        student.name = 'برگشت'
+        with self.captureOnCommitCallbacks(execute=False):
+            student.save()
+        audit.flush()
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_entries_are_buffered_and_written_in_one_insert(self):
+        students = list(Student.objects.filter(pk=self.student.pk)) * 3
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, student in enumerate(students):
+                student.name = f'نام {i}'
+                student.save()
+        self.assertFalse(AuditLog.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(audit.flush(), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+    def test_loading_rows_takes_no_snapshot(self):
+        students = list(Student.objects.all())
+        self.assertFalse(any(hasattr(student, '_audit_original') for student in students))
+
+    def test_record_updated_diffs_bulk_updates(self):
+        student = Student.objects.get(pk=self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record_updated([student], is_active=False, monthly_fee=Decimal('1000'))
+        audit.flush()
+        self.assertEqual(AuditLog.objects.get().changes, {'is_active': [True, False]})
@@ -0,0 +1,126 @@
+"""Backups restore what was backed up, refuse damaged files and rotate by age."""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from school_management import backup
+
+
+class BackupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.live = os.path.join(self.tmp, 'live.sqlite3')
+        self.backups = os.path.join(self.tmp, 'backups')
+        conn = sqlite3.connect(self.live)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE payment (id INTEGER PRIMARY KEY, amount TEXT)')
+        conn.executemany('INSERT INTO payment (amount) VALUES (?)', [(str(i),) for i in range(500)])
+        conn.commit()
+        conn.close()
+        # The test database is in memory; point the branch at a file instead
+        for patcher in (
+            mock.patch.object(backup, 'database_path', return_value=self.live),
+            mock.patch.object(backup, 'connections'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Where restore_database puts the backup of the replaced database
+        safety_dir = self.settings(BACKUP_DIR=os.path.join(self.tmp, 'safety'))
+        safety_dir.enable()
+        self.addCleanup(safety_dir.disable)
+
+    def count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM payment').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_round_trip(self):
+        steps = []
+        path = backup.backup_database(directory=self.backups, pages=2, sleep=0, progress=lambda *step: steps.append(step))
+        self.assertRegex(os.path.basename(path), backup.BACKUP_NAME)
+        self.assertEqual(os.listdir(self.backups), [os.path.basename(path)])
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][0], steps[-1][1])
+
+        conn = sqlite3.connect(self.live)
+        conn.execute('DELETE FROM payment WHERE id > 100')
+        conn.commit()
+        conn.close()
+
+        safety = backup.restore_database(path)
+        self.assertEqual(self.count(self.live), 500)
+        # The state before the restore was kept
+        with gzip.open(safety) as src, open(os.path.join(self.tmp, 'safety.sqlite3'), 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        self.assertEqual(self.count(os.path.join(self.tmp, 'safety.sqlite3')), 100)
+
+    def test_uncompressed_backup(self):
+        path = backup.backup_database(directory=self.backups, compress=False, sleep=0)
+        self.assertTrue(path.endswith('.sqlite3'))
+        self.assertEqual(self.count(path), 500)
+
+    def test_damaged_backups_are_refused(self):
+        os.makedirs(self.backups)
+        not_gzip = os.path.join(self.backups, 'default-20250101-000000.sqlite3.gz')
+        not_sqlite = os.path.join(self.backups, 'default-20250102-000000.sqlite3')
+        with open(not_gzip, 'wb') as f:
+            f.write(b'not gzip')
+        with open(not_sqlite, 'wb') as f:
+            f.write(b'x' * 4096)
+        for path in (not_gzip, not_sqlite):
+            with self.subTest(path=path), self.assertRaises(ValueError):
+                backup.restore_database(path)
+        self.assertEqual(self.count(self.live), 500)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'safety')))
+        self.assertEqual([f for f in os.listdir(self.tmp) if f.startswith('.restore-')], [])
+
+
+class PruneTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def touch(self, alias, taken_at):
+        path = os.path.join(self.tmp, f"{alias}-{taken_at:{backup.STAMP_FORMAT}}.sqlite3.gz")
+        open(path, 'wb').close()
+        return path
+
+    def test_keeps_hourly_daily_and_weekly(self):
+        newest = datetime(2025, 3, 12, 18)  # A Wednesday
+        # Every 6 hours for five weeks
+        paths = {newest - timedelta(hours=6 * i): None for i in range(5 * 7 * 4)}
+        for taken_at in paths:
+            paths[taken_at] = self.touch('default', taken_at)
+        other = self.touch('branch2', newest - timedelta(weeks=10))
+        partial = os.path.join(self.tmp, '.default-20250101-000000.sqlite3.abc')
+        open(partial, 'wb').close()
+
+        deleted = backup.prune_backups('default', self.tmp, keep_hourly=3, keep_daily=2, keep_weekly=3)
+
+        kept = {taken_at for taken_at, path in paths.items() if os.path.exists(path)}
+        self.assertEqual(kept, {
+            # The newest three
+            newest, newest - timedelta(hours=6), newest - timedelta(hours=12),
+            # Newest of today (above) and yesterday
+            datetime(2025, 3, 11, 18),
+            # Newest of this week (above) and the two weeks before
+            datetime(2025, 3, 9, 18), datetime(2025, 3, 2, 18),
+        })
+        self.assertEqual(len(deleted), len(paths) - len(kept))
+        # Other branches and unfinished backups are left alone
+        self.assertTrue(os.path.exists(other))
+        self.assertTrue(os.path.exists(partial))
+
+    def test_nothing_to_prune(self):
+        self.assertEqual(backup.prune_backups('default', os.path.join(self.tmp, 'missing')), [])
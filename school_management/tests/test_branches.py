@@ -0,0 +1,94 @@
+"""Writes made under ``use_branch`` stay atomic in the branch's own database.
+
+Tests run with the project settings, which only configure ``default``, so a
+second SQLite database is registered here as branch ``BRANCH``.
+"""
+from decimal import Decimal
+from unittest import mock
+
+import jdatetime
+
+from django.db import connections
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from school_management import audit, sync
+from school_management.branches import use_branch
+from school_management.ledger import allocate_students, generate_invoices
+from school_management.models import FeeInvoice, FeePayment, PaymentAllocation, SchoolClass, Student
+
+BRANCH = 'test_branch'
+
+if BRANCH not in connections.settings:
+    connections.settings[BRANCH] = connections.configure_settings({
+        **connections.settings, BRANCH: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    })[BRANCH]
+
+
+@override_settings(
+    BRANCHES={'default': {'name': 'مرکز'}, BRANCH: {'name': 'شعبه'}},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class BranchTransactionTests(TestCase):
+    databases = {'default', BRANCH}
+
+    @classmethod
+    def setUpTestData(cls):
+        today = jdatetime.date.today()
+        cls.month_year = f'{today.year}-{today.month:02d}'
+        with use_branch(BRANCH):
+            school_class = SchoolClass.objects.order_by('grade').first()
+            cls.student = Student.objects.create(
+                name='شاگرد شعبه', father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'),
+            )
+            FeePayment.objects.create(student=cls.student, amount=Decimal('1000'), month_year=cls.month_year)
+            generate_invoices(today.year, today.month)
+
+    def allocated(self):
+        return PaymentAllocation.objects.using(BRANCH).aggregate(total=Sum('amount'))['total']
+
+    def test_failed_allocation_rolls_back_in_branch(self):
+        self.assertEqual(self.allocated(), Decimal('1000'))
+        with use_branch(BRANCH), mock.patch.object(
+            PaymentAllocation.objects, 'bulk_create', side_effect=RuntimeError('boom'),
+        ):
+            with self.assertRaises(RuntimeError):
+                allocate_students([self.student.pk])
+        # The DELETE before the failed INSERT must not have been committed
+        self.assertEqual(self.allocated(), Decimal('1000'))
+        self.assertFalse(FeeInvoice.objects.using('default').exists())
+
+    def test_audit_waits_for_branch_commit(self):
+        with self.captureOnCommitCallbacks(using='default') as default_callbacks:
+            with self.captureOnCommitCallbacks(using=BRANCH) as branch_callbacks:
+                with use_branch(BRANCH):
+                    self.student.name = 'نام جدید'
+                    self.student.save()
+        self.assertEqual(default_callbacks, [])
+        self.assertTrue(any(
+            callback.__module__ == audit.__name__ for callback in branch_callbacks
+        ))
+
+    def sync_items(self, count):
+        return [
+            {'key': f'branch-{i}', 'student': self.student.pk, 'amount': '10', 'month_year': self.month_year}
+            for i in range(count)
+        ]
+
+    def test_failed_sync_batch_leaves_no_rows_in_branch(self):
+        with use_branch(BRANCH), mock.patch('school_management.ledger.allocate_students', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                sync.ingest_payments(self.sync_items(5))
+        self.assertEqual(FeePayment.objects.using(BRANCH).count(), 1)
+
+    def test_sync_batch_queries_do_not_grow_with_items(self):
+        counts = []
+        for start, size in ((0, 10), (100, 100)):
+            items = self.sync_items(start + size)[start:]
+            with CaptureQueriesContext(connections[BRANCH]) as branch_queries, \
+                    CaptureQueriesContext(connections['default']) as default_queries, use_branch(BRANCH):
+                results = sync.ingest_payments(items)
+            self.assertEqual({r['status'] for r in results}, {sync.STATUS_CREATED})
+            counts.append(len(branch_queries) + len(default_queries))
+        self.assertEqual(counts[0], counts[1])
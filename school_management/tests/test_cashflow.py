@@ -0,0 +1,115 @@
+"""Cash-flow buckets by payment date and the same period of the last Jalali year."""
+import datetime
+from decimal import Decimal
+
+import jdatetime
+from django.test import TestCase, override_settings
+
+from school_management import audit
+from school_management.cashflow import cash_flow, parse_cash_flow_filters, shift_year
+from school_management.models import FeePayment, SchoolClass, Student
+from school_management.utils import get_afghan_month_name
+
+
+def j(year, month, day):
+    return jdatetime.date(year, month, day).togregorian()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class CashFlowTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        school_class = SchoolClass.objects.order_by('grade').first()
+        student = Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'),
+        )
+        for date, amount in [
+            (j(1403, 2, 5), '100'),
+            (j(1403, 2, 5), '50'),
+            (j(1403, 2, 7), '200'),
+            (j(1403, 3, 10), '400'),
+            (j(1402, 2, 6), '300'),
+            (j(1403, 4, 1), '999'),
+        ]:
+            FeePayment.objects.create(
+                student=student, amount=Decimal(amount), payment_date=date, month_year='1403-02',
+            )
+        audit.flush()
+
+    def tearDown(self):
+        audit.flush()
+
+    def test_day_buckets_include_empty_days(self):
+        rows, summary = cash_flow(j(1403, 2, 5), j(1403, 2, 7), 'day')
+        self.assertEqual(
+            [(r['label'], r['total_amount'], r['payment_count']) for r in rows],
+            [('1403/02/05', Decimal('150'), 2), ('1403/02/06', Decimal('0'), 0), ('1403/02/07', Decimal('200'), 1)],
+        )
+        self.assertEqual((summary['total_amount'], summary['payment_count']), (Decimal('350'), 3))
+
+    def test_weeks_run_saturday_to_friday(self):
+        start, end = j(1403, 2, 1), j(1403, 2, 31)
+        rows, summary = cash_flow(start, end, 'week')
+        self.assertEqual(rows[0]['start'], start)
+        self.assertEqual(rows[-1]['end'], end)
+        for row in rows[1:]:
+            self.assertEqual(jdatetime.date.fromgregorian(date=row['start']).weekday(), 0)
+        for row in rows[:-1]:
+            self.assertEqual(jdatetime.date.fromgregorian(date=row['end']).weekday(), 6)
+        for previous, row in zip(rows, rows[1:]):
+            self.assertEqual(row['start'], previous['end'] + datetime.timedelta(days=1))
+        self.assertEqual(summary['total_amount'], Decimal('350'))
+
+    def test_month_buckets_start_on_the_jalali_first(self):
+        rows, summary = cash_flow(j(1403, 2, 15), j(1403, 3, 31), 'month')
+        self.assertEqual([r['start'] for r in rows], [j(1403, 2, 15), j(1403, 3, 1)])
+        self.assertEqual([r['total_amount'] for r in rows], [Decimal('0'), Decimal('400')])
+        self.assertEqual(rows[1]['label'], f"{get_afghan_month_name(3)} 1403")
+
+    def test_compare_with_the_same_period_last_year(self):
+        rows, summary = cash_flow(j(1403, 2, 1), j(1403, 3, 31), 'month', compare=True)
+        self.assertEqual(
+            [(r['total_amount'], r['previous_amount'], r['change']) for r in rows],
+            [(Decimal('350'), Decimal('300'), Decimal('50')), (Decimal('400'), Decimal('0'), Decimal('400'))],
+        )
+        self.assertEqual(rows[0]['previous_label'], f"{get_afghan_month_name(2)} 1402")
+        self.assertEqual((summary['previous_amount'], summary['previous_count']), (Decimal('300'), 1))
+        self.assertEqual(summary['change'], Decimal('450'))
+
+    def test_compare_is_limited_to_one_year(self):
+        rows, summary = cash_flow(j(1403, 1, 1), j(1404, 6, 1), 'month', compare=True)
+        self.assertEqual(summary['end'], j(1403, 12, 30))
+        self.assertEqual(len(rows), 12)
+
+    def test_compare_counts_previous_buckets_beyond_the_current_ones(self):
+        # 1403/02/01 is a Saturday, 1402/02/01 a Friday: one week now, two a year ago
+        rows, summary = cash_flow(j(1403, 2, 1), j(1403, 2, 7), 'week', compare=True)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['previous_amount'], Decimal('0'))
+        self.assertEqual(summary['previous_amount'], Decimal('300'))
+
+    def test_shift_year(self):
+        self.assertEqual(shift_year(j(1403, 2, 5)), j(1402, 2, 5))
+        self.assertEqual(shift_year(j(1402, 2, 5), 1), j(1403, 2, 5))
+        # 1403 is a leap year; 1402 has no 30 Hoot
+        self.assertEqual(shift_year(j(1403, 12, 30)), j(1402, 12, 29))
+
+
+class CashFlowFilterTests(TestCase):
+
+    def test_defaults_to_the_current_month_by_day(self):
+        today = jdatetime.date.today()
+        self.assertEqual(
+            parse_cash_flow_filters({}),
+            (today.replace(day=1).togregorian(), today.togregorian(), 'day', False),
+        )
+
+    def test_reversed_range_and_unknown_granularity(self):
+        params = {'from': '1403/02/10', 'to': '1403-02-01', 'granularity': 'hour', 'compare': 'on'}
+        self.assertEqual(parse_cash_flow_filters(params), (j(1403, 2, 1), j(1403, 2, 10), 'day', True))
+
+    def test_range_is_clamped(self):
+        start, end, granularity, compare = parse_cash_flow_filters({'from': '1400/01/01', 'to': '1403/01/01'})
+        self.assertEqual(end - start, datetime.timedelta(days=365))
+        self.assertFalse(compare)
@@ -0,0 +1,152 @@
+"""The integrity scan finds each kind of problem, and the payment form asks before a duplicate."""
+import csv
+import datetime
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+import jdatetime
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from school_management import audit, integrity
+from school_management.forms import FeePaymentForm
+from school_management.models import FeeInvoice, FeePayment, PaymentAllocation, SchoolClass, Student
+
+FEE = Decimal('1000')
+DATE = datetime.date(2024, 4, 24)
+MISSING = 999999
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class IntegrityScanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        school_class = SchoolClass.objects.order_by('grade').first()
+        cls.paid, cls.twice, cls.malformed, cls.unnumbered, cls.classless = (
+            Student.objects.create(name=name, father_name='پدر', school_class=school_class, monthly_fee=FEE)
+            for name in ('پرداخته', 'دوبار', 'بدماه', 'بی‌شماره', 'بی‌صنف')
+        )
+        Student.objects.filter(pk=cls.unnumbered.pk).update(student_id='')
+        FeePayment.objects.bulk_create([
+            FeePayment(student=cls.paid, amount=FEE, month_year='1403-02', payment_date=DATE),
+            # Two halves on different days add up to the fee
+            FeePayment(student=cls.paid, amount=FEE / 2, month_year='1403-03', payment_date=DATE),
+            FeePayment(student=cls.paid, amount=FEE / 2, month_year='1403-03', payment_date=DATE + datetime.timedelta(days=1)),
+            FeePayment(student=cls.twice, amount=FEE, month_year='1403-02', payment_date=DATE),
+            FeePayment(student=cls.twice, amount=FEE, month_year='1403-02', payment_date=DATE),
+            FeePayment(student=cls.malformed, amount=FEE, month_year='1403-13', payment_date=DATE),
+        ])
+        cls.first, cls.second = FeePayment.objects.filter(student=cls.twice).order_by('pk')
+        cls.invoice = FeeInvoice.objects.create(student=cls.paid, month_year='1403-04', amount_due=FEE, balance=FEE)
+
+    def setUp(self):
+        # Rows pointing at missing rows. SQLite checks foreign keys when the
+        # test's transaction ends, so the cleanups remove them again first.
+        self.orphan_payment = FeePayment.objects.bulk_create([
+            FeePayment(student_id=MISSING, amount=FEE, month_year='1403-02', payment_date=DATE),
+        ])[0]
+        self.addCleanup(FeePayment.objects.filter(student_id=MISSING).delete)
+        self.orphan_invoice = FeeInvoice.objects.create(
+            student_id=MISSING, month_year='1403-02', amount_due=FEE, balance=FEE,
+        )
+        self.addCleanup(FeeInvoice.objects.filter(student_id=MISSING).delete)
+        self.orphan_allocation = PaymentAllocation.objects.create(payment_id=MISSING, invoice=self.invoice, amount=FEE)
+        Student.objects.filter(pk=self.classless.pk).update(school_class_id=MISSING)
+        self.addCleanup(
+            Student.objects.filter(pk=self.classless.pk).update, school_class_id=self.classless.school_class_id,
+        )
+
+    def tearDown(self):
+        audit.flush()
+
+    def issues(self, **kwargs):
+        return {(issue.check, issue.pk) for issue in integrity.scan(**kwargs)}
+
+    def test_finds_every_check(self):
+        self.assertEqual(self.issues(), {
+            ('missing_student_id', self.unnumbered.pk),
+            ('orphan_student', self.classless.pk),
+            ('duplicate_payment', self.second.pk),
+            ('fee_mismatch', self.first.pk),
+            ('malformed_period', FeePayment.objects.get(student=self.malformed).pk),
+            ('orphan_payment', self.orphan_payment.pk),
+            ('orphan_invoice', self.orphan_invoice.pk),
+            ('orphan_allocation', self.orphan_allocation.pk),
+        })
+
+    def test_details(self):
+        issues = {issue.check: issue for issue in integrity.scan()}
+        self.assertEqual(issues['duplicate_payment'].student, self.twice.pk)
+        self.assertIn(f'as payment {self.first.pk}', issues['duplicate_payment'].detail)
+        self.assertEqual(issues['fee_mismatch'].detail, 'paid 2000.00 of monthly fee 1000.00 in 2 payment(s)')
+
+    def test_small_chunks_find_the_same(self):
+        # The student and payment streams are merged across chunk boundaries
+        self.assertEqual(self.issues(chunk_size=1), self.issues())
+
+    def test_command_writes_a_report(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'report.csv')
+        out = StringIO()
+        call_command('check_integrity', output=path, chunk_size=2, stdout=out)
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(integrity.Issue._fields))
+        self.assertEqual(len(rows) - 1, 8)
+        self.assertIn('duplicate_payment: 1', out.getvalue())
+        self.assertIn('8 issue(s)', out.getvalue())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class DuplicatePaymentFormTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = jdatetime.date.today()
+        cls.student = Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=SchoolClass.objects.order_by('grade').first(),
+            monthly_fee=FEE,
+        )
+        cls.payment = FeePayment.objects.create(
+            student=cls.student, amount=FEE, month_year=f'{cls.today.year}-{cls.today.month:02d}',
+        )
+
+    def tearDown(self):
+        audit.flush()
+
+    def form(self, instance=None, **data):
+        data = {
+            'student': self.student.pk, 'amount': str(FEE), 'payment_method': 'نقدی',
+            'month': str(self.today.month), 'year': str(self.today.year), **data,
+        }
+        return FeePaymentForm(data, instance=instance)
+
+    def test_same_amount_and_month_asks_for_confirmation(self):
+        form = self.form()
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.duplicate, self.payment)
+        self.assertIn('گزینه تأیید', form.non_field_errors()[0])
+        self.assertEqual(FeePayment.objects.count(), 1)
+
+    def test_confirmed_duplicate_is_saved(self):
+        form = self.form(confirm_duplicate='on')
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(FeePayment.objects.filter(student=self.student).count(), 2)
+
+    def test_other_amount_or_month_is_not_a_duplicate(self):
+        month = self.today.month % 12 + 1
+        for data in ({'amount': '500'}, {'month': str(month)}):
+            with self.subTest(**data):
+                form = self.form(**data)
+                self.assertTrue(form.is_valid(), form.errors)
+                self.assertIsNone(form.duplicate)
+
+    def test_editing_a_payment_does_not_match_itself(self):
+        form = self.form(instance=self.payment, notes='ویرایش')
+        self.assertTrue(form.is_valid(), form.errors)
@@ -0,0 +1,67 @@
+"""Jobs left running by a stopped or dead worker don't stay "running" forever."""
+import datetime
+from concurrent.futures import Future
+from contextlib import nullcontext
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from school_management.jobs import claim_next_job, enqueue, fail_stale_jobs, requeue_jobs
+from school_management.management.commands import run_workers
+from school_management.models import BackgroundJob
+
+
+@override_settings(JOB_TIMEOUT_SECONDS=600)
+class StaleJobTests(TestCase):
+
+    def setUp(self):
+        # run_workers would start publishing this test process's metrics
+        patcher = mock.patch('school_management.metrics.publish')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def running_job(self, minutes_ago):
+        job = enqueue(BackgroundJob.KIND_PAYMENTS_EXPORT, branch='default')
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status=BackgroundJob.STATUS_RUNNING, started_at=timezone.now() - datetime.timedelta(minutes=minutes_ago),
+        )
+        return job
+
+    def status(self, job):
+        job.refresh_from_db()
+        return job.status
+
+    def test_only_jobs_past_the_timeout_fail(self):
+        stale, fresh = self.running_job(60), self.running_job(1)
+        pending = enqueue(BackgroundJob.KIND_PAYMENTS_EXPORT, branch='default')
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        self.assertEqual(self.status(stale), BackgroundJob.STATUS_FAILED)
+        self.assertTrue(stale.error)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(self.status(fresh), BackgroundJob.STATUS_RUNNING)
+        self.assertEqual(self.status(pending), BackgroundJob.STATUS_PENDING)
+
+    def test_requeued_job_is_claimed_again(self):
+        job = self.running_job(1)
+        self.assertEqual(requeue_jobs([job.pk]), 1)
+        self.assertEqual(self.status(job), BackgroundJob.STATUS_PENDING)
+        self.assertIsNone(job.started_at)
+        self.assertEqual(claim_next_job().pk, job.pk)
+
+    def test_worker_startup_fails_stale_jobs(self):
+        stale = self.running_job(60)
+        call_command('run_workers', once=True, workers=1, stdout=StringIO())
+        self.assertEqual(self.status(stale), BackgroundJob.STATUS_FAILED)
+
+    def test_ctrl_c_requeues_running_jobs(self):
+        job = enqueue(BackgroundJob.KIND_PAYMENTS_EXPORT, branch='default')
+        pool = mock.Mock()
+        pool.submit.return_value = Future()
+        with mock.patch.object(run_workers, 'make_pool', return_value=nullcontext(pool)), \
+                mock.patch.object(run_workers, 'wait', side_effect=KeyboardInterrupt):
+            call_command('run_workers', workers=1, stdout=StringIO())
+        self.assertEqual(self.status(job), BackgroundJob.STATUS_PENDING)
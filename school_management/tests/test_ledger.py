@@ -0,0 +1,102 @@
+"""Payments settle their own month, then the oldest open invoices."""
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from school_management import audit
+from school_management.ledger import allocate_students
+from school_management.models import FeeInvoice, FeePayment, PaymentAllocation, SchoolClass, Student
+
+FEE = Decimal('1000')
+MONTHS = ['1404-01', '1404-02', '1404-03']
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        school_class = SchoolClass.objects.order_by('grade').first()
+        cls.student, cls.other = (
+            Student.objects.create(name=name, father_name='پدر', school_class=school_class, monthly_fee=FEE)
+            for name in ('شاگرد', 'دیگر')
+        )
+        FeeInvoice.objects.bulk_create([
+            FeeInvoice(student=student, month_year=month_year, amount_due=FEE, balance=FEE)
+            for student in (cls.student, cls.other) for month_year in MONTHS
+        ])
+
+    def tearDown(self):
+        # Write the audit entries of saves made outside a request inside this test
+        audit.flush()
+
+    def pay(self, month_year, amount, student=None):
+        return FeePayment.objects.create(student=student or self.student, amount=Decimal(amount), month_year=month_year)
+
+    def invoices(self, student=None):
+        return {
+            invoice.month_year: (invoice.amount_paid, invoice.status)
+            for invoice in FeeInvoice.objects.filter(student=student or self.student)
+        }
+
+    def assert_matches_rebuild(self):
+        before = self.invoices(), sorted(PaymentAllocation.objects.values_list('payment', 'invoice', 'amount'))
+        allocate_students([self.student.pk])
+        after = self.invoices(), sorted(PaymentAllocation.objects.values_list('payment', 'invoice', 'amount'))
+        self.assertEqual(before, after)
+
+    def test_payment_covers_its_own_month(self):
+        self.pay('1404-02', '400')
+        invoices = self.invoices()
+        self.assertEqual(invoices['1404-01'], (Decimal('0.00'), FeeInvoice.STATUS_UNPAID))
+        self.assertEqual(invoices['1404-02'], (Decimal('400.00'), FeeInvoice.STATUS_PARTIAL))
+
+    def test_excess_settles_arrears_before_later_months(self):
+        self.pay('1404-02', '2500')
+        invoices = self.invoices()
+        self.assertEqual(invoices['1404-02'], (Decimal('1000.00'), FeeInvoice.STATUS_PAID))
+        self.assertEqual(invoices['1404-01'], (Decimal('1000.00'), FeeInvoice.STATUS_PAID))
+        self.assertEqual(invoices['1404-03'], (Decimal('500.00'), FeeInvoice.STATUS_PARTIAL))
+        self.assert_matches_rebuild()
+
+    def test_later_payment_settles_old_open_invoice(self):
+        self.pay('1404-01', '600')
+        self.pay('1404-03', '1400')
+        self.assertEqual(self.invoices()['1404-01'], (Decimal('1000.00'), FeeInvoice.STATUS_PAID))
+        self.assert_matches_rebuild()
+
+    def test_leftover_stays_as_credit(self):
+        self.pay('1404-01', '3500')
+        self.assertEqual(
+            sum(PaymentAllocation.objects.values_list('amount', flat=True)), Decimal('3000.00'),
+        )
+
+    def test_new_payment_only_touches_open_invoices(self):
+        for month_year in MONTHS[:2]:
+            self.pay(month_year, '1000')
+        allocations = PaymentAllocation.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            self.pay('1404-03', '1000')
+        self.assertEqual(PaymentAllocation.objects.count(), allocations + 1)
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+
+    def test_edit_moving_payment_rebuilds_both_students(self):
+        payment = self.pay('1404-01', '1000')
+        payment = FeePayment.objects.get(pk=payment.pk)
+        payment.student = self.other
+        with CaptureQueriesContext(connection) as queries:
+            payment.save()
+        # The loaded row already knows its previous student
+        self.assertFalse(any(
+            'SELECT "school_management_feepayment"."student_id" FROM' in q['sql'] for q in queries.captured_queries
+        ))
+        self.assertEqual(self.invoices()['1404-01'], (Decimal('0.00'), FeeInvoice.STATUS_UNPAID))
+        self.assertEqual(self.invoices(self.other)['1404-01'], (Decimal('1000.00'), FeeInvoice.STATUS_PAID))
+
+    def test_delete_reopens_invoice(self):
+        payment = self.pay('1404-01', '1000')
+        payment.delete()
+        self.assertEqual(self.invoices()['1404-01'], (Decimal('0.00'), FeeInvoice.STATUS_UNPAID))
+        self.assertFalse(PaymentAllocation.objects.exists())
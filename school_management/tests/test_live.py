@@ -0,0 +1,69 @@
+"""The live dashboard does no work without subscribers and notices other processes' writes."""
+from decimal import Decimal
+
+import jdatetime
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from school_management import audit, live
+from school_management.branches import DEFAULT_BRANCH
+from school_management.models import FeePayment, SchoolClass, Student
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class LiveDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        today = jdatetime.date.today()
+        cls.month_year = f'{today.year}-{today.month:02d}'
+        cls.student = Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=SchoolClass.objects.order_by('grade').first(),
+            monthly_fee=Decimal('1000'),
+        )
+
+    def tearDown(self):
+        # Write the audit entries of saves made outside a request inside this test
+        audit.flush()
+
+    def pay(self, amount='100'):
+        return FeePayment.objects.create(student=self.student, amount=Decimal(amount), month_year=self.month_year)
+
+    def subscribe(self):
+        q, snapshot = live.subscribe(DEFAULT_BRANCH)
+        self.addCleanup(live.unsubscribe, DEFAULT_BRANCH, q)
+        return q, snapshot
+
+    def test_payments_are_ignored_without_subscribers(self):
+        q, _ = self.subscribe()
+        live.unsubscribe(DEFAULT_BRANCH, q)
+        self.assertNotIn(DEFAULT_BRANCH, live._states)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.pay()
+        self.assertFalse(any(callback.__module__ == live.__name__ for callback in callbacks))
+
+    def test_resync_picks_up_writes_without_signals(self):
+        q, snapshot = self.subscribe()
+        self.assertEqual(snapshot['counters']['total_collected'], '0.00')
+
+        # bulk_create sends no signals, like a save made by another process
+        FeePayment.objects.bulk_create([
+            FeePayment(student=self.student, amount=Decimal('250'), month_year=self.month_year),
+        ])
+        live._states[DEFAULT_BRANCH]['checked_at'] -= live.KEEPALIVE_SECONDS
+        live.resync(DEFAULT_BRANCH)
+        self.assertEqual(q.get_nowait().count('"total_collected": "250.00"'), 1)
+
+    def test_own_payments_do_not_trigger_resync(self):
+        q, _ = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pay()
+        q.get_nowait()
+
+        live._states[DEFAULT_BRANCH]['checked_at'] -= live.KEEPALIVE_SECONDS
+        with CaptureQueriesContext(connection) as queries:
+            live.resync(DEFAULT_BRANCH)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(q.empty())
@@ -0,0 +1,52 @@
+"""``/metrics`` only adds up files of processes that are still running."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from school_management import metrics
+
+
+class CollectTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=10)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write(self, name, value, age=0):
+        path = os.path.join(self.directory, f'{name}.json')
+        with open(path, 'w') as fh:
+            json.dump([['payments_created_total', [['source', 'sync']], value]], fh)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def collected(self):
+        """Sync payments counted from other processes' files."""
+        key = ('payments_created_total', (('source', 'sync'),))
+        return metrics.collect().get(key, 0) - metrics.snapshot().get(key, 0)
+
+    def test_only_live_processes_are_counted(self):
+        # The parent of this process is alive and flushed recently
+        self.write(f'{os.getppid()}-1', 5)
+        silent = self.write(f'{os.getppid()}-2', 7, age=60)
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True)
+        dead = self.write(f'{int(exited.stdout)}-3', 11)
+
+        self.assertEqual(self.collected(), 5)
+        self.assertFalse(os.path.exists(silent))
+        if os.name == 'posix':
+            self.assertFalse(os.path.exists(dead))
+
+    def test_short_lived_processes_write_nothing(self):
+        metrics.inc('payments_created_total', source='sync')
+        self.assertFalse(metrics._publishing)
+        self.assertEqual(os.listdir(self.directory), [])
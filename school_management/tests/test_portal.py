@@ -0,0 +1,58 @@
+"""Cached parent portal pages are dropped when a student's payments change."""
+from decimal import Decimal
+
+import jdatetime
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from school_management import audit, portal
+from school_management.branches import DEFAULT_BRANCH
+from school_management.models import FeePayment, SchoolClass, Student
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'portal-tests'}},
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class PortalCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        today = jdatetime.date.today()
+        cls.month_year = f'{today.year}-{today.month:02d}'
+        school_class = SchoolClass.objects.order_by('grade').first()
+        cls.first, cls.second = (
+            Student.objects.create(name=name, father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'))
+            for name in ('اول', 'دوم')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # Write the audit entries of saves made outside a request inside this test
+        audit.flush()
+
+    def page(self, student):
+        return portal.get_page(DEFAULT_BRANCH, student.pk).decode()
+
+    def test_new_payment_drops_cached_page(self):
+        self.assertIn('هنوز پرداختی ثبت نشده است', self.page(self.first))
+        with self.captureOnCommitCallbacks(execute=True):
+            FeePayment.objects.create(student=self.first, amount=Decimal('750'), month_year=self.month_year)
+        self.assertNotIn('هنوز پرداختی ثبت نشده است', self.page(self.first))
+
+    def test_moving_payment_drops_both_pages(self):
+        payment = FeePayment.objects.create(student=self.first, amount=Decimal('750'), month_year=self.month_year)
+        self.assertNotIn('هنوز پرداختی ثبت نشده است', self.page(self.first))
+        self.assertIn('هنوز پرداختی ثبت نشده است', self.page(self.second))
+
+        payment = FeePayment.objects.get(pk=payment.pk)
+        payment.student = self.second
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+        self.assertIn('هنوز پرداختی ثبت نشده است', self.page(self.first))
+        self.assertNotIn('هنوز پرداختی ثبت نشده است', self.page(self.second))
@@ -0,0 +1,46 @@
+"""Year-end promotion only moves students along the standard grades."""
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from school_management.models import SchoolClass, Student
+from school_management.promotion import FINAL_GRADE, apply_promotion, plan_promotion
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class PromotionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # The migrations create the twelve standard classes
+        cls.classes = {c.grade: c for c in SchoolClass.objects.all()}
+        cls.other = SchoolClass.objects.create(name='نامشخص', grade=FINAL_GRADE + 1)
+
+    def add_student(self, school_class):
+        return Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'),
+        )
+
+    def test_catch_all_classes_are_left_alone(self):
+        eleventh = self.add_student(self.classes[FINAL_GRADE - 1])
+        twelfth = self.add_student(self.classes[FINAL_GRADE])
+        unknown = self.add_student(self.other)
+
+        self.assertNotIn(self.other, [row['from'] for row in plan_promotion()])
+        promotion = apply_promotion(1404)
+        self.assertEqual((promotion.promoted_count, promotion.graduated_count), (1, 1))
+
+        eleventh.refresh_from_db()
+        twelfth.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual((eleventh.school_class, eleventh.is_active), (self.classes[FINAL_GRADE], True))
+        self.assertEqual((twelfth.school_class, twelfth.is_active), (self.classes[FINAL_GRADE], False))
+        self.assertEqual((unknown.school_class, unknown.is_active), (self.other, True))
+
+    def test_missing_grade_refuses_to_plan(self):
+        self.add_student(self.classes[1])
+        self.classes[5].delete()
+        with self.assertRaises(ValueError):
+            plan_promotion()
+        with self.assertRaises(ValueError):
+            apply_promotion(1404)
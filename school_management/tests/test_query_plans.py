@@ -0,0 +1,326 @@
+"""Query-plan and query-count regression tests for every page.
+
+Each case requests a view of ``school_management.urls`` (or an admin
+changelist) against a seeded database and captures the SQL it runs. Every
+statement is checked with ``EXPLAIN QUERY PLAN``: it may not scan the
+student or payment table without an index, and a view may not run more
+statements than its entry in ``QUERY_BUDGETS``. Raise a budget only when a
+page really needs the extra queries.
+"""
+import json
+import re
+import shutil
+import tempfile
+from decimal import Decimal
+
+import jdatetime
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management import urls as app_urls
+from school_management.archive import archive_year
+from school_management.ledger import generate_invoices
+from school_management.models import BackgroundJob, FeePayment, SchoolClass, Student
+from school_management.portal import make_token
+
+WATCHED_TABLES = {'school_management_feepayment', 'school_management_student'}
+
+# Most statements each view may run against the seeded data (session,
+# user and branch lookups included)
+QUERY_BUDGETS = {
+    'dashboard': 13,
+    'dashboard_stream': 14,
+    'student_list': 6,
+    'student_add': 4,
+    'student_detail': 19,
+    'student_edit': 5,
+    'statements_batch': 4,
+    'reminders_send': 5,
+    'payment_list': 8,
+    'payment_add': 16,
+    'payment_batch': 7,
+    'payments_export': 4,
+    'reports': 15,
+    'reports_export': 4,
+    'branch_report': 8,
+    'cash_flow_report': 6,
+    'trends_report': 5,
+    'job_status': 4,
+    'job_download': 4,
+    'api_student_payments': 11,
+    'api_payments_sync': 20,
+    'api_report_data': 12,
+    'api_cash_flow': 6,
+    'api_trends': 5,
+    'api_job_status': 4,
+    'metrics': 3,
+    'parent_portal': 1,
+    'admin:schoolclass': 6,
+    'admin:student': 7,
+    'admin:feepayment': 7,
+    'admin:feeinvoice': 7,
+    'admin:auditlog': 7,
+    'admin:branchmembership': 7,
+    'admin:backgroundjob': 7,
+    'admin:reminder': 7,
+    'admin:archivedfeepayment': 7,
+    'admin:archivedyear': 6,
+    'admin:promotion': 6,
+}
+
+ACTIVE_COUNT = 'count of active students (a bare boolean test cannot use an index)'
+ALL_TIME_TOTAL = 'all-time totals read every live payment'
+
+# Full scans a view needs by design: {view: {table: reason}}
+ALLOWED_SCANS = {
+    'dashboard': {
+        'school_management_student': ACTIVE_COUNT,
+        'school_management_feepayment': ALL_TIME_TOTAL,
+    },
+    'dashboard_stream': {
+        'school_management_student': ACTIVE_COUNT,
+        'school_management_feepayment': ALL_TIME_TOTAL,
+    },
+    'student_list': {
+        'school_management_student': "search matches inside names and ids (LIKE '%...%')",
+    },
+    'payment_list': {
+        'school_management_feepayment': 'unfiltered list shows ' + ALL_TIME_TOTAL,
+    },
+    'reports': {
+        'school_management_student': 'the forecast reads every student once',
+    },
+    'branch_report': {
+        'school_management_student': ACTIVE_COUNT,
+    },
+    'api_report_data': {
+        'school_management_student': ACTIVE_COUNT,
+    },
+}
+
+STUDENTS_PER_CLASS = 8
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$')
+ALIAS = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?')
+
+
+def _table_aliases(sql):
+    return {alias: table for table, alias in ALIAS.findall(sql)}
+
+
+def unindexed_scans(sql):
+    """Watched tables ``sql`` reads with a full table scan."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    aliases = _table_aliases(sql)
+    scanned = set()
+    for detail in plan:
+        match = SCAN.match(detail)
+        if not match or 'INDEX' in match.group(3) or 'PRIMARY KEY' in match.group(3):
+            continue
+        name = match.group(1).strip('"')
+        table = aliases.get(match.group(2) or name, name)
+        if table in WATCHED_TABLES:
+            scanned.add(table)
+    return scanned
+
+
+@override_settings(
+    # Fragment and report caches would hide queries after the first request
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    # No collectstatic manifest in tests
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    METRICS_ENABLED=False,
+    PROFILE_SAMPLE_RATE=0,
+)
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        today = jdatetime.date.today()
+        cls.year, cls.month = today.year, today.month
+
+        # The first three classes created by the migrations
+        for school_class in SchoolClass.objects.order_by('grade')[:3]:
+            grade = school_class.grade
+            for i in range(STUDENTS_PER_CLASS):
+                Student.objects.create(
+                    name=f'شاگرد {grade}-{i}', father_name='پدر', school_class=school_class,
+                    monthly_fee=Decimal('1000'), phone='0700000000',
+                    is_active=i != STUDENTS_PER_CLASS - 1,
+                )
+        cls.student = Student.objects.order_by('pk').first()
+
+        # Two years of payments, the oldest archived
+        payments = []
+        for student in Student.objects.all():
+            for offset in range(24):
+                period = cls.year * 12 + cls.month - 1 - offset
+                year, month = divmod(period, 12)
+                paid_on = jdatetime.date(year, month + 1, 5).togregorian()
+                payments.append(FeePayment(
+                    student=student, amount=Decimal('1000'), month_year=f'{year}-{month + 1:02d}',
+                    payment_date=paid_on,
+                ))
+        FeePayment.objects.bulk_create(payments)
+        archive_year(cls.year - 2)
+        generate_invoices(cls.year, cls.month)
+
+        job = BackgroundJob.objects.create(kind=BackgroundJob.KIND_PAYMENTS_EXPORT, status=BackgroundJob.STATUS_DONE)
+        job.result_file.save('payments.csv', ContentFile(b'id\n'), save=True)
+        cls.job = job
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def cases(self):
+        """``(view name, method, url, data)`` for every URL of the app."""
+        student, job = self.student, self.job
+        month_year = f'{self.year}-{self.month:02d}'
+        sync_item = {
+            'key': 'plan-test', 'student': student.pk, 'amount': '500',
+            'month_year': month_year, 'payment_method': 'نقدی',
+        }
+        return [
+            ('dashboard', 'get', reverse('dashboard'), None),
+            ('dashboard_stream', 'get', reverse('dashboard_stream'), None),
+            ('student_list', 'get', reverse('student_list'), None),
+            ('student_list', 'get', reverse('student_list'), {'search': 'شاگرد 2'}),
+            ('student_add', 'get', reverse('student_add'), None),
+            ('student_detail', 'get', reverse('student_detail', args=[student.pk]), None),
+            ('student_edit', 'get', reverse('student_edit', args=[student.pk]), None),
+            ('statements_batch', 'post', reverse('statements_batch'), {'format': 'html'}),
+            ('reminders_send', 'post', reverse('reminders_send'), None),
+            ('payment_list', 'get', reverse('payment_list'), None),
+            ('payment_list', 'get', reverse('payment_list'), {'month': self.month, 'year': self.year}),
+            ('payment_add', 'get', reverse('payment_add'), None),
+            ('payment_add', 'post', reverse('payment_add'), {
+                'student': student.pk, 'amount': '750', 'month': self.month, 'year': self.year,
+                'payment_method': 'نقدی',
+            }),
+            ('payment_batch', 'get', reverse('payment_batch'), {
+                'school_class': student.school_class_id, 'month': self.month, 'year': self.year,
+            }),
+            ('payments_export', 'post', reverse('payments_export'), {'month': self.month, 'year': self.year}),
+            ('reports', 'get', reverse('reports'), None),
+            ('reports', 'get', reverse('reports'), {'year': self.year - 2}),
+            ('reports_export', 'post', reverse('reports_export'), {'year': self.year}),
+            ('branch_report', 'get', reverse('branch_report'), None),
+            ('cash_flow_report', 'get', reverse('cash_flow_report'), None),
+            ('trends_report', 'get', reverse('trends_report'), None),
+            ('job_status', 'get', reverse('job_status', args=[job.pk]), None),
+            ('job_download', 'get', reverse('job_download', args=[job.pk]), None),
+            ('api_student_payments', 'get', reverse('api_student_payments', args=[student.pk]), None),
+            ('api_payments_sync', 'json', reverse('api_payments_sync'), {'payments': [sync_item]}),
+            ('api_report_data', 'get', reverse('api_report_data'), {'year': self.year, 'month': self.month}),
+            ('api_cash_flow', 'get', reverse('api_cash_flow'), None),
+            ('api_trends', 'get', reverse('api_trends'), None),
+            ('api_job_status', 'get', reverse('api_job_status', args=[job.pk]), None),
+            ('metrics', 'get', reverse('metrics'), None),
+            ('parent_portal', 'anonymous', reverse('parent_portal', args=[make_token(student.pk)]), None),
+        ]
+
+    def request(self, method, url, data):
+        if method == 'json':
+            return self.client.post(url, json.dumps(data), content_type='application/json')
+        if method == 'anonymous':
+            return self.client_class().get(url, data or {})
+        response = getattr(self.client, method)(url, data or {})
+        if response.get('Content-Type') == 'text/event-stream':
+            # Read the first events only; the stream never ends on its own
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            next(chunks)
+            response.close()
+        return response
+
+    def check(self, name, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(method, url, data)
+        self.assertLess(response.status_code, 400, f'{name} {url} returned {response.status_code}')
+
+        allowed = ALLOWED_SCANS.get(name, {})
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+                continue
+            scanned = unindexed_scans(sql) - set(allowed)
+            self.assertFalse(scanned, f'{name} {url} scans {", ".join(sorted(scanned))} without an index:\n{sql}')
+
+        budget = QUERY_BUDGETS.get(name)
+        self.assertIsNotNone(budget, f'No query budget recorded for {name}')
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{name} {url} ran {len(queries)} queries, budget {budget}:\n'
+            + '\n'.join(q['sql'] for q in queries.captured_queries),
+        )
+
+    def test_every_url_has_a_case(self):
+        names = {pattern.name for pattern in app_urls.urlpatterns}
+        self.assertEqual(names - {name for name, *_ in self.cases()}, set())
+
+    def test_views(self):
+        for name, method, url, data in self.cases():
+            with self.subTest(view=name, url=url, data=data):
+                self.check(name, method, url, data)
+
+    def test_jobs_are_queued_by_post_only(self):
+        jobs = BackgroundJob.objects.count()
+        for name in ('payments_export', 'reports_export', 'statements_batch'):
+            self.assertEqual(self.client.get(reverse(name), {'year': self.year}).status_code, 405)
+        self.assertEqual(BackgroundJob.objects.count(), jobs)
+
+        self.client.post(reverse('reports_export'), {'year': self.year})
+        job = BackgroundJob.objects.latest('pk')
+        self.assertEqual((job.kind, job.params), (BackgroundJob.KIND_REPORT_EXPORT, {'year': str(self.year)}))
+
+    def post_batch(self, included):
+        """POST the first class's batch with ``included`` rows ticked; returns the query count."""
+        students = list(self.student.school_class.students.filter(is_active=True).order_by('name'))
+        data = {
+            'school_class': self.student.school_class_id, 'month': self.month, 'year': self.year,
+            'form-TOTAL_FORMS': len(students), 'form-INITIAL_FORMS': len(students),
+        }
+        for i, student in enumerate(students):
+            data.update({
+                f'form-{i}-student': student.pk, f'form-{i}-amount': '10',
+                f'form-{i}-payment_method': 'نقدی', f'form-{i}-include': 'on' if i < included else '',
+            })
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('payment_batch'), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_batch_rows_add_no_queries(self):
+        self.assertEqual(self.post_batch(1), self.post_batch(STUDENTS_PER_CLASS - 1))
+
+    def test_admin_changelists(self):
+        for model in admin.site._registry:
+            if model._meta.app_label != 'school_management':
+                continue
+            name = f'admin:{model._meta.model_name}'
+            url = reverse(f'admin:school_management_{model._meta.model_name}_changelist')
+            with self.subTest(view=name):
+                self.check(name, 'get', url, None)
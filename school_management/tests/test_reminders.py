@@ -0,0 +1,133 @@
+"""Reminders go once to each unpaid student, with retries and per-outcome status updates."""
+import asyncio
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from school_management import audit, reminders
+from school_management.models import FeePayment, Reminder, SchoolClass, Student
+from school_management.utils import get_afghan_month_name
+
+MONTH_YEAR = '1403-05'
+
+
+class FakeGateway(reminders.Gateway):
+    """Fails the first sends to a phone with the exceptions listed for it."""
+
+    def __init__(self, failures=None, slow=()):
+        self.failures = {phone: list(errors) for phone, errors in (failures or {}).items()}
+        self.slow = slow
+        self.sent = []
+        self.closed = False
+
+    async def send(self, phone, text):
+        if phone in self.slow:
+            await asyncio.sleep(1)
+        errors = self.failures.get(phone)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(phone)
+
+    async def close(self):
+        self.closed = True
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REMINDER_RATE=0, REMINDER_RETRIES=2, REMINDER_RETRY_DELAY=0, REMINDER_TIMEOUT=0.05,
+)
+class ReminderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        school_class = SchoolClass.objects.order_by('grade').first()
+
+        def student(name, phone, is_active=True):
+            return Student.objects.create(
+                name=name, father_name='پدر', school_class=school_class, monthly_fee=Decimal('1500'),
+                phone=phone, is_active=is_active,
+            )
+
+        cls.first = student('اول', ' 0700000001 ')
+        cls.second = student('دوم', '0700000002')
+        cls.paid = student('پرداخته', '0700000003')
+        student('بی‌تلفن', '')
+        student('غیرفعال', '0700000004', is_active=False)
+        FeePayment.objects.create(student=cls.paid, amount=Decimal('1500'), month_year=MONTH_YEAR)
+        # Another month's payment doesn't count
+        FeePayment.objects.create(student=cls.first, amount=Decimal('1500'), month_year='1403-04')
+
+    def tearDown(self):
+        audit.flush()
+
+    def statuses(self):
+        return {
+            r.student_id: (r.status, r.attempts, r.error)
+            for r in Reminder.objects.filter(month_year=MONTH_YEAR)
+        }
+
+    def test_queues_unpaid_students_once(self):
+        self.assertEqual(reminders.queue_reminders(MONTH_YEAR), 2)
+        self.assertEqual(reminders.queue_reminders(MONTH_YEAR), 0)
+        reminder = Reminder.objects.get(student=self.first)
+        self.assertEqual(reminder.phone, '0700000001')
+        self.assertIn(get_afghan_month_name(5), reminder.message)
+        self.assertIn('1,500', reminder.message)
+        self.assertEqual(
+            set(Reminder.objects.values_list('student', flat=True)), {self.first.pk, self.second.pk},
+        )
+
+    def test_sends_pending_reminders(self):
+        gateway = FakeGateway()
+        progress = []
+        counts = reminders.send_reminders(MONTH_YEAR, gateway=gateway, progress=lambda *p: progress.append(p))
+        self.assertEqual(counts[Reminder.STATUS_SENT], 2)
+        self.assertEqual(sorted(gateway.sent), ['0700000001', '0700000002'])
+        self.assertTrue(gateway.closed)
+        self.assertEqual(progress, [(2, 2)])
+        self.assertFalse(Reminder.objects.filter(sent_at__isnull=True).exists())
+        # Nothing is sent twice
+        self.assertEqual(sum(reminders.send_reminders(MONTH_YEAR, gateway=FakeGateway()).values()), 0)
+
+    def test_retries_with_backoff(self):
+        gateway = FakeGateway({
+            '0700000001': [reminders.GatewayError('busy')],
+            '0700000002': [reminders.GatewayError('busy')] * 3,
+        })
+        counts = reminders.send_reminders(MONTH_YEAR, gateway=gateway)
+        self.assertEqual((counts[Reminder.STATUS_SENT], counts[Reminder.STATUS_FAILED]), (1, 1))
+        self.assertEqual(self.statuses(), {
+            self.first.pk: (Reminder.STATUS_SENT, 2, ''),
+            self.second.pk: (Reminder.STATUS_FAILED, 3, 'GatewayError: busy'),
+        })
+
+    def test_permanent_errors_and_timeouts_fail(self):
+        gateway = FakeGateway({'0700000001': [reminders.GatewayError('invalid number', retry=False)]}, slow={'0700000002'})
+        reminders.send_reminders(MONTH_YEAR, gateway=gateway)
+        self.assertEqual(self.statuses(), {
+            self.first.pk: (Reminder.STATUS_FAILED, 1, 'GatewayError: invalid number'),
+            self.second.pk: (Reminder.STATUS_FAILED, 3, 'TimeoutError: '),
+        })
+
+    def test_retry_failed_sends_again(self):
+        reminders.send_reminders(MONTH_YEAR, gateway=FakeGateway({'0700000002': [reminders.GatewayError('busy')] * 3}))
+        self.assertEqual(reminders.retry_failed(MONTH_YEAR), 1)
+        counts = reminders.dispatch(MONTH_YEAR, gateway=FakeGateway())
+        self.assertEqual(counts[Reminder.STATUS_SENT], 1)
+        # Attempts add up over the runs
+        self.assertEqual(self.statuses()[self.second.pk], (Reminder.STATUS_SENT, 4, ''))
+
+    def test_students_who_paid_meanwhile_are_skipped(self):
+        reminders.queue_reminders(MONTH_YEAR)
+        FeePayment.objects.create(student=self.second, amount=Decimal('1500'), month_year=MONTH_YEAR)
+        gateway = FakeGateway()
+        counts = reminders.dispatch(MONTH_YEAR, gateway=gateway)
+        self.assertEqual((counts[Reminder.STATUS_SENT], counts[Reminder.STATUS_SKIPPED]), (1, 1))
+        self.assertEqual(gateway.sent, ['0700000001'])
+        self.assertEqual(self.statuses()[self.second.pk][0], Reminder.STATUS_SKIPPED)
+
+    def test_chunks(self):
+        reminders.queue_reminders(MONTH_YEAR)
+        progress = []
+        reminders.dispatch(MONTH_YEAR, gateway=FakeGateway(), chunk_size=1, progress=lambda *p: progress.append(p))
+        self.assertEqual(progress, [(1, 2), (2, 2)])
@@ -0,0 +1,91 @@
+"""Offline payment sync is idempotent on client keys and survives concurrent pushes."""
+import json
+from decimal import Decimal
+from unittest import mock
+
+import jdatetime
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from school_management import audit, sync
+from school_management.models import FeePayment, SchoolClass, Student
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class SyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        today = jdatetime.date.today()
+        cls.month_year = f'{today.year}-{today.month:02d}'
+        cls.student = Student.objects.create(
+            name='شاگرد', father_name='پدر', school_class=SchoolClass.objects.order_by('grade').first(),
+            monthly_fee=Decimal('1000'),
+        )
+
+    def tearDown(self):
+        # Write the audit entries of saves made outside a request inside this test
+        audit.flush()
+
+    def item(self, key, amount='100'):
+        return {'key': key, 'student': self.student.pk, 'amount': amount, 'month_year': self.month_year}
+
+    def statuses(self, results):
+        return [r['status'] for r in results]
+
+    def test_resending_a_batch_creates_nothing_new(self):
+        items = [self.item('a'), self.item('b')]
+        first = sync.ingest_payments(items)
+        self.assertEqual(self.statuses(first), [sync.STATUS_CREATED] * 2)
+
+        again = sync.ingest_payments(items)
+        self.assertEqual(self.statuses(again), [sync.STATUS_DUPLICATE] * 2)
+        self.assertEqual([r['id'] for r in again], [r['id'] for r in first])
+        self.assertEqual(FeePayment.objects.count(), 2)
+
+    def test_key_repeated_within_a_batch_is_stored_once(self):
+        results = sync.ingest_payments([self.item('a'), self.item('a', amount='200')])
+        self.assertEqual(self.statuses(results), [sync.STATUS_CREATED, sync.STATUS_DUPLICATE])
+        self.assertEqual(FeePayment.objects.get().amount, Decimal('100.00'))
+
+    def test_invalid_item_does_not_use_up_its_key(self):
+        results = sync.ingest_payments([self.item('a', amount='-5')])
+        self.assertEqual(self.statuses(results), [sync.STATUS_INVALID])
+        self.assertIn('amount', results[0]['errors'])
+        self.assertEqual(self.statuses(sync.ingest_payments([self.item('a')])), [sync.STATUS_CREATED])
+
+    def racing_insert(self, keys):
+        """``_insert`` that lets another device store ``keys`` first, one per call."""
+        real_insert = sync._insert
+        keys = list(keys)
+
+        def insert(payments):
+            if keys:
+                FeePayment.objects.create(
+                    student=self.student, amount=Decimal('100'), month_year=self.month_year, client_key=keys.pop(0),
+                )
+            real_insert(payments)
+        return insert
+
+    def test_repeated_races_report_duplicates(self):
+        items = [self.item('a'), self.item('b'), self.item('c')]
+        with mock.patch.object(sync, '_insert', self.racing_insert(['a', 'b'])):
+            results = sync.ingest_payments(items)
+        self.assertEqual(
+            self.statuses(results), [sync.STATUS_DUPLICATE, sync.STATUS_DUPLICATE, sync.STATUS_CREATED],
+        )
+        self.assertEqual(FeePayment.objects.filter(client_key__in=['a', 'b', 'c']).count(), 3)
+
+    def test_endpoint_reports_items_it_could_not_store(self):
+        user = User.objects.create_user('cashier', password='secret')
+        self.client.force_login(user)
+        with mock.patch.object(sync, '_insert', side_effect=IntegrityError):
+            response = self.client.post(
+                reverse('api_payments_sync'), json.dumps({'payments': [self.item('a')]}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['invalid'], 1)
+        self.assertFalse(FeePayment.objects.exists())
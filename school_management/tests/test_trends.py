@@ -0,0 +1,88 @@
+"""Trend windows treat months without payments as zero."""
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from school_management.models import FeePayment, SchoolClass, Student
+from school_management.trends import compute_trends, get_trends
+
+YEAR = 1402
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class TrendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first_class, cls.second_class = SchoolClass.objects.order_by('grade')[:2]
+        first, second = (
+            Student.objects.create(name=name, father_name='پدر', school_class=school_class, monthly_fee=Decimal('1000'))
+            for name, school_class in (('اول', cls.first_class), ('دوم', cls.second_class))
+        )
+        FeePayment.objects.bulk_create([
+            FeePayment(student=student, amount=Decimal(amount), month_year=month_year)
+            for student, month_year, amount in [
+                (first, f'{YEAR - 1}-03', '300'),
+                (first, f'{YEAR}-01', '100'),
+                (first, f'{YEAR}-03', '200'),
+                (second, f'{YEAR}-03', '400'),
+                # Outside both years
+                (second, f'{YEAR - 2}-03', '9999'),
+                (second, f'{YEAR + 1}-01', '9999'),
+            ]
+        ])
+
+    def test_months(self):
+        months = compute_trends(YEAR)['months']
+        self.assertEqual([m['month'] for m in months], list(range(1, 13)))
+        first, second, third = months[:3]
+
+        self.assertEqual((first['total'], first['payments'], first['previous']), (Decimal('100.00'), 1, Decimal('0.00')))
+        self.assertIsNone(first['change_percent'])
+        # An empty month is a zero row, not a gap
+        self.assertEqual((second['total'], second['payments']), (Decimal('0.00'), 0))
+        self.assertEqual(third['previous'], Decimal('300.00'))
+        self.assertEqual(third['change'], Decimal('300.00'))
+        self.assertEqual(third['change_percent'], Decimal('100.0'))
+
+    def test_rolling_average_spans_empty_months_and_the_year_boundary(self):
+        months = compute_trends(YEAR)['months']
+        # Month 1 averages the last two (empty) months of the year before with itself
+        self.assertEqual(
+            [m['rolling_average'] for m in months[:5]],
+            [Decimal('33.33'), Decimal('33.33'), Decimal('233.33'), Decimal('200.00'), Decimal('200.00')],
+        )
+        self.assertEqual(months[5]['rolling_average'], Decimal('0.00'))
+
+    def test_year_to_date(self):
+        trends = compute_trends(YEAR)
+        self.assertEqual([m['ytd'] for m in trends['months'][:3]], [Decimal('100.00'), Decimal('100.00'), Decimal('700.00')])
+        self.assertEqual(trends['months'][-1]['ytd'], Decimal('700.00'))
+        self.assertEqual(trends['months'][2]['previous_ytd'], Decimal('300.00'))
+        self.assertEqual((trends['total'], trends['previous_total']), (Decimal('700.00'), Decimal('300.00')))
+        self.assertEqual((trends['change'], trends['change_percent']), (Decimal('400.00'), Decimal('133.3')))
+
+    def test_classes(self):
+        classes = compute_trends(YEAR)['classes']
+        self.assertEqual(
+            [(c['class_name'], c['total'], c['payments'], c['share_percent'], c['previous'], c['change_percent'])
+             for c in classes],
+            [
+                (self.first_class.name, Decimal('300.00'), 2, Decimal('42.9'), Decimal('300.00'), Decimal('0.0')),
+                (self.second_class.name, Decimal('400.00'), 1, Decimal('57.1'), Decimal('0.00'), None),
+            ],
+        )
+
+    def test_year_without_payments(self):
+        trends = compute_trends(YEAR - 5)
+        self.assertEqual(len(trends['months']), 12)
+        self.assertTrue(all(m['total'] == 0 and m['rolling_average'] == 0 for m in trends['months']))
+        self.assertEqual(trends['classes'], [])
+        self.assertEqual(trends['total'], Decimal('0.00'))
+        self.assertIsNone(trends['change_percent'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'trends'}})
+    def test_cached(self):
+        first = get_trends(YEAR)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_trends(YEAR), first)
@@ -0,0 +1,149 @@
+"""Year-over-year and trend analytics over the Jalali ``month_year`` periods.
+
+One SQL statement returns the 24 months of a year and the year before it
+together with their window-function figures: same month last year
+(``LAG(.., 12)``), the rolling 3-month average and the cumulative year-to-date
+total, plus each class's yearly total, its share of the year's revenue and
+its total the year before. A calendar of the 24 periods is joined in, so
+months without payments count as zero instead of shifting the windows.
+
+Results are cached per branch and year: ``TREND_CACHE_SECONDS`` for the
+current year, a day for closed years.
+"""
+from decimal import Decimal
+
+import jdatetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from . import metrics
+from .archive import payment_models
+from .branches import current_branch
+from .models import FeePayment, SchoolClass, Student
+from .utils import get_afghan_month_name
+
+CACHE_VERSION = 1
+CLOSED_YEAR_CACHE_SECONDS = 24 * 60 * 60
+CENT = Decimal('0.01')
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _percent(part, whole):
+    if not whole:
+        return None
+    return (Decimal(str(part or 0)) * 100 / Decimal(str(whole))).quantize(Decimal('0.1'))
+
+
+def _sql(year, tables):
+    student, school_class = Student._meta.db_table, SchoolClass._meta.db_table
+    paid = '\n            UNION ALL\n'.join(
+        f"""            SELECT p.month_year, s.school_class_id AS class_id, p.amount
+            FROM {table} p JOIN {student} s ON s.id = p.student_id
+            WHERE p.month_year >= %s AND p.month_year <= %s"""
+        for table in tables
+    )
+    periods = ', '.join(['(%s, %s, %s)'] * 24)
+    sql = f"""
+        WITH periods(year, month, month_year) AS (VALUES {periods}),
+        paid AS (
+{paid}
+        ),
+        by_month AS (
+            SELECT periods.year, periods.month, COALESCE(SUM(paid.amount), 0) AS total,
+                   COUNT(paid.amount) AS payments
+            FROM periods LEFT JOIN paid ON paid.month_year = periods.month_year
+            GROUP BY periods.year, periods.month
+        ),
+        by_class AS (
+            SELECT CAST(SUBSTR(paid.month_year, 1, 4) AS INTEGER) AS year, paid.class_id,
+                   SUM(paid.amount) AS total, COUNT(*) AS payments
+            FROM paid GROUP BY 1, 2
+        )
+        SELECT 'month' AS kind, year, month, NULL AS class_name, NULL AS grade, total, payments,
+               LAG(total, 12) OVER (ORDER BY year, month) AS previous,
+               AVG(total) OVER (ORDER BY year, month ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) AS rolling,
+               SUM(total) OVER (PARTITION BY year ORDER BY month) AS running
+        FROM by_month
+        UNION ALL
+        SELECT 'class', by_class.year, NULL, c.name, c.grade, by_class.total, by_class.payments,
+               LAG(by_class.total) OVER (PARTITION BY by_class.class_id ORDER BY by_class.year),
+               NULL,
+               SUM(by_class.total) OVER (PARTITION BY by_class.year)
+        FROM by_class JOIN {school_class} c ON c.id = by_class.class_id
+    """
+    params = []
+    for y in (year - 1, year):
+        for month in range(1, 13):
+            params += [y, month, f"{y}-{month:02d}"]
+    for _ in tables:
+        params += [f"{year - 1}-01", f"{year}-12"]
+    return sql, params
+
+
+def compute_trends(year):
+    """Monthly and per-class trend figures for Jalali ``year`` (uncached)."""
+    tables = [model._meta.db_table for model in payment_models()]
+    sql, params = _sql(year, tables)
+    with connections[router.db_for_read(FeePayment)].cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    months, previous_months, classes = [], {}, []
+    for row in sorted((r for r in rows if r['kind'] == 'month'), key=lambda r: (r['year'], r['month'])):
+        if row['year'] != year:
+            previous_months[row['month']] = row
+            continue
+        last_year = previous_months.get(row['month'], {})
+        months.append({
+            'month': row['month'],
+            'month_name': get_afghan_month_name(row['month']),
+            'total': _money(row['total']),
+            'payments': row['payments'],
+            'previous': _money(row['previous']),
+            'change': _money(row['total']) - _money(row['previous']),
+            'change_percent': _percent(Decimal(str(row['total'])) - Decimal(str(row['previous'] or 0)), row['previous']),
+            'rolling_average': _money(row['rolling']),
+            'ytd': _money(row['running']),
+            'previous_ytd': _money(last_year.get('running')),
+        })
+    for row in sorted((r for r in rows if r['kind'] == 'class' and r['year'] == year), key=lambda r: r['grade']):
+        classes.append({
+            'class_name': row['class_name'],
+            'total': _money(row['total']),
+            'payments': row['payments'],
+            'share_percent': _percent(row['total'], row['running']),
+            'previous': _money(row['previous']),
+            'change_percent': _percent(Decimal(str(row['total'])) - Decimal(str(row['previous'] or 0)), row['previous']),
+        })
+
+    total = months[-1]['ytd'] if months else Decimal('0.00')
+    previous_total = months[-1]['previous_ytd'] if months else Decimal('0.00')
+    return {
+        'year': year,
+        'months': months,
+        'classes': classes,
+        'total': total,
+        'previous_total': previous_total,
+        'change': total - previous_total,
+        'change_percent': _percent(total - previous_total, previous_total),
+    }
+
+
+def get_trends(year):
+    """:func:`compute_trends`, cached per branch and year."""
+    key = f"trends:{current_branch()}:{year}:v{CACHE_VERSION}"
+    data = cache.get(key)
+    metrics.cache_lookup('trends', data is not None)
+    if data is None:
+        data = compute_trends(year)
+        timeout = (
+            getattr(settings, 'TREND_CACHE_SECONDS', 300)
+            if year >= jdatetime.date.today().year else CLOSED_YEAR_CACHE_SECONDS
+        )
+        cache.set(key, data, timeout)
+    return data
@@ -4,21 +4,44 @@ from . import views
 urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='dashboard'),
+    path('dashboard/stream/', views.dashboard_stream, name='dashboard_stream'),
     
     # Student management
     path('students/', views.student_list, name='student_list'),
     path('students/add/', views.student_add, name='student_add'),
     path('students/<int:pk>/', views.student_detail, name='student_detail'),
     path('students/<int:pk>/edit/', views.student_edit, name='student_edit'),
+    path('students/statements/', views.statements_batch, name='statements_batch'),
+    path('students/reminders/', views.reminders_send, name='reminders_send'),
     
     # Payment management
     path('payments/', views.payment_list, name='payment_list'),
     path('payments/add/', views.payment_add, name='payment_add'),
+    path('payments/batch/', views.payment_batch, name='payment_batch'),
+    path('payments/export/', views.payments_export, name='payments_export'),
     
     # Reports
     path('reports/', views.reports, name='reports'),
+    path('reports/export/', views.reports_export, name='reports_export'),
+    path('reports/branches/', views.branch_report, name='branch_report'),
+    path('reports/cash-flow/', views.cash_flow_report, name='cash_flow_report'),
+    path('reports/trends/', views.trends_report, name='trends_report'),
+    
+    # Background jobs
+    path('jobs/<int:pk>/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
     
     # API endpoints
     path('api/students/<int:student_id>/payments/', views.api_student_payments, name='api_student_payments'),
+    path('api/payments/sync/', views.api_payments_sync, name='api_payments_sync'),
     path('api/reports/data/', views.api_report_data, name='api_report_data'),
+    path('api/reports/cash-flow/', views.api_cash_flow, name='api_cash_flow'),
+    path('api/reports/trends/', views.api_trends, name='api_trends'),
+    path('api/jobs/<int:pk>/', views.api_job_status, name='api_job_status'),
+
+    # Parent portal
+    path('portal/<str:token>/', views.parent_portal, name='parent_portal'),
+
+    # Monitoring
+    path('metrics', views.metrics_export, name='metrics'),
 ]
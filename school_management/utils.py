@@ -0,0 +1,31 @@
+import jdatetime
+
+AFGHAN_MONTHS = [
+    'حمل', 'ثور', 'جوزا', 'سرطان', 'اسد', 'سنبله',
+    'میزان', 'عقرب', 'قوس', 'جدی', 'دلو', 'حوت'
+]
+
+
+def get_afghan_month_name(month_number):
+    """Convert month number to Afghan month name"""
+    if 1 <= month_number <= 12:
+        return AFGHAN_MONTHS[month_number - 1]
+    return str(month_number)
+
+
+def parse_jalali(value):
+    """``jdatetime.date`` from "YYYY-MM-DD" or "YYYY/MM/DD"; None if invalid."""
+    try:
+        year, month, day = (int(part) for part in (value or '').strip().replace('/', '-').split('-'))
+        return jdatetime.date(year, month, day)
+    except (TypeError, ValueError):
+        return None
+
+
+def year_months(year):
+    """``month_year__range`` bounds of a Jalali year.
+
+    A range can use the ``month_year`` index; a ``startswith`` filter becomes
+    ``LIKE ... ESCAPE`` on SQLite, which always scans the table.
+    """
+    return (f"{year}-01", f"{year}-12")
@@ -1,18 +1,44 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.contrib.auth import authenticate
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
 from django.db.models import Q, Sum, Count
 from django.core.paginator import Paginator
+from django.db import router, transaction
+from django.forms import formset_factory
+from django.urls import reverse
 from django.utils import timezone
 import jdatetime
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+import base64
 import json
-import csv
 from decimal import Decimal
-
-from .models import Student, FeePayment
-from .forms import StudentForm, FeePaymentForm, ReportFilterForm, StudentSearchForm
+from functools import wraps
+
+from .models import SchoolClass, Student, FeePayment, AuditLog, BackgroundJob
+from .forms import (
+    StudentForm, FeePaymentForm, ReportFilterForm, StudentSearchForm,
+    ClassBatchSelectForm, BatchPaymentRowForm,
+)
+from .exports import (
+    filter_payments, export_payment_querysets, write_payments_csv, parse_report_filters,
+    filter_report_payments, report_export_filename, write_report_csv,
+)
+from .archive import archived_years, payment_model_for_year, student_payment_history
+from . import live, metrics, portal, sync
+from .audit import acting_as, record_created
+from .ledger import allocate_students
+from .branches import branch_for_request, get_branches, map_branches, use_branch
+from .cashflow import cash_flow, jalali_label, parse_cash_flow_filters
+from .choices import MONTH_CHOICES, YEARS, data_version
+from .concurrency import fan_out
+from .forecast import get_forecast
+from .jobs import enqueue
+from .reminders import current_month_year
+from .trends import get_trends
+from .utils import get_afghan_month_name, year_months
 
 
 def dashboard(request):
@@ -22,27 +48,29 @@ def dashboard(request):
     current_year = j_now.year
     current_month = j_now.month
     
-    # Get monthly summary
-    monthly_summary = FeePayment.get_monthly_summary(current_year, current_month)
-    
-    # Get recent payments
-    recent_payments = FeePayment.objects.select_related('student').order_by('-created_at')[:10]
-    
-    # Get total statistics
-    total_students = Student.objects.filter(is_active=True).count()
-    total_collected_all_time = FeePayment.objects.aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    # Get class-wise data for current month
-    class_data = FeePayment.get_class_wise_collections(current_year, current_month)
+    # Independent aggregates, run concurrently
+    results = fan_out(
+        # Monthly summary
+        monthly_summary=lambda: FeePayment.get_monthly_summary(current_year, current_month),
+        # Recent payments
+        recent_payments=lambda: list(
+            FeePayment.objects.select_related('student').order_by('-created_at')[:10]
+        ),
+        # Total statistics
+        total_students=lambda: Student.objects.filter(is_active=True).count(),
+        total_collected_all_time=lambda: FeePayment.objects.aggregate(
+            total=Sum('amount')
+        )['total'] or Decimal('0.00'),
+        # Class-wise data for current month
+        class_data=lambda: list(FeePayment.get_class_wise_collections(current_year, current_month)),
+    )
     
     context = {
-        'monthly_summary': monthly_summary,
-        'recent_payments': recent_payments,
-        'total_students': total_students,
-        'total_collected_all_time': total_collected_all_time,
-        'class_data': class_data,
+        'monthly_summary': results['monthly_summary'],
+        'recent_payments': results['recent_payments'],
+        'total_students': results['total_students'],
+        'total_collected_all_time': results['total_collected_all_time'],
+        'class_data': results['class_data'],
         'current_month_name': get_afghan_month_name(current_month),
         'current_year': current_year,
     }
@@ -50,10 +78,24 @@ def dashboard(request):
     return render(request, 'school_management/dashboard.html', context)
 
 
+def dashboard_stream(request):
+    """Server-Sent Events stream of new payments and dashboard counters"""
+    q, snapshot = live.subscribe(request.branch)
+    if q is None:
+        return HttpResponse('Too many live dashboards open', status=503)
+    response = StreamingHttpResponse(
+        live.event_stream(request.branch, q, snapshot), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def student_list(request):
     """View for listing and searching students"""
     form = StudentSearchForm(request.GET)
-    students = Student.objects.all().order_by('name')
+    students = Student.objects.select_related('school_class').order_by('name')
     
     if form.is_valid():
         search = form.cleaned_data.get('search')
@@ -67,7 +109,7 @@ def student_list(request):
             )
         
         if class_filter:
-            students = students.filter(class_name=class_filter)
+            students = students.filter(school_class=class_filter)
     
     # Pagination
     paginator = Paginator(students, 20)
@@ -78,6 +120,8 @@ def student_list(request):
         'form': form,
         'page_obj': page_obj,
         'students': page_obj,
+        'school_classes': SchoolClass.objects.all(),
+        'data_version': data_version(),
     }
     
     return render(request, 'school_management/student_list.html', context)
@@ -121,8 +165,9 @@ def student_edit(request, pk):
 
 def student_detail(request, pk):
     """View for student details and payment history"""
-    student = get_object_or_404(Student, pk=pk)
-    payments = student.payments.all().order_by('-payment_date')
+    student = get_object_or_404(Student.objects.select_related('school_class'), pk=pk)
+    # Includes archived years once any have been archived
+    payments = student_payment_history(student)
     
     # Pagination for payments
     paginator = Paginator(payments, 10)
@@ -133,14 +178,20 @@ def student_detail(request, pk):
     total_payments = student.get_total_payments()
     payments_count = student.get_payments_count()
     latest_payment = student.get_latest_payment()
+    invoices = student.invoices.order_by('-month_year')[:12]
     
     context = {
         'student': student,
+        'invoices': invoices,
+        'outstanding_balance': student.get_outstanding_balance(),
+        'credit': student.get_credit(),
+        'history': AuditLog.objects.filter(student_ref=student.pk)[:20],
         'page_obj': page_obj,
         'payments': page_obj,
         'total_payments': total_payments,
         'payments_count': payments_count,
         'latest_payment': latest_payment,
+        'portal_url': request.build_absolute_uri(portal.portal_path(student, request.branch)),
     }
     
     return render(request, 'school_management/student_detail.html', context)
@@ -160,81 +211,99 @@ def payment_add(request):
     else:
         form = FeePaymentForm()
     
-    context = {'form': form, 'title': 'ثبت پرداخت فیس'}
+    context = {'form': form, 'title': 'ثبت پرداخت فیس', 'data_version': data_version()}
     return render(request, 'school_management/payment_form.html', context)
 
 
-def payment_list(request):
-    """View for listing payments with filtering, sorting, stats, and CSV export."""
-    qs = FeePayment.objects.select_related('student')
+def payment_batch(request):
+    """Enter the payments of a whole class for one month in a single submit"""
+    data = request.POST if request.method == 'POST' else (request.GET or None)
+    select_form = ClassBatchSelectForm(data)
+    if not select_form.is_valid():
+        return render(request, 'school_management/payment_batch.html', {
+            'select_form': select_form,
+            'data_version': data_version(),
+        })
 
-    # Filters from GET
-    search = request.GET.get('search', '').strip()
-    class_filter = request.GET.get('class', '').strip()
-    month = request.GET.get('month', '').strip()
-    year = request.GET.get('year', '').strip()
-    student_id = request.GET.get('student', '').strip()
+    school_class = select_form.cleaned_data['school_class']
+    month = select_form.cleaned_data['month']
+    year = select_form.cleaned_data['year']
+    month_year = f"{year}-{month:02d}"
 
-    if search:
-        qs = qs.filter(
-            Q(student__name__icontains=search) |
-            Q(student__student_id__icontains=search) |
-            Q(student__father_name__icontains=search)
-        )
+    # Amounts already recorded for the month, in one grouped query
+    paid = dict(
+        FeePayment.objects.filter(month_year=month_year, student__school_class=school_class)
+        .order_by().values('student').annotate(total=Sum('amount')).values_list('student', 'total')
+    )
+    students = {s.pk: s for s in school_class.students.filter(is_active=True).order_by('name')}
+    initial = []
+    for student in students.values():
+        already_paid = paid.get(student.pk, Decimal('0.00'))
+        initial.append({
+            'student': student.pk,
+            'name': student.name,
+            'student_code': student.student_id,
+            'paid': already_paid,
+            'amount': max(student.monthly_fee - already_paid, Decimal('0.00')) or student.monthly_fee,
+            'payment_method': 'نقدی',
+            'include': already_paid < student.monthly_fee,
+        })
 
-    if class_filter:
-        qs = qs.filter(student__class_name=class_filter)
+    BatchFormSet = formset_factory(BatchPaymentRowForm, extra=0)
+    formset = BatchFormSet(
+        request.POST if request.method == 'POST' else None,
+        initial=initial,
+        form_kwargs={
+            'students': students, 'month': month, 'year': year,
+            # Every row has the header's year; check the archive once for all of them
+            'archived_years': archived_years() if request.method == 'POST' else None,
+        },
+    )
 
-    # Month/Year filter logic using month_year stored as YYYY-MM
-    try:
-        month_int = int(month) if month else None
-    except ValueError:
-        month_int = None
-    try:
-        year_int = int(year) if year else None
-    except ValueError:
-        year_int = None
-
-    if year_int and month_int:
-        qs = qs.filter(month_year=f"{year_int}-{month_int:02d}")
-    elif year_int:
-        qs = qs.filter(month_year__startswith=f"{year_int}-")
-    elif month_int:
-        qs = qs.filter(month_year__endswith=f"-{month_int:02d}")
-
-    if student_id:
-        qs = qs.filter(student_id=student_id)
-
-    # Sorting
-    sort = request.GET.get('sort', 'payment_date')
-    sort_dir = request.GET.get('dir', 'desc')
-    sort_map = {
-        'payment_date': 'payment_date',
-        'amount': 'amount',
+    if request.method == 'POST' and formset.is_valid():
+        rows = [form for form in formset if form.is_included]
+        if not rows:
+            messages.error(request, 'هیچ شاگردی برای ثبت پرداخت انتخاب نشده است.')
+        else:
+            payments = [form.save(commit=False) for form in rows]
+            with transaction.atomic(using=router.db_for_write(FeePayment)):
+                FeePayment.objects.bulk_create(payments)
+                # bulk_create skips save() and its signals
+                allocate_students({p.student_id for p in payments})
+                record_created(payments)
+                live.payments_added(payments)
+                portal.invalidate(p.student_id for p in payments)
+            metrics.inc('payments_created_total', len(payments), source='batch')
+            total = sum(p.amount for p in payments)
+            messages.success(
+                request,
+                f'{len(payments)} پرداخت به مبلغ {total} افغانی برای صنف {school_class.name} ثبت شد.'
+            )
+            return redirect(
+                f"{reverse('payment_list')}?class={school_class.pk}&month={month}&year={year}"
+            )
+
+    context = {
+        'select_form': select_form,
+        'formset': formset,
+        'school_class': school_class,
+        'month_name': get_afghan_month_name(month),
+        'year': year,
+        'data_version': data_version(),
     }
-    sort_field = sort_map.get(sort, 'payment_date')
-    if sort_dir == 'asc':
-        qs = qs.order_by(sort_field, '-id')
-    else:
-        qs = qs.order_by(f'-{sort_field}', '-id')
+    return render(request, 'school_management/payment_batch.html', context)
+
+
+def payment_list(request):
+    """View for listing payments with filtering, sorting, stats, and CSV export."""
+    qs = filter_payments(request.GET)
+    student_id = request.GET.get('student', '').strip()
 
     # Export CSV (Excel-friendly)
     if request.GET.get('export') == 'excel':
         response = HttpResponse(content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = 'attachment; filename="payments.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['تاریخ پرداخت', 'شاگرد', 'شماره شاگرد', 'صنف', 'مقدار', 'ماه/سال', 'روش پرداخت', 'یادداشت'])
-        for p in qs:
-            writer.writerow([
-                p.payment_date.strftime('%Y/%m/%d'),
-                p.student.name,
-                p.student.student_id or '',
-                p.student.class_name,
-                str(p.amount),
-                p.month_year,
-                p.payment_method,
-                (p.notes or '').replace('\n', ' ').strip(),
-            ])
+        write_payments_csv(response, export_payment_querysets(request.GET))
         return response
 
     # Statistics for current filtered queryset (before pagination)
@@ -252,16 +321,6 @@ def payment_list(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
-    # Filter choice lists
-    class_choices = list(
-        Student.objects.values_list('class_name', 'class_name').distinct().order_by('class_name')
-    )
-    month_choices = [
-        (1, 'حمل'), (2, 'ثور'), (3, 'جوزا'), (4, 'سرطان'),
-        (5, 'اسد'), (6, 'سنبله'), (7, 'میزان'), (8, 'عقرب'),
-        (9, 'قوس'), (10, 'جدی'), (11, 'دلو'), (12, 'حوت')
-    ]
-    available_years = list(range(1300, 1601))
 
     context = {
         'page_obj': page_obj,
@@ -270,10 +329,12 @@ def payment_list(request):
         'total_amount': total_amount,
         'payments_count': payments_count,
         'unique_students': unique_students,
-        # Filters and choices
-        'class_choices': class_choices,
-        'month_choices': month_choices,
-        'available_years': available_years,
+        # Filters and choices; the class list is only queried when the
+        # cached filter bar fragment has expired
+        'data_version': data_version(),
+        'class_choices': SchoolClass.objects.values_list('pk', 'name'),
+        'month_choices': MONTH_CHOICES,
+        'available_years': YEARS,
         'students': Student.objects.filter(is_active=True).order_by('name'),
         'selected_student': student_id,
     }
@@ -283,93 +344,82 @@ def payment_list(request):
 
 def reports(request):
     """Comprehensive Reports view with filters, summaries, charts, and CSV export."""
-    # Defaults based on current Jalali date
-    j_now = jdatetime.date.today()
-    default_year = j_now.year
-    available_years = list(range(1300, 1601))
-
-    # GET filters
-    year = request.GET.get('year')
-    month = request.GET.get('month')  # optional
-    selected_class = request.GET.get('class')  # optional; template uses numbers 1..12
-
-    # Validate year/month
-    try:
-        year = int(year) if year else default_year
-    except ValueError:
-        year = default_year
-    try:
-        month_int = int(month) if month else None
-        if month_int is not None and (month_int < 1 or month_int > 12):
-            month_int = None
-    except ValueError:
-        month_int = None
-
-    # Map selected_class ("1".."12") to stored class_name strings
-    class_map = {
-        "1": "اول", "2": "دوم", "3": "سوم", "4": "چهارم",
-        "5": "پنجم", "6": "ششم", "7": "هفتم", "8": "هشتم",
-        "9": "نهم", "10": "دهم", "11": "یازدهم", "12": "دوازدهم",
-    }
-    class_name_filter = class_map.get(selected_class) if selected_class else None
+    # GET filters (year defaults to the current Jalali year)
+    year, month_int, selected_class = parse_report_filters(request.GET)
 
     # Base queryset filtered by year/month and optional class
-    qs = FeePayment.objects.select_related('student').filter(month_year__startswith=f"{year}-")
-    if month_int:
-        qs = qs.filter(month_year=f"{year}-{month_int:02d}")
-    if class_name_filter:
-        qs = qs.filter(student__class_name=class_name_filter)
+    qs = filter_report_payments(year, month_int, selected_class)
 
     # Export CSV of detailed payments (filtered)
     if request.GET.get('export') == 'excel':
         response = HttpResponse(content_type='text/csv; charset=utf-8')
-        filename = f"report_{year}{'-'+str(month_int).zfill(2) if month_int else ''}.csv"
+        filename = report_export_filename(year, month_int)
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(['سال', 'ماه', 'تاریخ پرداخت', 'شاگرد', 'شماره شاگرد', 'صنف', 'مقدار', 'ماه/سال', 'روش پرداخت', 'یادداشت'])
-        for p in qs.order_by('-payment_date', '-id'):
-            month_num = int(p.month_year.split('-')[1]) if p.month_year else 0
-            writer.writerow([
-                year,
-                get_afghan_month_name(month_num),
-                p.payment_date.strftime('%Y/%m/%d'),
-                p.student.name,
-                p.student.student_id or '',
-                p.student.class_name,
-                str(p.amount),
-                p.month_year,
-                p.payment_method,
-                (p.notes or '').replace('\n', ' ').strip(),
-            ])
+        write_report_csv(response, qs, year)
         return response
 
-    # Top-level totals for the filtered period
-    totals = qs.aggregate(
-        total_revenue=Sum('amount'),
-        total_payments=Count('id'),
-        paying_students=Count('student', distinct=True),
+    # Monthly summary across 12 months for selected year (respect class filter only)
+    payment_model = payment_model_for_year(year)
+    month_qs = payment_model.objects.filter(month_year__range=year_months(year))
+    if selected_class:
+        month_qs = month_qs.filter(student__school_class_id=selected_class)
+
+    classes = SchoolClass.objects.annotate(
+        enrolled=Count('students'),
+        student_count=Count('students', filter=Q(students__is_active=True)),
+    ).filter(enrolled__gt=0).order_by('grade')
+    if selected_class:
+        classes = classes.filter(pk=selected_class)
+
+    # The sections below are independent; run their queries concurrently
+    results = fan_out(
+        # Class-wise totals within the filtered period (year and optional
+        # month). A student is in one class, so the top-level totals are sums
+        # of these rows and the period's payments are read once for both
+        class_totals=lambda: {
+            row['student__school_class']: row
+            for row in qs.values('student__school_class').annotate(
+                total_amount=Sum('amount'),
+                payment_count=Count('id'),
+                paying_students=Count('student', distinct=True),
+            ).order_by()
+        },
+        # One grouped query for the 12 months
+        months=lambda: {
+            row['month_year']: row
+            for row in month_qs.values('month_year').annotate(
+                total_amount=Sum('amount'),
+                payment_count=Count('id'),
+                unique_students=Count('student', distinct=True),
+            ).order_by()
+        },
+        classes=lambda: list(classes),
+        # Payment methods summary
+        methods=lambda: list(
+            qs.values('payment_method')
+            .annotate(count=Count('id'), total=Sum('amount'))
+            .order_by('payment_method')
+        ),
+        # Collections expected by the end of the year (current and future years)
+        forecast=lambda: get_forecast(year) if year >= jdatetime.date.today().year else None,
     )
-    total_revenue = totals['total_revenue'] or Decimal('0.00')
-    total_payments = totals['total_payments'] or 0
-    paying_students = totals['paying_students'] or 0
+
+    forecast = results['forecast']
+    forecast_months = forecast['months'] if forecast else []
+    class_totals = results['class_totals']
+    total_revenue = sum((row['total_amount'] for row in class_totals.values()), Decimal('0.00'))
+    total_payments = sum(row['payment_count'] for row in class_totals.values())
+    paying_students = sum(row['paying_students'] for row in class_totals.values())
     average_payment = (total_revenue / total_payments) if total_payments else Decimal('0.00')
 
-    # Monthly summary across 12 months for selected year (respect class filter only)
     monthly_summary = []
     monthly_labels = []
     monthly_data = []
     for m in range(1, 13):
-        month_qs = FeePayment.objects.select_related('student').filter(month_year=f"{year}-{m:02d}")
-        if class_name_filter:
-            month_qs = month_qs.filter(student__class_name=class_name_filter)
-        agg = month_qs.aggregate(
-            total_amount=Sum('amount'),
-            payment_count=Count('id'),
-            unique_students=Count('student', distinct=True),
-        )
-        total_amount = agg['total_amount'] or Decimal('0.00')
-        payment_count = agg['payment_count'] or 0
-        unique_stu = agg['unique_students'] or 0
+        agg = results['months'].get(f"{year}-{m:02d}", {})
+        total_amount = agg.get('total_amount') or Decimal('0.00')
+        payment_count = agg.get('payment_count') or 0
+        unique_stu = agg.get('unique_students') or 0
         average_amount = (total_amount / payment_count) if payment_count else Decimal('0.00')
         monthly_summary.append({
             'month': m,
@@ -382,41 +432,27 @@ def reports(request):
         monthly_labels.append(get_afghan_month_name(m))
         monthly_data.append(float(total_amount))
 
-    # Class-wise summary within the filtered period (year and optional month)
-    classes = list(
-        Student.objects.values_list('class_name', flat=True).distinct().order_by('class_name')
-    )
     class_summary = []
     class_labels = []
     class_data_series = []
-    for cls in classes:
-        if class_name_filter and cls != class_name_filter:
-            continue
-        class_qs = qs.filter(student__class_name=cls)
-        agg = class_qs.aggregate(
-            total_amount=Sum('amount'),
-            payment_count=Count('id'),
-        )
-        total_amount = agg['total_amount'] or Decimal('0.00')
-        payment_count = agg['payment_count'] or 0
+    for cls in results['classes']:
+        agg = class_totals.get(cls.pk, {})
+        total_amount = agg.get('total_amount') or Decimal('0.00')
+        payment_count = agg.get('payment_count') or 0
         average_amount = (total_amount / payment_count) if payment_count else Decimal('0.00')
-        student_count = Student.objects.filter(is_active=True, class_name=cls).count()
         class_summary.append({
-            'class_name': cls,
-            'student_count': student_count,
+            'class_id': cls.pk,
+            'class_name': cls.name,
+            'student_count': cls.student_count,
             'payment_count': payment_count,
             'total_amount': total_amount,
             'average_amount': average_amount,
         })
-        class_labels.append(cls)
+        class_labels.append(cls.name)
         class_data_series.append(float(total_amount))
 
-    # Payment methods summary
     payment_methods_summary = []
-    methods = (qs.values('payment_method')
-                 .annotate(count=Count('id'), total=Sum('amount'))
-                 .order_by('payment_method'))
-    for row in methods:
+    for row in results['methods']:
         payment_methods_summary.append({
             'method': row['payment_method'],
             'count': row['count'] or 0,
@@ -424,10 +460,12 @@ def reports(request):
         })
 
     context = {
-        'available_years': available_years,
+        'data_version': data_version(),
+        'available_years': YEARS,
         'selected_year': year,
         'selected_month': month_int or None,
         'selected_class': selected_class,
+        'class_choices': SchoolClass.objects.values_list('pk', 'name'),
 
         # Top stats
         'total_revenue': total_revenue,
@@ -445,6 +483,13 @@ def reports(request):
         'monthly_data': monthly_data,
         'class_labels': class_labels,
         'class_data': class_data_series,
+
+        # Forecast to the end of the year
+        'forecast': forecast,
+        'forecast_labels': [m['month_name'] for m in forecast_months],
+        'forecast_expected': [float(m['forecast']) for m in forecast_months],
+        'forecast_low': [float(m['low']) for m in forecast_months],
+        'forecast_high': [float(m['high']) for m in forecast_months],
     }
 
     return render(request, 'school_management/reports.html', context)
@@ -455,17 +500,17 @@ def api_student_payments(request, student_id):
     """API endpoint for getting student payment history"""
     try:
         student = get_object_or_404(Student, pk=student_id)
-        payments = student.payments.all().order_by('-payment_date')
+        payments = student_payment_history(student)
         
         payments_data = []
         for payment in payments:
             payments_data.append({
-                'id': payment.id,
-                'amount': str(payment.amount),
-                'month_year': payment.month_year,
-                'payment_method': payment.payment_method,
-                'payment_date': payment.payment_date.strftime('%Y-%m-%d'),
-                'notes': payment.notes or '',
+                'id': payment['id'],
+                'amount': str(payment['amount']),
+                'month_year': payment['month_year'],
+                'payment_method': payment['payment_method'],
+                'payment_date': payment['payment_date'].strftime('%Y-%m-%d'),
+                'notes': payment['notes'] or '',
             })
         
         return JsonResponse({
@@ -480,6 +525,53 @@ def api_student_payments(request, student_id):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+def _api_login_required(view):
+    """Accept a logged-in session or HTTP Basic credentials of a Django user."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        user = None
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'basic':
+            try:
+                username, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+            except (ValueError, UnicodeDecodeError):
+                username = password = ''
+            user = authenticate(request, username=username, password=password)
+        if user is None:
+            response = JsonResponse({'error': 'Authentication required'}, status=401)
+            response['WWW-Authenticate'] = 'Basic realm="school"'
+            return response
+        # The branch middleware ran before the user was known
+        request.user = user
+        request.branch = branch_for_request(request)
+        with use_branch(request.branch), acting_as(user):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_api_login_required
+def api_payments_sync(request):
+    """API endpoint for batches of payments recorded offline, with per-item status"""
+    try:
+        items = json.loads(request.body)['payments']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "payments" list'}, status=400)
+    if not isinstance(items, list):
+        return JsonResponse({'error': '"payments" must be a list'}, status=400)
+    if len(items) > sync.MAX_ITEMS:
+        return JsonResponse({'error': f'At most {sync.MAX_ITEMS} payments per request'}, status=413)
+
+    results = sync.ingest_payments(items)
+    counts = {status: 0 for status in (sync.STATUS_CREATED, sync.STATUS_DUPLICATE, sync.STATUS_INVALID)}
+    for result in results:
+        counts[result['status']] += 1
+    return JsonResponse({'results': results, **counts})
+
+
 @require_http_methods(["GET"])
 def api_report_data(request):
     """API endpoint for getting report data"""
@@ -517,13 +609,229 @@ def api_report_data(request):
         return JsonResponse({'error': str(e)}, status=400)
 
 
-def get_afghan_month_name(month_number):
-    """Convert month number to Afghan month name"""
-    afghan_months = [
-        'حمل', 'ثور', 'جوزا', 'سرطان', 'اسد', 'سنبله',
-        'میزان', 'عقرب', 'قوس', 'جدی', 'دلو', 'حوت'
-    ]
-    
-    if 1 <= month_number <= 12:
-        return afghan_months[month_number - 1]
-    return str(month_number)
+
+def branch_report(request):
+    """Consolidated report: per-branch rollups fetched in parallel and merged"""
+    year, month_int, _ = parse_report_filters(request.GET)
+    results = map_branches(FeePayment.get_period_rollup, year, month_int)
+
+    branches = []
+    combined = {'total_amount': Decimal('0.00'), 'payment_count': 0, 'paying_students': 0, 'active_students': 0}
+    monthly = {m: Decimal('0.00') for m in range(1, 13)}
+    classes = {}
+    for code, name in get_branches():
+        rollup = results[code]
+        branches.append({'code': code, 'name': name, **rollup})
+        for key in combined:
+            combined[key] += rollup[key]
+        for m, total in rollup['monthly'].items():
+            monthly[m] = monthly.get(m, Decimal('0.00')) + (total or Decimal('0.00'))
+        # Class ids differ between branch databases, so merge on grade and name
+        for row in rollup['classes']:
+            merged = classes.setdefault((row['grade'], row['class_name']), {
+                'class_name': row['class_name'],
+                'total_amount': Decimal('0.00'),
+                'payment_count': 0,
+            })
+            merged['total_amount'] += row['total_amount'] or Decimal('0.00')
+            merged['payment_count'] += row['payment_count']
+
+    context = {
+        'available_years': YEARS,
+        'selected_year': year,
+        'selected_month': month_int,
+        'branches': branches,
+        'combined': combined,
+        'monthly_summary': [
+            {'month_name': get_afghan_month_name(m), 'total_amount': monthly[m]} for m in range(1, 13)
+        ],
+        'class_summary': [classes[key] for key in sorted(classes, key=lambda k: (k[0] is None, k[0] or 0))],
+    }
+    return render(request, 'school_management/branch_report.html', context)
+
+
+def cash_flow_report(request):
+    """Cash received per day, week or Jalali month by payment date"""
+    start, end, granularity, compare = parse_cash_flow_filters(request.GET)
+    rows, summary = cash_flow(start, end, granularity, compare)
+
+    context = {
+        'rows': rows,
+        'summary': summary,
+        'granularity': granularity,
+        'granularity_choices': [('day', 'روزانه'), ('week', 'هفته‌وار'), ('month', 'ماهانه')],
+        'compare': compare,
+        'date_from': jalali_label(summary['start']),
+        'date_to': jalali_label(summary['end']),
+        'chart_labels': json.dumps([r['label'] for r in rows], ensure_ascii=False),
+        'chart_data': json.dumps([float(r['total_amount']) for r in rows]),
+        'chart_previous': json.dumps([float(r.get('previous_amount', 0)) for r in rows]),
+    }
+    return render(request, 'school_management/cash_flow.html', context)
+
+
+@require_http_methods(["GET"])
+def api_cash_flow(request):
+    """API endpoint for cash received by payment date"""
+    start, end, granularity, compare = parse_cash_flow_filters(request.GET)
+    rows, summary = cash_flow(start, end, granularity, compare)
+
+    def serialize(data):
+        # Amounts as strings, dates as Gregorian ISO (labels are Jalali)
+        out = {}
+        for key, value in data.items():
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            out[key] = value
+        return out
+
+    return JsonResponse({
+        'from': jalali_label(summary['start']),
+        'to': jalali_label(summary['end']),
+        'granularity': granularity,
+        'summary': serialize(summary),
+        'rows': [serialize(row) for row in rows],
+    })
+
+
+def trends_report(request):
+    """Year-over-year growth, rolling average and class share for one Jalali year"""
+    year, _, _ = parse_report_filters(request.GET)
+    trends = get_trends(year)
+    months = trends['months']
+
+    context = {
+        'trends': trends,
+        'selected_year': year,
+        'available_years': YEARS,
+        'chart_labels': json.dumps([m['month_name'] for m in months], ensure_ascii=False),
+        'chart_data': json.dumps([float(m['total']) for m in months]),
+        'chart_previous': json.dumps([float(m['previous']) for m in months]),
+        'chart_rolling': json.dumps([float(m['rolling_average']) for m in months]),
+    }
+    return render(request, 'school_management/trends.html', context)
+
+
+@require_http_methods(["GET"])
+def api_trends(request):
+    """API endpoint for the trend analytics of one Jalali year"""
+    year, _, _ = parse_report_filters(request.GET)
+    trends = get_trends(year)
+
+    def serialize(data):
+        # Amounts and percentages as strings
+        return {key: str(value) if isinstance(value, Decimal) else value for key, value in data.items()}
+
+    return JsonResponse({
+        **serialize({key: value for key, value in trends.items() if key not in ('months', 'classes')}),
+        'months': [serialize(m) for m in trends['months']],
+        'classes': [serialize(c) for c in trends['classes']],
+    })
+
+
+def _enqueue_export(request, kind):
+    """Queue an export with the posted filters and send the user to its status page."""
+    params = request.POST.dict()
+    params.pop('csrfmiddlewaretoken', None)
+    job = enqueue(kind, params)
+    return redirect('job_status', pk=job.pk)
+
+
+@require_http_methods(["POST"])
+def payments_export(request):
+    """Queue a background CSV export of the payment list with its filters"""
+    return _enqueue_export(request, BackgroundJob.KIND_PAYMENTS_EXPORT)
+
+
+@require_http_methods(["POST"])
+def reports_export(request):
+    """Queue a background CSV export of the report with its filters"""
+    return _enqueue_export(request, BackgroundJob.KIND_REPORT_EXPORT)
+
+
+@require_http_methods(["POST"])
+def statements_batch(request):
+    """Queue batch generation of fee statements for all active students"""
+    params = {
+        'year': request.POST.get('year', ''),
+        'class': request.POST.get('class', ''),
+        'format': request.POST.get('format', 'html'),
+        'receipts': request.POST.get('receipts', ''),
+    }
+    job = enqueue(BackgroundJob.KIND_STATEMENTS, params)
+    return redirect('job_status', pk=job.pk)
+
+
+@require_http_methods(["POST"])
+def reminders_send(request):
+    """Queue SMS reminders to students who haven't paid for the current month"""
+    if not request.user.is_staff:
+        messages.error(request, 'فقط مدیران می‌توانند یادآوری ارسال کنند.')
+        return redirect('student_list')
+    # One run per branch at a time; a second click shows the running one
+    job = BackgroundJob.objects.filter(
+        kind=BackgroundJob.KIND_REMINDERS, branch=request.branch,
+        status__in=[BackgroundJob.STATUS_PENDING, BackgroundJob.STATUS_RUNNING],
+    ).first()
+    if job is None:
+        job = enqueue(BackgroundJob.KIND_REMINDERS, {'month_year': current_month_year()})
+    return redirect('job_status', pk=job.pk)
+
+
+def job_status(request, pk):
+    """Status page that polls a background job until its file is ready"""
+    job = get_object_or_404(BackgroundJob, pk=pk, branch=request.branch)
+    return render(request, 'school_management/job_status.html', {'job': job})
+
+
+@require_http_methods(["GET"])
+def api_job_status(request, pk):
+    """API endpoint for polling background job status and progress"""
+    job = get_object_or_404(BackgroundJob, pk=pk, branch=request.branch)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'finished': job.is_finished,
+        'download_url': reverse('job_download', args=[job.pk]) if job.result_file else None,
+        'error': job.error if job.status == BackgroundJob.STATUS_FAILED else '',
+    })
+
+
+def job_download(request, pk):
+    """Download the result file of a finished background job"""
+    job = get_object_or_404(BackgroundJob, pk=pk, branch=request.branch, status=BackgroundJob.STATUS_DONE)
+    if not job.result_file:
+        raise Http404
+    filename = job.result_file.name.split('/')[-1].split('-', 1)[-1]
+    return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=filename)
+
+
+def metrics_export(request):
+    """Prometheus metrics of all worker processes, for staff or the scraper's address"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR') in allowed):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def parent_portal(request, token):
+    """Read-only fee page for parents, served from the per-student page cache"""
+    signed = portal.read_token(token)
+    if signed is None:
+        raise Http404
+    branch, student_pk = signed
+    with use_branch(branch):
+        page = portal.get_page(branch, student_pk)
+    if page is None:
+        raise Http404
+    response = HttpResponse(page)
+    # The token is the only credential; keep it out of other sites' logs and search results
+    response['Referrer-Policy'] = 'no-referrer'
+    response['X-Robots-Tag'] = 'noindex, nofollow'
+    response['Cache-Control'] = 'private, no-store'
+    return response